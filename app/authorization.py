@@ -1,16 +1,19 @@
 """Authorization"""
 
 # Standard library imports
+import base64
+import binascii
 import os
 import secrets
 from typing import Optional
 
 # Third party imports
-from dotenv import load_dotenv
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, WebSocket, status
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from fastapi.security.utils import get_authorization_scheme_param
 
 # Local imports
+from config import get_config
 from constants import (
     AUTH_TYPE_KEY,
     PASSWORD_KEY,
@@ -18,8 +21,15 @@ from constants import (
     AuthTypes,
     ExceptionMessages,
 )
-
-load_dotenv()
+from ratelimit import (
+    CREDENTIAL_LIMITER,
+    IP_LIMITER,
+    RATE_LIMIT_ENABLED,
+    check_rate_limit,
+    client_address,
+    message_cost,
+    request_cost,
+)
 
 
 def get_required_authorization_type() -> AuthTypes:
@@ -36,8 +46,23 @@ AUTH_ENABLED = ACTIVE_AUTH_TYPE is not AuthTypes.NO_AUTH
 security = HTTPBasic() if AUTH_ENABLED else lambda: None
 
 
-def get_authorization(credentials: Optional[HTTPBasicCredentials] = Depends(security)):
-    """Helper function to validate user authorization"""
+def get_authorization(
+    request: Request,
+    credentials: Optional[HTTPBasicCredentials] = Depends(security),
+    cost: float = Depends(request_cost),
+):
+    """Helper function to validate user authorization and enforce rate limits"""
+    return authorize_client(client_address(request), credentials, cost)
+
+
+def authorize_client(
+    address: Optional[str], credentials: Optional[HTTPBasicCredentials], cost: float
+) -> AuthTypes:
+    """Validate the credentials of a client, charging cost to its address and user"""
+    if RATE_LIMIT_ENABLED:
+        # limit by address first so floods of invalid credentials are cut off cheaply
+        check_rate_limit(IP_LIMITER, address, cost)
+
     if AUTH_ENABLED and not is_valid_request(credentials):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -45,9 +70,43 @@ def get_authorization(credentials: Optional[HTTPBasicCredentials] = Depends(secu
             headers={"WWW-Authenticate": ACTIVE_AUTH_TYPE.value},
         )
 
+    if RATE_LIMIT_ENABLED and credentials is not None:
+        check_rate_limit(CREDENTIAL_LIMITER, credentials.username, cost)
+
     return ACTIVE_AUTH_TYPE
 
 
+def authorize_websocket(websocket: WebSocket) -> Optional[HTTPBasicCredentials]:
+    """Validate the credentials of a WebSocket handshake once for the whole connection
+
+    The handshake is rate limited like a request without body, messages are limited each.
+    """
+    credentials = read_basic_credentials(websocket.headers.get("authorization"))
+    if AUTH_ENABLED and credentials is None:
+        if RATE_LIMIT_ENABLED:
+            check_rate_limit(IP_LIMITER, client_address(websocket), message_cost(0))
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=ExceptionMessages.UNAUTHORIZED.value,
+        )
+    authorize_client(client_address(websocket), credentials, message_cost(0))
+    return credentials
+
+
+def read_basic_credentials(authorization: Optional[str]) -> Optional[HTTPBasicCredentials]:
+    """Decode an HTTP Basic Authorization header like HTTPBasic, None if absent or invalid"""
+    scheme, param = get_authorization_scheme_param(authorization)
+    if not authorization or scheme.lower() != "basic":
+        return None
+    try:
+        username, separator, password = base64.b64decode(param).decode("ascii").partition(":")
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+    if not separator:
+        return None
+    return HTTPBasicCredentials(username=username, password=password)
+
+
 def is_valid_request(credentials) -> bool:
     """Call appropriate authentication function"""
     match ACTIVE_AUTH_TYPE:
@@ -61,9 +120,7 @@ def is_valid_basic_request(credentials: HTTPBasicCredentials) -> bool:
     authorized_user_bytes, password_bytes = load_valid_credentials()
     current_username_bytes = credentials.username.encode("utf8")
     current_password_bytes = credentials.password.encode("utf8")
-    is_correct_username = secrets.compare_digest(
-        current_username_bytes, authorized_user_bytes
-    )
+    is_correct_username = secrets.compare_digest(current_username_bytes, authorized_user_bytes)
     is_correct_password = secrets.compare_digest(current_password_bytes, password_bytes)
 
     return is_correct_username and is_correct_password
@@ -71,10 +128,10 @@ def is_valid_basic_request(credentials: HTTPBasicCredentials) -> bool:
 
 def load_valid_credentials() -> tuple[bytes, bytes]:
     """read authentication configuration from env or fallback to file, throw if unsuccessful"""
-
+    config = get_config()
     try:
-        authorized_user_bytes = os.environ[USER_KEY].encode("utf8")
-        password_bytes = os.environ[PASSWORD_KEY].encode("utf8")
+        authorized_user_bytes = str(config.values[USER_KEY]).encode("utf8")
+        password_bytes = str(config.values[PASSWORD_KEY]).encode("utf8")
     except KeyError as exc:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
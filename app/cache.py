@@ -0,0 +1,46 @@
+"""In-memory caches shared by the result reuse features"""
+
+# Standard library imports
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def content_key(text: str) -> bytes:
+    """Content hash identifying a piece of text in a cache"""
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
+class LRUCache:
+    """Thread safe bounded cache evicting the least recently used entry, counting lookups"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached entry or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        """Store an entry, evicting the least recently used once full"""
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def hit_rate(self) -> float:
+        """Fraction of lookups served from the cache"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
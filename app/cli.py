@@ -0,0 +1,379 @@
+"""Command line entry points for offline processing"""
+
+# Standard library imports
+import argparse
+import hashlib
+import json
+import mmap
+import multiprocessing
+import os
+import sys
+import time
+
+# Local imports
+from constants import (
+    CLI_PROG_NAME,
+    SALT_MAX_LENGTH,
+    SALT_MIN_LENGTH,
+    SCAN_DEFAULT_BATCH_SIZE,
+    SCAN_DEFAULT_TEXT_FIELD,
+    SCAN_ERROR_KEY,
+    SCAN_LINE_KEY,
+    SCAN_PROGRESS_INTERVAL,
+    TEXT_MAX_LENGTH,
+    ScanFormats,
+    ScanModes,
+)
+from entity_table import EntityTable
+from pipeline import create_pipeline
+from processor import (
+    anonymize_pii_for_output,
+    encode_pii_for_output,
+    format_pii_for_output,
+)
+
+# Per process state, populated once by init_worker so the model is only loaded once per worker.
+# The parent process never creates a pipeline, only the workers load the model.
+_WORKER_STATE = {}
+
+
+def init_worker(
+    input_path: str,
+    mode: str,
+    salt: str | None,
+    text_field: str,
+    fmt: str,
+    max_length: int = TEXT_MAX_LENGTH,
+):
+    """Load the model and memory map the input file once for each worker process"""
+    # pylint: disable=consider-using-with
+    handle = open(input_path, "rb")
+    _WORKER_STATE.update(
+        {
+            "pipeline": create_pipeline(),
+            "handle": handle,
+            "map": map_file(handle),
+            "mode": ScanModes(mode),
+            "salt": salt,
+            "text_field": text_field,
+            "format": ScanFormats(fmt),
+            "max_length": max_length,
+        }
+    )
+
+
+def map_file(handle) -> mmap.mmap | bytes:
+    """Memory map an open file, empty files cannot be mapped so fall back to empty bytes"""
+    if os.fstat(handle.fileno()).st_size == 0:
+        return b""
+    return mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def split_batches(data, batch_size: int, start: int = 0, first_line: int = 0):
+    """Yield (start_byte, end_byte, first_line) ranges each holding up to batch_size lines"""
+    size = len(data)
+    line = first_line
+    while start < size:
+        end = start
+        count = 0
+        while count < batch_size and end < size:
+            newline = data.find(b"\n", end)
+            end = size if newline == -1 else newline + 1
+            count += 1
+        yield (start, end, line)
+        line += count
+        start = end
+
+
+def parse_record(
+    raw: bytes, fmt: ScanFormats, text_field: str, max_length: int = TEXT_MAX_LENGTH
+) -> str:
+    """Extract the text to process from a single input line, raises ValueError if unusable"""
+    line = raw.decode("utf-8").rstrip("\r\n")
+    if fmt is ScanFormats.JSONL:
+        record = json.loads(line)
+        if not isinstance(record, dict) or not isinstance(record.get(text_field), str):
+            raise ValueError(f"record has no string field '{text_field}'")
+        line = record[text_field]
+    if len(line) > max_length:
+        raise ValueError(f"record is longer than {max_length} characters")
+    return line
+
+
+def process_record(pii: dict[str, dict], mode: ScanModes, salt: str | None) -> dict:
+    """Apply the same output formatting as the API endpoints to a pipeline result"""
+    entities = EntityTable.from_pii(pii)
+    match mode:
+        case ScanModes.ANONYMIZE:
+            return anonymize_pii_for_output(pii, entities)
+        case ScanModes.ENCODE:
+            return encode_pii_for_output(pii, salt, entities)
+    return format_pii_for_output(pii, entities)
+
+
+def run_texts(pipeline, texts: list[str]) -> tuple[dict[str, dict], dict[str, str]]:
+    """Pipeline results per text and errors per text that could not be processed
+
+    The texts are run as one batch, if that fails each text is run alone so a single bad
+    record does not take the others down with it.
+    """
+    try:
+        return pipeline.run_text_pipeline_sync(texts), {}
+    except Exception as exc:  # pylint: disable=broad-except
+        if len(texts) == 1:
+            return {}, {texts[0]: f"pipeline failed: {exc}"}
+    results = {}
+    errors = {}
+    for text in texts:
+        try:
+            results.update(pipeline.run_text_pipeline_sync([text]))
+        except Exception as exc:  # pylint: disable=broad-except
+            errors[text] = f"pipeline failed: {exc}"
+    return results, errors
+
+
+def process_batch(batch: tuple[int, int, int]) -> tuple[int, int, list[str]]:
+    """Run the pipeline over one batch of lines
+
+    Returns the end offset and next line number of the batch with its serialized output lines
+    """
+    start, end, first_line = batch
+    state = _WORKER_STATE
+    texts = {}  # line number to text for every line that can be processed
+    output = {}  # line number to output record
+    raw_lines = state["map"][start:end].split(b"\n")
+    if raw_lines[-1] == b"":
+        # the batch ends with a newline, splitting leaves an empty trailing element
+        raw_lines.pop()
+    for offset, raw in enumerate(raw_lines):
+        line = first_line + offset
+        try:
+            text = parse_record(raw, state["format"], state["text_field"], state["max_length"])
+        except ValueError as exc:
+            output[line] = {SCAN_LINE_KEY: line, SCAN_ERROR_KEY: str(exc)}
+            continue
+        if text.strip():
+            texts[line] = text
+
+    if texts:
+        # the pipeline keys its results by text so duplicate lines are only processed once
+        unique = list(dict.fromkeys(texts.values()))
+        result, errors = run_texts(state["pipeline"], unique)
+        for line, text in texts.items():
+            if text in errors:
+                output[line] = {SCAN_LINE_KEY: line, SCAN_ERROR_KEY: errors[text]}
+                continue
+            record = process_record({text: result[text]}, state["mode"], state["salt"])
+            output[line] = {SCAN_LINE_KEY: line, **record}
+
+    lines = [json.dumps(output[line]) + "\n" for line in sorted(output)]
+    return (end, first_line + len(raw_lines), lines)
+
+
+def load_checkpoint(checkpoint_path: str | None) -> dict:
+    """Read a checkpoint written by a previous run, an empty dict if there is none"""
+    if checkpoint_path is None or not os.path.exists(checkpoint_path):
+        return {}
+    with open(checkpoint_path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save_checkpoint(checkpoint_path: str | None, state: dict):
+    """Atomically replace the checkpoint so a crash never leaves a partial file behind"""
+    if checkpoint_path is None:
+        return
+    temp_path = f"{checkpoint_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(state, file)
+    os.replace(temp_path, checkpoint_path)
+
+
+def report_progress(done: int, total: int, records: int, elapsed: float):
+    """Print progress information to stderr"""
+    percent = 100.0 * done / total if total else 100.0
+    rate = records / elapsed if elapsed else 0.0
+    print(
+        f"{percent:5.1f}% {records} records {rate:.1f} records/s",
+        file=sys.stderr,
+    )
+
+
+def scan_options(
+    mode: ScanModes, salt: str | None, fmt: ScanFormats, text_field: str, max_length: int
+) -> dict:
+    """Options a checkpoint was written with, a resumed scan must use the same ones
+
+    Only a digest of the salt is kept so the checkpoint does not leak it.
+    """
+    return {
+        "mode": mode.value,
+        "salt": hashlib.sha256(salt.encode("utf-8")).hexdigest() if salt else None,
+        "format": fmt.value,
+        "text_field": text_field,
+        "max_length": max_length,
+    }
+
+
+def scan(
+    input_path: str,
+    output_path: str,
+    mode: ScanModes = ScanModes.ANNOTATE,
+    salt: str | None = None,
+    fmt: ScanFormats = ScanFormats.TEXT,
+    text_field: str = SCAN_DEFAULT_TEXT_FIELD,
+    batch_size: int = SCAN_DEFAULT_BATCH_SIZE,
+    workers: int | None = None,
+    checkpoint_path: str | None = None,
+    max_length: int = TEXT_MAX_LENGTH,
+) -> dict:
+    """Process every record of input_path and write JSONL results to output_path
+
+    Records longer than max_length, by default the limit of the API, are reported as errors.
+    """
+    workers = workers or os.cpu_count() or 1
+    checkpoint = load_checkpoint(checkpoint_path)
+    if checkpoint and checkpoint.get("input") != os.path.abspath(input_path):
+        raise ValueError(f"checkpoint '{checkpoint_path}' belongs to another input file")
+    options = scan_options(mode, salt, fmt, text_field, max_length)
+    if checkpoint:
+        stored = checkpoint.get("options", {})
+        changed = sorted(key for key in options if stored.get(key) != options[key])
+        if changed:
+            raise ValueError(
+                f"checkpoint '{checkpoint_path}' was written with different options: "
+                f"{', '.join(changed)}"
+            )
+    position = checkpoint.get("input_offset", 0)
+    first_line = checkpoint.get("lines", 0)
+    records = checkpoint.get("records", 0)
+
+    with open(input_path, "rb") as handle, open(output_path, "ab") as output:
+        # discard anything written after the last checkpoint, it is about to be rewritten
+        output.truncate(checkpoint.get("output_offset", 0))
+        output.seek(0, os.SEEK_END)
+        data = map_file(handle)
+        total = len(data)
+        batches = split_batches(data, batch_size, position, first_line)
+        initargs = (input_path, mode.value, salt, text_field, fmt.value, max_length)
+
+        start_time = time.monotonic()
+        last_report = start_time
+        processed_bytes = 0
+        processed_records = 0
+        pool = None
+        if workers > 1:
+            pool = multiprocessing.Pool(workers, initializer=init_worker, initargs=initargs)
+            results = pool.imap(process_batch, batches)
+        else:
+            init_worker(*initargs)
+            results = map(process_batch, batches)
+
+        try:
+            for end, first_line, lines in results:
+                output.write("".join(lines).encode("utf-8"))
+                output.flush()
+                processed_bytes += end - position
+                position = end
+                processed_records += len(lines)
+                records += len(lines)
+                save_checkpoint(
+                    checkpoint_path,
+                    {
+                        "input": os.path.abspath(input_path),
+                        "input_offset": position,
+                        "output_offset": output.tell(),
+                        "lines": first_line,
+                        "records": records,
+                        "options": options,
+                    },
+                )
+                now = time.monotonic()
+                if now - last_report >= SCAN_PROGRESS_INTERVAL:
+                    report_progress(position, total, records, now - start_time)
+                    last_report = now
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+    elapsed = time.monotonic() - start_time
+    summary = {
+        "records": processed_records,
+        "bytes": processed_bytes,
+        "seconds": round(elapsed, 3),
+        "records_per_second": round(processed_records / elapsed, 1) if elapsed else 0.0,
+        "mb_per_second": round(processed_bytes / elapsed / 1e6, 3) if elapsed else 0.0,
+        "workers": workers,
+    }
+    report_progress(total, total, records, elapsed)
+    return summary
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser for all CLI commands"""
+    parser = argparse.ArgumentParser(prog=CLI_PROG_NAME)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scan_parser = commands.add_parser("scan", help="detect or anonymize PII in a local file")
+    scan_parser.add_argument("input", help="text file with one record per line, or JSONL")
+    scan_parser.add_argument("output", help="JSONL file the results are written to")
+    scan_parser.add_argument(
+        "--mode", choices=[m.value for m in ScanModes], default=ScanModes.ANNOTATE.value
+    )
+    scan_parser.add_argument("--salt", help="salt for reversible anonymization (encode mode)")
+    scan_parser.add_argument(
+        "--format", choices=[f.value for f in ScanFormats], default=ScanFormats.TEXT.value
+    )
+    scan_parser.add_argument(
+        "--text-field", default=SCAN_DEFAULT_TEXT_FIELD, help="JSONL field holding the text"
+    )
+    scan_parser.add_argument("--batch-size", type=int, default=SCAN_DEFAULT_BATCH_SIZE)
+    scan_parser.add_argument(
+        "--workers", type=int, help="worker processes, defaults to all cores"
+    )
+    scan_parser.add_argument("--checkpoint", help="checkpoint file used to resume a scan")
+    scan_parser.add_argument(
+        "--max-length",
+        type=int,
+        default=TEXT_MAX_LENGTH,
+        help="longest record in characters, defaults to the limit of the API",
+    )
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    """CLI entry point"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    mode = ScanModes(args.mode)
+    if mode is ScanModes.ENCODE and not args.salt:
+        parser.error("--salt is required in encode mode")
+    if args.salt is not None and not SALT_MIN_LENGTH <= len(args.salt) <= SALT_MAX_LENGTH:
+        parser.error(
+            f"--salt must be between {SALT_MIN_LENGTH} and {SALT_MAX_LENGTH} characters"
+        )
+
+    try:
+        summary = scan(
+            args.input,
+            args.output,
+            mode=mode,
+            salt=args.salt,
+            fmt=ScanFormats(args.format),
+            text_field=args.text_field,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            checkpoint_path=args.checkpoint,
+            max_length=args.max_length,
+        )
+    except ValueError as e:
+        # a checkpoint that cannot be resumed is a usage error, not a crash
+        parser.error(str(e))
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
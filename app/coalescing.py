@@ -0,0 +1,81 @@
+"""Coalescing of concurrent identical pipeline calls into a single run"""
+
+# Standard library imports
+import os
+import threading
+from typing import Callable
+
+# Local imports
+from cache import content_key
+from constants import COALESCING_ENABLED_KEY
+from metrics import Counter, register
+
+COALESCING_ENABLED = os.getenv(COALESCING_ENABLED_KEY, "true").lower() == "true"
+
+
+def request_key(text: str, lang: str) -> bytes:
+    """Hash identifying identical pipeline inputs"""
+    return content_key(f"{lang}\0{text}")
+
+
+class _Flight:
+    """A pipeline call in progress that later callers can wait for"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs func once per key at a time, concurrent callers with the same key share its result
+
+    The result is shared, so callers must treat it as read only.
+    """
+
+    def __init__(self):
+        self.flights = {}
+        self.lock = threading.Lock()
+        self.leaders = Counter("coalescing_leaders_total", "Pipeline calls actually run")
+        self.followers = Counter(
+            "coalescing_followers_total", "Requests served by waiting for an identical call"
+        )
+        register(
+            "coalescing_rate",
+            "Fraction of pipeline calls served by an identical call already in flight",
+            self.rate,
+        )
+
+    def rate(self) -> float:
+        """Fraction of calls that were coalesced"""
+        calls = self.leaders.value + self.followers.value
+        return self.followers.value / calls if calls else 0.0
+
+    def run(self, key, func: Callable):
+        """Call func, or wait for the call already running for key and return its result"""
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self.flights[key] = flight
+
+        if not leader:
+            self.followers.inc()
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        self.leaders.inc()
+        try:
+            flight.result = func()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            # later callers start a new flight, by then a cache may hold the result
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+        return flight.result
@@ -0,0 +1,385 @@
+"""Negotiated compression of responses and decompression of request bodies"""
+
+# Standard library imports
+import io
+import json
+import os
+import zlib
+
+# Third party imports
+from fastapi import status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+# Local imports
+from constants import (
+    COMPRESSIBLE_CONTENT_TYPES,
+    COMPRESSION_DEFAULT_LEVEL,
+    COMPRESSION_DEFAULT_MAX_REQUEST_SIZE,
+    COMPRESSION_DEFAULT_MIN_SIZE,
+    COMPRESSION_ENABLED_KEY,
+    COMPRESSION_LEVEL_KEY,
+    COMPRESSION_MAX_REQUEST_SIZE_KEY,
+    COMPRESSION_MIN_SIZE_KEY,
+    COMPRESSION_ROUTES_KEY,
+    ContentEncodings,
+    ExceptionMessages,
+)
+
+# zstd and brotli are optional, gzip is always available
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the installed extras
+    zstandard = None
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the installed extras
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv(COMPRESSION_ENABLED_KEY, "false").lower() == "true"
+# HTTP_413_REQUEST_ENTITY_TOO_LARGE is deprecated, older starlette releases lack the new name
+HTTP_413 = getattr(status, "HTTP_413_CONTENT_TOO_LARGE", 413)
+
+
+class GzipStream:
+    """Incremental gzip compressor, each chunk is flushed so it can be streamed immediately"""
+
+    def __init__(self, level: int):
+        self.compressor = zlib.compressobj(min(max(level, 1), 9), zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        """Compress a chunk of a streamed body"""
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        """Terminate the compressed stream"""
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliStream:
+    """Incremental brotli compressor"""
+
+    def __init__(self, level: int):
+        self.compressor = brotli.Compressor(quality=min(max(level, 0), 11))
+
+    def compress(self, data: bytes) -> bytes:
+        """Compress a chunk of a streamed body"""
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def finish(self) -> bytes:
+        """Terminate the compressed stream"""
+        return self.compressor.finish()
+
+
+class ZstdStream:
+    """Incremental zstd compressor"""
+
+    def __init__(self, level: int):
+        self.compressor = zstandard.ZstdCompressor(level=min(max(level, 1), 22)).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        """Compress a chunk of a streamed body"""
+        return self.compressor.compress(data) + self.compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+    def finish(self) -> bytes:
+        """Terminate the compressed stream"""
+        return self.compressor.flush()
+
+
+def available_encodings() -> dict[ContentEncodings, type]:
+    """Encodings usable with the installed libraries in server preference order"""
+    result = {}
+    if zstandard is not None:
+        result[ContentEncodings.ZSTD] = ZstdStream
+    if brotli is not None:
+        result[ContentEncodings.BROTLI] = BrotliStream
+    result[ContentEncodings.GZIP] = GzipStream
+    return result
+
+
+def decompress_body(encoding: ContentEncodings, data: bytes, limit: int) -> bytes:
+    """Decompress a request body, raising OverflowError if it expands beyond limit bytes"""
+    match encoding:
+        case ContentEncodings.GZIP:
+            decompressor = zlib.decompressobj(47)  # 32 + 15 accepts gzip and zlib headers
+            result = decompressor.decompress(data, limit + 1)
+        case ContentEncodings.ZSTD:
+            reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data))
+            result = reader.read(limit + 1)
+        case ContentEncodings.BROTLI:
+            # the output limit is approximate, the length check below enforces it exactly
+            result = brotli.Decompressor().process(data, output_buffer_limit=limit + 1)
+    if len(result) > limit:
+        raise OverflowError(len(result))
+    return result
+
+
+def negotiate_encoding(accept_encoding: str, encodings) -> ContentEncodings | None:
+    """Pick the preferred supported encoding from an Accept-Encoding header"""
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name.strip().lower()] = quality
+
+    best = None
+    best_quality = 0.0
+    # encodings are ordered by server preference, which breaks ties between equal weights
+    for encoding in encodings:
+        quality = weights.get(encoding.value, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class RouteCompression:
+    """Compression settings for a route"""
+
+    def __init__(self, level: int, min_size: int):
+        self.level = level
+        self.min_size = min_size
+
+
+def load_route_settings() -> tuple[RouteCompression, dict[str, RouteCompression]]:
+    """Read the default and per route compression settings from the environment
+
+    Per route settings are a JSON object keyed by path, e.g.
+    {"/api/anonymize/reversible": {"level": 3, "min_size": 512}}
+    """
+    default = RouteCompression(
+        int(os.getenv(COMPRESSION_LEVEL_KEY, str(COMPRESSION_DEFAULT_LEVEL))),
+        int(os.getenv(COMPRESSION_MIN_SIZE_KEY, str(COMPRESSION_DEFAULT_MIN_SIZE))),
+    )
+    routes = {}
+    try:
+        for path, values in json.loads(os.getenv(COMPRESSION_ROUTES_KEY, "{}")).items():
+            routes[path] = RouteCompression(
+                int(values.get("level", default.level)),
+                int(values.get("min_size", default.min_size)),
+            )
+    except (ValueError, AttributeError) as e:
+        print(f"Invalid {COMPRESSION_ROUTES_KEY}, using default compression settings: {e}")
+    return default, routes
+
+
+def get_header(headers, name: bytes) -> str | None:
+    """Read a header from a list of raw ASGI headers"""
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+def vary_on_encoding(headers: list) -> list:
+    """Headers with Accept-Encoding added to Vary, as the response was negotiated"""
+    vary = get_header(headers, b"vary")
+    if vary and "accept-encoding" in vary.lower():
+        return headers
+    vary = f"{vary}, Accept-Encoding" if vary else "Accept-Encoding"
+    return [(key, value) for key, value in headers if key.lower() != b"vary"] + [
+        (b"vary", vary.encode("latin-1"))
+    ]
+
+
+class CompressionMiddleware:
+    """ASGI middleware negotiating Content-Encoding for responses and decoding request bodies
+
+    Complete responses smaller than the route threshold are sent unchanged. Streamed responses
+    are compressed chunk by chunk so they are never buffered in full.
+    """
+
+    def __init__(
+        self,
+        app,
+        default: RouteCompression | None = None,
+        routes: dict[str, RouteCompression] | None = None,
+        max_request_size: int | None = None,
+    ):
+        self.app = app
+        if default is None:
+            default, env_routes = load_route_settings()
+            routes = env_routes if routes is None else routes
+        self.default = default
+        self.routes = routes or {}
+        if max_request_size is None:
+            max_request_size = int(
+                os.getenv(
+                    COMPRESSION_MAX_REQUEST_SIZE_KEY, str(COMPRESSION_DEFAULT_MAX_REQUEST_SIZE)
+                )
+            )
+        self.max_request_size = max_request_size
+        self.encodings = available_encodings()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = scope.get("headers", [])
+        if get_header(headers, b"content-encoding") not in (None, "identity"):
+            scope, receive = await self.decode_request(scope, receive, send)
+            if scope is None:
+                return
+
+        encoding = negotiate_encoding(
+            get_header(headers, b"accept-encoding") or "", self.encodings
+        )
+        settings = self.routes.get(scope["path"], self.default)
+        # responses left uncompressed still depend on Accept-Encoding and are marked so
+        stream_type = self.encodings[encoding] if encoding is not None else None
+        responder = _CompressedResponder(send, encoding, stream_type, settings)
+        await self.app(scope, receive, responder.send)
+
+    async def decode_request(self, scope, receive, send):
+        """Replace a compressed request body with its decompressed form
+
+        The compressed body is limited to max_request_size bytes like the decompressed one, and
+        is decompressed in a worker thread so large bodies do not block the event loop.
+        Returns the new scope and receive callable, or (None, None) once an error was sent
+        """
+        headers = scope["headers"]
+        name = get_header(headers, b"content-encoding").strip().lower()
+        try:
+            encoding = ContentEncodings(name)
+            if encoding not in self.encodings:
+                raise ValueError(name)
+        except ValueError:
+            supported = ", ".join(e.value for e in self.encodings)
+            detail = f"{ExceptionMessages.UNSUPPORTED_ENCODING.value} {supported}"
+            await JSONResponse(
+                {"detail": detail}, status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )(scope, receive, send)
+            return None, None
+
+        length = get_header(headers, b"content-length")
+        too_large = (
+            length is not None and length.isdigit() and int(length) > self.max_request_size
+        )
+        chunks = []
+        received = 0
+        more_body = not too_large
+        while more_body:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            received += len(chunks[-1])
+            more_body = message.get("more_body", False)
+            if received > self.max_request_size:
+                # stop reading, the rest of the body is never buffered
+                too_large = True
+                break
+        if too_large:
+            await JSONResponse(
+                {"detail": ExceptionMessages.COMPRESSED_BODY_TOO_LARGE.value},
+                status_code=HTTP_413,
+            )(scope, receive, send)
+            return None, None
+        try:
+            body = await run_in_threadpool(
+                decompress_body, encoding, b"".join(chunks), self.max_request_size
+            )
+        except OverflowError:
+            await JSONResponse(
+                {"detail": ExceptionMessages.ENCODED_BODY_TOO_LARGE.value},
+                status_code=HTTP_413,
+            )(scope, receive, send)
+            return None, None
+        except Exception:  # pylint: disable=broad-except
+            # each library raises its own error type for corrupt input
+            await JSONResponse(
+                {"detail": ExceptionMessages.INVALID_ENCODED_BODY.value},
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )(scope, receive, send)
+            return None, None
+
+        new_headers = [
+            (key, value)
+            for key, value in headers
+            if key.lower() not in (b"content-encoding", b"content-length")
+        ]
+        new_headers.append((b"content-length", str(len(body)).encode("latin-1")))
+        sent = False
+
+        async def receive_decoded():
+            nonlocal sent
+            if sent:
+                # the body has been consumed, wait for the disconnect like the server would
+                return await receive()
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        return {**scope, "headers": new_headers}, receive_decoded
+
+
+class _CompressedResponder:
+    """Wraps the ASGI send callable of a single response to compress its body"""
+
+    def __init__(
+        self, send, encoding: ContentEncodings | None, stream_type, settings: RouteCompression
+    ):
+        self.downstream = send
+        self.encoding = encoding
+        self.stream_type = stream_type
+        self.settings = settings
+        self.start_message = None
+        self.stream = None
+        self.passthrough = False
+
+    def should_compress(self, headers, first_chunk: bytes, more_body: bool) -> bool:
+        """Decide from the response headers and the first body chunk"""
+        if self.encoding is None or get_header(headers, b"content-encoding") is not None:
+            return False
+        content_type = get_header(headers, b"content-type") or ""
+        if not content_type.startswith(COMPRESSIBLE_CONTENT_TYPES):
+            return False
+        if more_body:
+            length = get_header(headers, b"content-length")
+            return length is None or int(length) >= self.settings.min_size
+        return len(first_chunk) >= self.settings.min_size
+
+    async def send(self, message):
+        """Replacement send callable handed to the wrapped application"""
+        if message["type"] == "http.response.start":
+            # hold the start until the first body chunk shows whether to compress
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.stream is None:
+            headers = list(self.start_message.get("headers", []))
+            if not self.should_compress(headers, body, more_body):
+                self.passthrough = True
+                await self.downstream(
+                    {**self.start_message, "headers": vary_on_encoding(headers)}
+                )
+                await self.downstream(message)
+                return
+            self.stream = self.stream_type(self.settings.level)
+            headers = vary_on_encoding(
+                [(key, value) for key, value in headers if key.lower() != b"content-length"]
+            )
+            headers.append((b"content-encoding", self.encoding.value.encode("latin-1")))
+            if not more_body:
+                # complete bodies are compressed in one go and keep an exact content-length
+                compressed = self.stream.compress(body) + self.stream.finish()
+                headers.append((b"content-length", str(len(compressed)).encode("latin-1")))
+                await self.downstream({**self.start_message, "headers": headers})
+                await self.downstream({**message, "body": compressed})
+                return
+            await self.downstream({**self.start_message, "headers": headers})
+
+        chunk = self.stream.compress(body) if body else b""
+        if not more_body:
+            chunk += self.stream.finish()
+        await self.downstream({**message, "body": chunk})
@@ -0,0 +1,175 @@
+"""Cached configuration from the environment, the .env file and the system YAML files
+
+The configuration is loaded once into an immutable snapshot that request handlers read from
+memory. A background thread watches the files and swaps in a new snapshot when one changes.
+"""
+
+# Standard library imports
+import os
+import threading
+from types import MappingProxyType
+from typing import Callable
+
+# Local imports
+from constants import (
+    CONFIG_DEFAULT_WATCH_INTERVAL,
+    CONFIG_ENCODING,
+    CONFIG_WATCH_INTERVAL_KEY,
+    DOTENV_FILE_NAME,
+    FILE_PATH_LIST,
+    SYSTEM_FILE_NAME,
+)
+
+
+def find_upwards(name: str, directory: str) -> str | None:
+    """Path of the first file called name in directory or one of its parents"""
+    while True:
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            return path
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+# searched from this module up like python-dotenv's find_dotenv, without importing it
+DOTENV_PATH = find_upwards(
+    DOTENV_FILE_NAME, os.path.dirname(os.path.abspath(__file__))
+) or os.path.join(os.getcwd(), DOTENV_FILE_NAME)
+# system files in order of priority, as searched by telemetry.config_generator
+YAML_PATHS = tuple(f"{os.path.expanduser(path)}{SYSTEM_FILE_NAME}" for path in FILE_PATH_LIST)
+WATCHED_PATHS = (DOTENV_PATH,) + YAML_PATHS
+
+
+class ConfigSnapshot:
+    """Read-only view of the configuration at one point in time"""
+
+    def __init__(self, values: dict, mtimes: dict):
+        self.values = MappingProxyType(dict(values))
+        self.mtimes = MappingProxyType(dict(mtimes))  # watched path -> mtime, None if missing
+
+    def get(self, key: str, default=None):
+        """Value of a key, the environment taking precedence over .env and the YAML files"""
+        return self.values.get(key, default)
+
+
+def file_mtime(path: str) -> int | None:
+    """Modification time of a file in nanoseconds, None when it does not exist"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def read_yaml(path: str) -> dict:
+    """Read a system YAML file, empty when missing or invalid"""
+    if not os.path.isfile(path):
+        return {}
+    # imported here as PyYAML is only needed when a system file exists
+    import yaml  # pylint: disable=import-outside-toplevel
+
+    try:
+        with open(path, "r", encoding=CONFIG_ENCODING) as file:
+            data = yaml.safe_load(file)
+    except FileNotFoundError:
+        return {}
+    except (OSError, yaml.YAMLError) as e:
+        print(f"Failed to read config file '{path}': {e}")
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def read_dotenv(path: str) -> dict:
+    """Read the .env file, empty when missing"""
+    if not os.path.isfile(path):
+        return {}
+    # imported here as python-dotenv is only needed when the file exists
+    from dotenv import dotenv_values  # pylint: disable=import-outside-toplevel
+
+    return {key: value for key, value in dotenv_values(path).items() if value is not None}
+
+
+def load_dotenv_into_environment() -> dict:
+    """Export .env values that are not already set, as python-dotenv's load_dotenv does
+
+    Settings read from os.environ at import time see them too. Returns the exported values,
+    which are reread from the file on reload rather than taken from the environment.
+    """
+    exported = {
+        key: value for key, value in read_dotenv(DOTENV_PATH).items() if key not in os.environ
+    }
+    os.environ.update(exported)
+    return exported
+
+
+_DOTENV_EXPORTED = load_dotenv_into_environment()
+
+
+def load_snapshot() -> ConfigSnapshot:
+    """Read every source into a new snapshot"""
+    # mtimes are taken first so a change made while reading triggers another reload
+    mtimes = {path: file_mtime(path) for path in WATCHED_PATHS}
+    values = {}
+    for path in reversed(YAML_PATHS):
+        values.update({str(key): value for key, value in read_yaml(path).items()})
+    values.update(read_dotenv(DOTENV_PATH))
+    for key, value in os.environ.items():
+        if _DOTENV_EXPORTED.get(key) != value:
+            values[key] = value
+    return ConfigSnapshot(values, mtimes)
+
+
+_SNAPSHOT = load_snapshot()
+_RELOAD_LOCK = threading.Lock()
+
+
+def get_config() -> ConfigSnapshot:
+    """Current configuration snapshot, served from memory"""
+    return _SNAPSHOT
+
+
+def reload_config() -> ConfigSnapshot:
+    """Reload every source and atomically replace the current snapshot"""
+    global _SNAPSHOT
+    with _RELOAD_LOCK:
+        _SNAPSHOT = load_snapshot()
+    return _SNAPSHOT
+
+
+def reload_if_changed() -> bool:
+    """Reload when a watched file was created, modified or removed since the last load"""
+    current = get_config().mtimes
+    if all(file_mtime(path) == current.get(path) for path in WATCHED_PATHS):
+        return False
+    reload_config()
+    print("Configuration reloaded")
+    return True
+
+
+def watch(
+    interval: float, stopped: threading.Event, check: Callable[[], bool] = reload_if_changed
+):
+    """Poll the watched files until stopped, check reloads whatever changed"""
+    while not stopped.wait(interval):
+        try:
+            check()
+        except Exception as e:  # pylint: disable=broad-except
+            print(f"Configuration reload failed: {e}")
+
+
+def start_watcher() -> threading.Event | None:
+    """Watch the files from a daemon thread, returns the event stopping it"""
+    interval = float(os.getenv(CONFIG_WATCH_INTERVAL_KEY, str(CONFIG_DEFAULT_WATCH_INTERVAL)))
+    if interval <= 0:
+        return None
+    stopped = threading.Event()
+    threading.Thread(
+        target=watch, args=(interval, stopped), name="config-watcher", daemon=True
+    ).start()
+    return stopped
+
+
+start_watcher()
+# threads do not survive fork, so forked workers start their own watcher
+os.register_at_fork(after_in_child=start_watcher)
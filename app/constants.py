@@ -2,17 +2,69 @@
 
 from enum import Enum
 
-# Define a regex pattern to encompass extended ASCII characters
-VALID_INPUT_PATTERN = r"^[\x00-\xFF]+$"
+# Define a regex pattern accepting any Unicode text, lone surrogates cannot be encoded as UTF-8
+VALID_INPUT_PATTERN = r"^[^\ud800-\udfff]+$"
+VALID_INPUT_DESCRIPTION = "Unicode text without lone surrogates"
+
+# Limits of the request fields
+TEXT_MIN_LENGTH = 1
+TEXT_MAX_LENGTH = 1000
+SCAN_TEXT_MAX_LENGTH = 1_000_000
+SALT_MIN_LENGTH = 16
+SALT_MAX_LENGTH = 64
 
 # List of languages codes supported by DataFog
 SUPPORTED_LANGUAGES = ["EN"]
 
+# Entity labels produced by the DataFog PII pipeline
+PII_ANNOTATION_LABELS = ["DATE_TIME", "LOC", "NRP", "ORG", "PER"]
+
+# Overlap resolution Constants
+OVERLAP_POLICY_KEY = "DATAFOG_OVERLAP_POLICY"
+TYPE_PRIORITY_KEY = "DATAFOG_TYPE_PRIORITY"
+# Default precedence of entity types when spans overlap, earlier types win
+DEFAULT_TYPE_PRIORITY = ["PER", "ORG", "LOC", "NRP", "DATE_TIME"]
+
+# Pipeline Constants
+PIPELINE_KEY = "DATAFOG_PIPELINE"
+PATTERN_PIPELINE_DELAY_KEY = "DATAFOG_PATTERN_PIPELINE_DELAY_MS"
+NLP_MODEL_KEY = "DATAFOG_NLP_MODEL"
+NLP_EXCLUDE_KEY = "DATAFOG_NLP_EXCLUDE"
+NLP_LABELS_KEY = "DATAFOG_NLP_LABELS"
+NLP_DEFAULT_MODEL = "en_spacy_pii_fast"
+# spaCy components not needed for entity recognition, skipped when the model has them
+NLP_DEFAULT_EXCLUDE = [
+    "tagger", "parser", "attribute_ruler", "lemmatizer", "morphologizer", "senter",
+    "sentencizer", "textcat", "entity_linker",
+]
+NLP_MAX_TEXT_LENGTH = 1000000  # longer texts are truncated, as by datafog
+NLP_REPORT_TEXT = "Dr. Jane Smith met Acme Corp representatives in Boston on May 5, 2023."
+
 # Authorization Constants
 AUTH_TYPE_KEY = "DATAFOG_AUTH_TYPE"
 USER_KEY = "DATAFOG_AUTH_USER"
 PASSWORD_KEY = "DATAFOG_PASSWORD"
 
+# Rate limiting Constants
+RATE_LIMIT_ENABLED_KEY = "DATAFOG_RATE_LIMIT_ENABLED"
+RATE_LIMIT_CREDENTIAL_RATE_KEY = "DATAFOG_RATE_LIMIT_CREDENTIAL_RATE"
+RATE_LIMIT_CREDENTIAL_BURST_KEY = "DATAFOG_RATE_LIMIT_CREDENTIAL_BURST"
+RATE_LIMIT_IP_RATE_KEY = "DATAFOG_RATE_LIMIT_IP_RATE"
+RATE_LIMIT_IP_BURST_KEY = "DATAFOG_RATE_LIMIT_IP_BURST"
+RATE_LIMIT_COST_BYTES_KEY = "DATAFOG_RATE_LIMIT_COST_BYTES"
+RATE_LIMIT_MAX_KEYS_KEY = "DATAFOG_RATE_LIMIT_MAX_KEYS"
+RATE_LIMIT_DEFAULT_CREDENTIAL_RATE = 20.0
+RATE_LIMIT_DEFAULT_CREDENTIAL_BURST = 40.0
+RATE_LIMIT_DEFAULT_IP_RATE = 10.0
+RATE_LIMIT_DEFAULT_IP_BURST = 20.0
+RATE_LIMIT_DEFAULT_COST_BYTES = 1000
+RATE_LIMIT_DEFAULT_MAX_KEYS = 100000
+
+# Configuration Constants
+CONFIG_WATCH_INTERVAL_KEY = "DATAFOG_CONFIG_WATCH_INTERVAL"
+CONFIG_DEFAULT_WATCH_INTERVAL = 5.0
+DOTENV_FILE_NAME = ".env"
+
 # Telemetry Constants
 API_VERSION_KEY = "DATAFOG_API_VERSION"
 APP_NAME = "datafog-api"
@@ -22,6 +74,13 @@ DEPLOY_TYPE_KEY = "DATAFOG_DEPLOYMENT_TYPE"
 SYSTEM_FILE_NAME = "api.system.yaml"
 TELEMETRY_APP_KEY = "app"
 UUID_KEY = "DATAFOG_UUID"
+TELEMETRY_URL_KEY = "DATAFOG_TELEMETRY_URL"
+TELEMETRY_TIMEOUT = 3
+USAGE_TELEMETRY_ENABLED_KEY = "DATAFOG_USAGE_TELEMETRY_ENABLED"
+USAGE_FLUSH_INTERVAL_KEY = "DATAFOG_USAGE_FLUSH_INTERVAL"
+USAGE_MAX_PENDING_KEY = "DATAFOG_USAGE_MAX_PENDING"
+USAGE_DEFAULT_FLUSH_INTERVAL = 300.0
+USAGE_DEFAULT_MAX_PENDING = 100000
 FILE_PATH_LIST = [
     "~/.datafog/",
     "./datafog/",
@@ -29,6 +88,171 @@ FILE_PATH_LIST = [
     "/tmp/"
 ]
 
+# Profiling Constants
+PROFILE_ENABLED_KEY = "DATAFOG_PROFILE_ENABLED"
+PROFILE_SAMPLE_RATE_KEY = "DATAFOG_PROFILE_SAMPLE_RATE"
+PROFILE_DIR_KEY = "DATAFOG_PROFILE_DIR"
+PROFILE_MAX_FILES_KEY = "DATAFOG_PROFILE_MAX_FILES"
+PROFILE_TOKEN_KEY = "DATAFOG_PROFILE_TOKEN"
+PROFILE_HEADER = "x-datafog-profile"
+PROFILE_DEFAULT_DIR = "/tmp/datafog/profiles/"
+PROFILE_DEFAULT_MAX_FILES = 100
+PROFILE_FILE_SUFFIX = ".prof"
+
+# Tracing Constants
+TRACING_ENABLED_KEY = "DATAFOG_TRACING_ENABLED"
+TRACE_EXPORTER_KEY = "DATAFOG_TRACE_EXPORTER"
+TRACE_FILE_KEY = "DATAFOG_TRACE_FILE"
+TRACE_DEFAULT_FILE = "/tmp/datafog/traces.jsonl"
+TRACE_QUEUE_SIZE_KEY = "DATAFOG_TRACE_QUEUE_SIZE"
+TRACE_DEFAULT_QUEUE_SIZE = 1000
+TRACEPARENT_HEADER = "traceparent"
+SERVER_TIMING_HEADER = "server-timing"
+TRACE_ROOT_SPAN = "total"
+
+# Compression Constants
+COMPRESSION_ENABLED_KEY = "DATAFOG_COMPRESSION_ENABLED"
+COMPRESSION_LEVEL_KEY = "DATAFOG_COMPRESSION_LEVEL"
+COMPRESSION_MIN_SIZE_KEY = "DATAFOG_COMPRESSION_MIN_SIZE"
+COMPRESSION_ROUTES_KEY = "DATAFOG_COMPRESSION_ROUTES"
+COMPRESSION_MAX_REQUEST_SIZE_KEY = "DATAFOG_COMPRESSION_MAX_REQUEST_SIZE"
+COMPRESSION_DEFAULT_LEVEL = 6
+COMPRESSION_DEFAULT_MIN_SIZE = 1024
+COMPRESSION_DEFAULT_MAX_REQUEST_SIZE = 10 * 1024 * 1024
+COMPRESSIBLE_CONTENT_TYPES = ("text/", "application/json", "application/msgpack")
+
+# Production server Constants
+SERVER_BIND_KEY = "DATAFOG_BIND"
+SERVER_WORKERS_KEY = "DATAFOG_WORKERS"
+SERVER_MAX_REQUESTS_KEY = "DATAFOG_MAX_REQUESTS"
+SERVER_MAX_REQUESTS_JITTER_KEY = "DATAFOG_MAX_REQUESTS_JITTER"
+SERVER_GRACEFUL_TIMEOUT_KEY = "DATAFOG_GRACEFUL_TIMEOUT"
+SERVER_WORKER_TIMEOUT_KEY = "DATAFOG_WORKER_TIMEOUT"
+SERVER_THREADS_PER_WORKER_KEY = "DATAFOG_THREADS_PER_WORKER"
+SERVER_DEFAULT_BIND = "0.0.0.0:8000"
+SERVER_AUTO_WORKERS = "auto"
+SERVER_DEFAULT_MAX_REQUESTS = 10000
+SERVER_DEFAULT_MAX_REQUESTS_JITTER = 1000
+SERVER_DEFAULT_GRACEFUL_TIMEOUT = 30
+SERVER_DEFAULT_WORKER_TIMEOUT = 120
+SERVER_DEFAULT_THREADS_PER_WORKER = 1
+CGROUP_ROOT = "/sys/fs/cgroup"
+# Environment variables sizing the thread pools of native numeric libraries
+NATIVE_THREAD_ENV_VARS = [
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "BLIS_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+]
+
+# Request coalescing Constants
+COALESCING_ENABLED_KEY = "DATAFOG_COALESCING_ENABLED"
+
+# WebSocket streaming Constants
+STREAM_MAX_IN_FLIGHT_KEY = "DATAFOG_STREAM_MAX_IN_FLIGHT"
+STREAM_DEFAULT_MAX_IN_FLIGHT = 8
+STREAM_DEFAULT_LANG = "EN"
+
+# Incremental annotation Constants
+INCREMENTAL_CACHE_SIZE_KEY = "DATAFOG_INCREMENTAL_CACHE_SIZE"
+INCREMENTAL_DEFAULT_CACHE_SIZE = 4096
+INCREMENTAL_MAX_LENGTH_KEY = "DATAFOG_INCREMENTAL_MAX_LENGTH"
+INCREMENTAL_DEFAULT_MAX_LENGTH = 100_000
+
+# Sentence cache Constants
+SENTENCE_CACHE_ENABLED_KEY = "DATAFOG_SENTENCE_CACHE_ENABLED"
+SENTENCE_CACHE_SIZE_KEY = "DATAFOG_SENTENCE_CACHE_SIZE"
+SENTENCE_CACHE_DEFAULT_SIZE = 65536
+# Abbreviations whose trailing period does not end a sentence
+SENTENCE_ABBREVIATIONS = frozenset(
+    [
+        "mr", "mrs", "ms", "dr", "prof", "st", "jr", "sr", "inc", "ltd", "co", "corp", "vs",
+        "etc", "e.g", "i.e", "no", "fig", "dept", "jan", "feb", "mar", "apr", "jun", "jul",
+        "aug", "sep", "sept", "oct", "nov", "dec",
+    ]
+)
+
+# Priority lane Constants
+LANES_ENABLED_KEY = "DATAFOG_LANES_ENABLED"
+LANES_CAPACITY_KEY = "DATAFOG_LANES_CAPACITY"
+LANES_ROUTES_KEY = "DATAFOG_LANES_ROUTES"
+LANES_CREDENTIALS_KEY = "DATAFOG_LANES_CREDENTIALS"
+# per lane settings, formatted with the upper case lane name
+LANE_CONCURRENCY_KEY = "DATAFOG_LANE_{}_CONCURRENCY"
+LANE_QUEUE_KEY = "DATAFOG_LANE_{}_QUEUE"
+LANE_WEIGHT_KEY = "DATAFOG_LANE_{}_WEIGHT"
+LANES_DEFAULT_CAPACITY = 4
+LANE_DEFAULTS = {  # lane -> (concurrency, queue limit, weight)
+    "interactive": (4, 64, 4),
+    "bulk": (3, 256, 1),
+}
+LANE_HEADER = "x-datafog-priority"
+LANES_PATH_PREFIX = "/api/"
+LANE_RETRY_AFTER = 1
+
+# Deadline Constants
+DEADLINE_MS_KEY = "DATAFOG_DEADLINE_MS"
+DEADLINE_WORKERS_KEY = "DATAFOG_DEADLINE_WORKERS"
+DEADLINE_DEFAULT_WORKERS = 32
+
+# Shared cache Constants
+SHARED_CACHE_ENABLED_KEY = "DATAFOG_SHARED_CACHE_ENABLED"
+SHARED_CACHE_PATH_KEY = "DATAFOG_SHARED_CACHE_PATH"
+SHARED_CACHE_MAX_BYTES_KEY = "DATAFOG_SHARED_CACHE_MAX_BYTES"
+SHARED_CACHE_DEFAULT_PATH = "/tmp/datafog/results.sqlite3"
+SHARED_CACHE_DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+SHARED_CACHE_EVICT_FRACTION = 0.1  # share of the entries removed once the bound is exceeded
+SHARED_CACHE_CHECK_INTERVAL = 256  # writes between two size checks of a process
+SHARED_CACHE_REFRESH_SECONDS = 60  # minimum age before a hit updates an entry's last use
+SHARED_CACHE_TIMEOUT = 0.5  # seconds to wait for a lock held by another worker
+
+# Dictionary Constants
+DICTIONARY_FILES_KEY = "DATAFOG_DICTIONARY_FILES"
+DICTIONARY_ALLOWLIST_FILES_KEY = "DATAFOG_DICTIONARY_ALLOWLIST_FILES"
+DICTIONARY_WATCH_INTERVAL_KEY = "DATAFOG_DICTIONARY_WATCH_INTERVAL"
+DICTIONARY_DEFAULT_WATCH_INTERVAL = 5.0
+DICTIONARY_SEPARATOR = "\t"  # between the term and its entity type on a line of a term file
+DICTIONARY_COMMENT = "#"
+
+# Presence scan Constants
+PRESENCE_CHUNK_CHARS_KEY = "DATAFOG_SCAN_CHUNK_CHARS"
+PRESENCE_DEFAULT_CHUNK_CHARS = 1000
+PRESENCE_SAMPLE_THRESHOLD_KEY = "DATAFOG_SCAN_SAMPLE_THRESHOLD"
+PRESENCE_DEFAULT_SAMPLE_THRESHOLD = 50_000  # characters above which chunks are sampled
+PRESENCE_SAMPLE_CHUNKS_KEY = "DATAFOG_SCAN_SAMPLE_CHUNKS"
+PRESENCE_DEFAULT_SAMPLE_CHUNKS = 16
+
+# Metrics Constants
+METRICS_PREFIX = "datafog_"
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# MessagePack Constants
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+MSGPACK_CONTENT_TYPES = (MSGPACK_CONTENT_TYPE, "application/x-msgpack")
+
+# Load test Constants
+LOADTEST_DEFAULT_PORT = 8765
+LOADTEST_DEFAULT_DURATION = 30.0
+LOADTEST_DEFAULT_MIX = "annotate=0.5,anonymize=0.3,encode=0.2"
+LOADTEST_STARTUP_TIMEOUT = 300.0
+LOADTEST_READY_PATH = "/openapi.json"
+LOADTEST_ENDPOINTS = {
+    "annotate": "/api/annotation/default",
+    "anonymize": "/api/anonymize/non-reversible",
+    "encode": "/api/anonymize/reversible",
+}
+
+# Offline scan CLI Constants
+CLI_PROG_NAME = "datafog-api"
+SCAN_DEFAULT_BATCH_SIZE = 64
+SCAN_DEFAULT_TEXT_FIELD = "text"
+SCAN_LINE_KEY = "line"
+SCAN_ERROR_KEY = "error"
+SCAN_PROGRESS_INTERVAL = 2.0
+
 
 class ResponseKeys(Enum):
     """Define API response headers as an enum"""
@@ -38,7 +262,119 @@ class ResponseKeys(Enum):
     START_IDX = "start"
     END_IDX = "end"
     ENTITY_TYPE = "type"
+    START_BYTE = "start_byte"
+    END_BYTE = "end_byte"
     LOOKUP_TABLE = "lookup_table"
+    PARTIAL = "partial"
+    SPANS = "spans"
+    BYTE_SPANS = "byte_spans"
+    CONTAINS_PII = "contains_pii"
+    COUNTS = "counts"
+    COVERAGE = "coverage"
+
+
+class UsageKeys(Enum):
+    """Fields of an aggregated usage report"""
+
+    ROUTES = "routes"
+    REQUESTS = "requests"
+    TEXTS = "texts"
+    ENTITIES = "entities"
+    INTERVAL = "interval"
+
+
+class Lanes(Enum):
+    """Scheduling lanes of requests to the pipeline"""
+
+    INTERACTIVE = "interactive"
+    BULK = "bulk"
+
+
+class PipelineTypes(Enum):
+    """Implementations that can serve as the PII detection pipeline"""
+
+    DATAFOG = "datafog"
+    SPACY = "spacy"
+    PATTERN = "pattern"
+
+
+class OverlapPolicies(Enum):
+    """Strategies for choosing between entities whose spans overlap"""
+
+    LONGEST = "longest"
+    TYPE_PRIORITY = "type_priority"
+    KEEP_NESTED = "keep_nested"
+
+
+class TraceExporters(Enum):
+    """Destinations finished request traces can be exported to"""
+
+    NONE = "none"
+    CONSOLE = "console"
+    FILE = "file"
+    OTEL = "otel"
+
+
+class MetricTypes(Enum):
+    """Prometheus metric types"""
+
+    COUNTER = "counter"
+    GAUGE = "gauge"
+
+
+class ContentEncodings(Enum):
+    """Content codings supported for compressed requests and responses"""
+
+    ZSTD = "zstd"
+    BROTLI = "br"
+    GZIP = "gzip"
+
+
+class StreamOperations(Enum):
+    """Operations a WebSocket stream message can request"""
+
+    ANNOTATE = "annotate"
+    ANONYMIZE = "anonymize"
+    ENCODE = "encode"
+
+
+class StreamKeys(Enum):
+    """Fields of WebSocket stream messages and their responses"""
+
+    ID = "id"
+    OP = "op"
+    TEXT = "text"
+    LANG = "lang"
+    SALT = "salt"
+    BYTE_OFFSETS = "byte_offsets"
+    GROUP = "group"
+    RESULT = "result"
+    ERROR = "error"
+    STATUS = "status"
+    DETAIL = "detail"
+    RETRY_AFTER = "retry_after"
+
+
+class ScanModes(Enum):
+    """Operations the offline scan CLI can apply to each record"""
+
+    ANNOTATE = "annotate"
+    ANONYMIZE = "anonymize"
+    ENCODE = "encode"
+
+
+class PresenceModes(Enum):
+    """How far the scan endpoint looks into a text"""
+
+    ANY = "any"
+    COUNT = "count"
+
+
+class ScanFormats(Enum):
+    """Input formats understood by the offline scan CLI"""
+
+    TEXT = "text"
+    JSONL = "jsonl"
 
 
 class AuthTypes(Enum):
@@ -53,6 +389,20 @@ class ExceptionMessages(Enum):
 
     AUTH_USER_KEY = "Authorization configuration is not complete, please add authorized Users"
     AUTH_PASS_KEY = "Authorization configuration is not complete, please add authorized Users"
-    INVALID_CHAR = "string contains unsupported characters beyond the Extended ASCII set"
+    INVALID_CHAR = "string contains lone surrogates which are not valid Unicode text"
     UNAUTHORIZED = "Incorrect username or password"
+    RATE_LIMITED = "Rate limit exceeded, please retry later"
+    INVALID_MESSAGE = "message must be a JSON object"
+    MISSING_FIELD = "field required"
+    INVALID_TYPE = "value has an invalid type"
+    INVALID_LENGTH = "value length must be between"
+    TEXT_TOO_LONG = "ensure this value has at most"
+    UNSUPPORTED_OPERATION = "unsupported operation, supported operations are"
+    STREAM_MESSAGE_FAILED = "Internal Server Error"
+    INVALID_MSGPACK = "MessagePack decode error"
+    LANE_FULL = "Too many queued requests, please retry later"
     UNSUPPORTED_LANG = "Unsupported language, please try a language listed in the DataFog docs"
+    UNSUPPORTED_ENCODING = "Unsupported Content-Encoding, supported encodings are"
+    INVALID_ENCODED_BODY = "Request body could not be decoded with its Content-Encoding"
+    ENCODED_BODY_TOO_LARGE = "Decompressed request body exceeds the maximum allowed size"
+    COMPRESSED_BODY_TOO_LARGE = "Compressed request body exceeds the maximum allowed size"
@@ -9,6 +9,8 @@ class CustomExceptionTypes(Enum):
     """Enumeration of all custom exception types to be update with each addition"""
 
     LANG = "value_error.str.language"
+    MAX_LENGTH = "value_error.any_str.max_length"
+    PATTERN = "value_error.str.regex"
 
 
 class LanguageValidationError(RequestValidationError):
@@ -21,6 +23,38 @@ class LanguageValidationError(RequestValidationError):
         super().__init__(self.detail)
 
 
+class TextLengthValidationError(RequestValidationError):
+    """To be raised when a text is longer than allowed for the kind of request"""
+
+    def __init__(self, msg: str, limit: int, loc: list[str] | None = None):
+        if loc is None:
+            loc = ["body", "text"]
+        self.detail = build_error_detail(
+            loc, CustomExceptionTypes.MAX_LENGTH.value, msg, {"limit_value": limit}
+        )
+        super().__init__(self.detail)
+
+
+class TextPatternValidationError(RequestValidationError):
+    """To be raised when a text does not match the pattern of valid input"""
+
+    def __init__(self, msg: str, pattern: str, loc: list[str] | None = None):
+        if loc is None:
+            loc = ["body", "text"]
+        self.detail = build_error_detail(
+            loc, CustomExceptionTypes.PATTERN.value, msg, {"pattern": pattern}
+        )
+        super().__init__(self.detail)
+
+
+class StreamMessageError(RequestValidationError):
+    """To be raised when a WebSocket stream message fails validation"""
+
+    def __init__(self, errors: list[dict]):
+        self.detail = errors
+        super().__init__(self.detail)
+
+
 def build_error_detail(loc: list[str], error_type: str, msg: str, ctx: dict | None = None):
     """Helper function to build the error body"""
     detail = {"loc": loc, "type": error_type, "msg": msg}
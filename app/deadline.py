@@ -0,0 +1,82 @@
+"""Per request deadlines for pipeline runs, with a fallback when a run is late"""
+
+# Standard library imports
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable
+
+# Local imports
+from constants import DEADLINE_DEFAULT_WORKERS, DEADLINE_MS_KEY, DEADLINE_WORKERS_KEY
+from metrics import Counter, register
+
+# server-wide deadline in milliseconds, 0 for none
+DEFAULT_DEADLINE_MS = float(os.getenv(DEADLINE_MS_KEY, "0"))
+
+
+class DeadlineRunner:
+    """Runs functions on a thread pool and stops waiting for them once a deadline passes
+
+    A late run cannot be interrupted, it completes in the background (still filling any result
+    cache) while the caller continues with the fallback. At most max_workers runs are in
+    flight, late ones included, requests arriving while all of them are taken get the fallback
+    at once instead of queueing behind runs that are already late.
+    """
+
+    def __init__(self, max_workers: int):
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="deadline")
+        self.slots = threading.BoundedSemaphore(max_workers)
+        self.requests = Counter(
+            "deadline_requests_total", "Pipeline runs started with a deadline"
+        )
+        self.exceeded = Counter(
+            "deadline_exceeded_total", "Pipeline runs that missed their deadline"
+        )
+        self.rejected = Counter(
+            "deadline_rejected_total",
+            "Pipeline runs skipped as every deadline worker was busy",
+        )
+        register(
+            "deadline_hit_rate",
+            "Fraction of pipeline runs with a deadline answered by the fallback",
+            self.hit_rate,
+        )
+
+    def hit_rate(self) -> float:
+        """Fraction of runs with a deadline that were answered by the fallback"""
+        requests = self.requests.value
+        return (self.exceeded.value + self.rejected.value) / requests if requests else 0.0
+
+    def guarded(self, func: Callable):
+        """Call func in the caller's context, freeing its slot once it returns"""
+        try:
+            return func()
+        finally:
+            self.slots.release()
+
+    def run(self, func: Callable, fallback: Callable, deadline_ms: float | None):
+        """Return (result of func, False), or (result of fallback, True) when func is late"""
+        if not deadline_ms or deadline_ms <= 0:
+            return func(), False
+        self.requests.inc()
+        if not self.slots.acquire(blocking=False):
+            self.rejected.inc()
+            return fallback(), True
+        # run in a copy of the caller's context so tracing spans stay attached
+        future = self.executor.submit(contextvars.copy_context().run, self.guarded, func)
+        try:
+            return future.result(timeout=deadline_ms / 1000), False
+        except FutureTimeoutError:
+            self.exceeded.inc()
+            if future.cancel():
+                # the run never started, so guarded will not free its slot
+                self.slots.release()
+        return fallback(), True
+
+
+def create_deadline_runner() -> DeadlineRunner:
+    """Build the runner with a pool sized from the environment"""
+    workers = int(os.getenv(DEADLINE_WORKERS_KEY, str(DEADLINE_DEFAULT_WORKERS)))
+    return DeadlineRunner(max(workers, 1))
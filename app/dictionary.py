@@ -0,0 +1,230 @@
+"""Detection of known sensitive terms from customer dictionaries alongside the pipeline
+
+Term files hold one term per line followed by a tab and its entity type, allowlist files one
+term per line. The terms are compiled into an Aho-Corasick automaton that finds all of them in
+a single pass over a text, however many there are.
+"""
+
+# Standard library imports
+import os
+import threading
+
+# Local imports
+from config import file_mtime, watch
+from constants import (
+    DICTIONARY_ALLOWLIST_FILES_KEY,
+    DICTIONARY_COMMENT,
+    DICTIONARY_DEFAULT_WATCH_INTERVAL,
+    DICTIONARY_FILES_KEY,
+    DICTIONARY_SEPARATOR,
+    DICTIONARY_WATCH_INTERVAL_KEY,
+)
+from metrics import Counter
+from nlp import read_list
+from processor import find_pii_in_text
+
+DICTIONARY_FILES = read_list(DICTIONARY_FILES_KEY, [])
+DICTIONARY_ALLOWLIST_FILES = read_list(DICTIONARY_ALLOWLIST_FILES_KEY, [])
+DICTIONARY_ENABLED = bool(DICTIONARY_FILES)
+
+dictionary_matches = Counter("dictionary_matches_total", "Terms found by the dictionary")
+allowlisted = Counter("allowlisted_total", "Entities dropped for being on the allowlist")
+
+
+def read_lines(path: str) -> list[str]:
+    """Lines of a list file without blank lines and comments, empty when it cannot be read"""
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            lines = [line.rstrip("\r\n") for line in file]
+    except OSError as e:
+        print(f"Failed to read dictionary file '{path}': {e}")
+        return []
+    return [line for line in lines if line.strip() and not line.startswith(DICTIONARY_COMMENT)]
+
+
+def read_terms(path: str) -> dict[str, str]:
+    """Map the terms of a term file to their entity type"""
+    terms = {}
+    for line in read_lines(path):
+        term, _, pii_type = line.rpartition(DICTIONARY_SEPARATOR)
+        term = term.strip()
+        if not term or not pii_type.strip():
+            print(f"Skipping malformed line in dictionary file '{path}': {line!r}")
+            continue
+        terms[term] = pii_type.strip()
+    return terms
+
+
+def is_word(text: str, start: int, end: int) -> bool:
+    """Whether text[start:end] is not part of a longer word, as required of pipeline results"""
+    return not (start > 0 and text[start - 1].isalnum()) and not (
+        end < len(text) and text[end].isalnum()
+    )
+
+
+class DictionaryMatcher:
+    """Compiled terms and allowlist, replaced as a whole when the files change"""
+
+    def __init__(self, terms: dict[str, str], allowlist: set[str]):
+        # imported here as the automaton is only needed when dictionaries are configured
+        import ahocorasick  # pylint: disable=import-outside-toplevel
+
+        self.automaton = ahocorasick.Automaton()
+        for term, pii_type in terms.items():
+            if term not in allowlist:
+                self.automaton.add_word(term, (len(term), pii_type))
+        if len(self.automaton):
+            self.automaton.make_automaton()
+        self.allowlist = frozenset(allowlist)
+
+    def find(self, text: str) -> list[tuple[int, str, str]]:
+        """(start, type, term) of the whole word terms in text, leftmost longest first"""
+        if not len(self.automaton):
+            return []
+        # sorted by start and then by length, longest first
+        candidates = sorted(
+            (end + 1 - length, -length, pii_type)
+            for end, (length, pii_type) in self.automaton.iter(text)
+            if is_word(text, end + 1 - length, end + 1)
+        )
+        result = []
+        position = 0  # end of the last term kept
+        for start, negative_length, pii_type in candidates:
+            if start >= position:
+                position = start - negative_length
+                result.append((start, pii_type, text[start:position]))
+        dictionary_matches.inc(len(result))
+        return result
+
+
+def load_matcher(term_paths: list[str], allowlist_paths: list[str]) -> DictionaryMatcher:
+    """Read the files into a new matcher, later term files override the type of a term"""
+    terms = {}
+    for path in term_paths:
+        terms.update(read_terms(path))
+    allowlist = set()
+    for path in allowlist_paths:
+        allowlist.update(line.strip() for line in read_lines(path))
+    return DictionaryMatcher(terms, allowlist)
+
+
+def locate(text: str, values: list[str]) -> list[tuple[int | None, str]]:
+    """(start, value) of pipeline results of one type, found like get_entities_from_pii does"""
+    located = []
+    seen = set()
+    start_index = 0
+    for value in values:
+        start, end = find_pii_in_text(text, start_index, value, seen)
+        if start is None:
+            # left for get_entities_from_pii to report as not found
+            located.append((None, value))
+            continue
+        located.append((start, value))
+        start_index = end + 1
+    return located
+
+
+class DictionaryPipeline:
+    """Pipeline wrapper adding dictionary terms to the results and dropping allowlisted ones
+
+    Results keep the structure of the wrapped pipeline, each type listing its texts in the
+    order they occur, so get_entities_from_pii handles dictionary terms like any other.
+    """
+
+    def __init__(self, pipeline, term_paths: list[str], allowlist_paths: list[str]):
+        self.pipeline = pipeline
+        self.paths = tuple(term_paths) + tuple(allowlist_paths)
+        self.term_paths = list(term_paths)
+        self.allowlist_paths = list(allowlist_paths)
+        self.reload_lock = threading.Lock()
+        self.mtimes = {path: file_mtime(path) for path in self.paths}
+        self.matcher = load_matcher(self.term_paths, self.allowlist_paths)
+        # incremented on each reload, caches of merged results include it in their keys
+        self.generation = 0
+
+    def reload_if_changed(self) -> bool:
+        """Recompile the lists when a file was created, modified or removed since loaded"""
+        with self.reload_lock:
+            mtimes = {path: file_mtime(path) for path in self.paths}
+            if mtimes == self.mtimes:
+                return False
+            self.mtimes = mtimes
+            # requests keep using the previous matcher until the new one is complete
+            self.matcher = load_matcher(self.term_paths, self.allowlist_paths)
+            self.generation += 1
+        print("Dictionaries reloaded")
+        return True
+
+    def start_watcher(self) -> threading.Event | None:
+        """Watch the files from a daemon thread, returns the event stopping it"""
+        interval = float(
+            os.getenv(DICTIONARY_WATCH_INTERVAL_KEY, str(DICTIONARY_DEFAULT_WATCH_INTERVAL))
+        )
+        if interval <= 0:
+            return None
+        stopped = threading.Event()
+        threading.Thread(
+            target=watch,
+            args=(interval, stopped, self.reload_if_changed),
+            name="dictionary-watcher",
+            daemon=True,
+        ).start()
+        return stopped
+
+    def merge(self, text: str, result: dict, matcher: DictionaryMatcher) -> dict:
+        """New result with the dictionary terms of text merged in and allowlisted values out"""
+        found = {}
+        for start, pii_type, term in matcher.find(text):
+            found.setdefault(pii_type, []).append((start, term))
+        merged = {}
+        for pii_type, values in result.items():
+            kept = [value for value in values if value not in matcher.allowlist]
+            allowlisted.inc(len(values) - len(kept))
+            terms = found.pop(pii_type, None)
+            if terms:
+                located = locate(text, kept)
+                # one text per start, the longer one where both found an entity there
+                by_start = {}
+                for start, value in [item for item in located if item[0] is not None] + terms:
+                    if len(value) > len(by_start.get(start, "")):
+                        by_start[start] = value
+                missing = [value for start, value in located if start is None]
+                kept = [by_start[start] for start in sorted(by_start)] + missing
+            merged[pii_type] = kept
+        for pii_type, terms in found.items():
+            merged[pii_type] = [term for _, term in terms]
+        return merged
+
+    def merge_results(self, results: dict[str, dict]) -> dict[str, dict]:
+        """Merge the dictionary terms into results of the wrapped or any other pipeline"""
+        matcher = self.matcher
+        # results may be shared with a cache, so new dicts are returned
+        return {text: self.merge(text, result, matcher) for text, result in results.items()}
+
+    def run_text_pipeline_sync(self, str_list: list[str]) -> dict[str, dict]:
+        """Run the wrapped pipeline and merge the dictionary terms into its results"""
+        return self.merge_results(self.pipeline.run_text_pipeline_sync(str_list))
+
+
+_WATCHED = None  # dictionary of the last pipeline created, the one whose files are watched
+_WATCHER_STOPPED = None
+
+
+def start_watcher():
+    """Watch the files of the current dictionary, stopping the watcher of a previous one"""
+    global _WATCHER_STOPPED
+    if _WATCHER_STOPPED is not None:
+        _WATCHER_STOPPED.set()
+    _WATCHER_STOPPED = _WATCHED.start_watcher() if _WATCHED is not None else None
+
+
+def create_dictionary_pipeline(pipeline) -> DictionaryPipeline:
+    """Wrap a pipeline with the configured dictionaries, watched for changes"""
+    global _WATCHED
+    _WATCHED = DictionaryPipeline(pipeline, DICTIONARY_FILES, DICTIONARY_ALLOWLIST_FILES)
+    start_watcher()
+    return _WATCHED
+
+
+# threads do not survive fork, so forked workers start their own watcher
+os.register_at_fork(after_in_child=start_watcher)
@@ -1,2 +1,7 @@
 #/bin/sh
-. /.venv/bin/activate && uvicorn main:app --host 0.0.0.0 --port 8000
+. /.venv/bin/activate
+# exec so the server receives the container's SIGTERM and shuts down gracefully
+if [ "$DATAFOG_SERVER_MODE" = "production" ]; then
+    exec gunicorn -c gunicorn.conf.py main:app
+fi
+exec uvicorn main:app --host 0.0.0.0 --port 8000
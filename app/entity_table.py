@@ -0,0 +1,200 @@
+"""Entities stored as arrays, for offset arithmetic over many entities at once
+
+An EntityTable holds the starts and ends of the entities of a text as integer arrays, their
+types as codes into a list of types and their texts as references into a list of distinct
+values. Filtering, rebasing and byte offsets work on whole arrays and dicts are only built for
+the response. numpy is imported with this module, which callers import on first use.
+"""
+
+# Standard library imports
+import hashlib
+
+# Third party imports
+import numpy as np
+
+# Local imports
+from constants import OverlapPolicies, ResponseKeys
+from overlap import select_spans
+from processor import locate_pii
+
+START = ResponseKeys.START_IDX.value
+END = ResponseKeys.END_IDX.value
+TYPE = ResponseKeys.ENTITY_TYPE.value
+TEXT = ResponseKeys.PII_TEXT.value
+
+
+class EntityTable:
+    """Entities of one text as parallel arrays, rows sorted by start like entity lists"""
+
+    def __init__(
+        self,
+        starts,
+        ends,
+        type_codes,
+        text_refs,
+        types: list[str],
+        texts: list[str],
+    ):
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.type_codes = np.asarray(type_codes, dtype=np.int32)
+        self.text_refs = np.asarray(text_refs, dtype=np.int32)
+        self.types = types
+        self.texts = texts
+
+    @classmethod
+    def from_pii(
+        cls, pii: dict[str, dict], policy: OverlapPolicies | None = None
+    ) -> "EntityTable":
+        """Table of datafog library results, the rows get_entities_from_pii would return"""
+        original_text = next(iter(pii))
+        types = list(pii[original_text])
+        texts = {}
+        rows = []  # (start, end, type code, text reference) of each located entity
+        seen_indices = {}
+        for code, pii_type in enumerate(types):
+            for start, end, value in locate_pii(
+                original_text, pii[original_text][pii_type], seen_indices
+            ):
+                rows.append((start, end, code, texts.setdefault(value, len(texts))))
+        starts, ends, type_codes, text_refs = zip(*rows) if rows else ((), (), (), ())
+        table = cls(starts, ends, type_codes, text_refs, types, list(texts))
+        row_types = [types[code] for code in type_codes]
+        return table.take(select_spans(list(starts), list(ends), row_types, policy))
+
+    @classmethod
+    def from_entities(cls, entities: list[dict]) -> "EntityTable":
+        """Table of entity dicts as produced by get_entities_from_pii"""
+        types = {}
+        texts = {}
+        return cls(
+            [ent[START] for ent in entities],
+            [ent[END] for ent in entities],
+            [types.setdefault(ent[TYPE], len(types)) for ent in entities],
+            [texts.setdefault(ent[TEXT], len(texts)) for ent in entities],
+            list(types),
+            list(texts),
+        )
+
+    @classmethod
+    def concatenate(cls, tables: list["EntityTable"], offsets: list[int]) -> "EntityTable":
+        """Join the tables of consecutive chunks, rebasing each by the offset of its chunk"""
+        types = {}
+        texts = {}
+        type_codes = []
+        text_refs = []
+        for table in tables:
+            # translate the codes of each table to the joined lists with one lookup array
+            type_map = np.array(
+                [types.setdefault(name, len(types)) for name in table.types], dtype=np.int32
+            )
+            text_map = np.array(
+                [texts.setdefault(value, len(texts)) for value in table.texts], dtype=np.int32
+            )
+            type_codes.append(type_map[table.type_codes] if len(table) else table.type_codes)
+            text_refs.append(text_map[table.text_refs] if len(table) else table.text_refs)
+        counts = [len(table) for table in tables]
+        shift = np.repeat(np.asarray(offsets, dtype=np.int64), counts)
+        return cls(
+            np.concatenate([table.starts for table in tables] or [[]]) + shift,
+            np.concatenate([table.ends for table in tables] or [[]]) + shift,
+            np.concatenate(type_codes or [[]]),
+            np.concatenate(text_refs or [[]]),
+            list(types),
+            list(texts),
+        )
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def take(self, index) -> "EntityTable":
+        """Rows selected by an index or boolean mask, sharing the type and text lists"""
+        return EntityTable(
+            self.starts[index],
+            self.ends[index],
+            self.type_codes[index],
+            self.text_refs[index],
+            self.types,
+            self.texts,
+        )
+
+    def outer_mask(self) -> np.ndarray:
+        """Rows of a sorted table not nested within an earlier row, the ones to replace"""
+        mask = np.ones(len(self), dtype=bool)
+        if len(self) > 1:
+            mask[1:] = self.starts[1:] >= np.maximum.accumulate(self.ends)[:-1]
+        return mask
+
+    def byte_offsets(self, text: str) -> tuple[np.ndarray, np.ndarray]:
+        """UTF-8 byte offsets of the starts and ends in text"""
+        if text.isascii():
+            # every character is a single byte
+            return self.starts, self.ends
+        codepoints = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+        widths = (
+            1
+            + (codepoints >= 0x80).astype(np.int64)
+            + (codepoints >= 0x800)
+            + (codepoints >= 0x10000)
+        )
+        positions = np.zeros(len(text) + 1, dtype=np.int64)
+        np.cumsum(widths, out=positions[1:])
+        return positions[self.starts], positions[self.ends]
+
+    def replace(self, text: str, labels: list[str]) -> str:
+        """Text with each row of a sorted table of disjoint spans replaced by its label"""
+        gap_starts = np.concatenate(([0], self.ends)).tolist()
+        gap_ends = np.concatenate((self.starts, [len(text)])).tolist()
+        parts = [text[start:end] for start, end in zip(gap_starts, gap_ends)]
+        return parts[0] + "".join(label + part for label, part in zip(labels, parts[1:]))
+
+    def anonymize(self, text: str) -> str:
+        """Replace the outer entities by their type, like anonymize_pii_in_text"""
+        outer = self.take(self.outer_mask())
+        type_labels = ["[" + name + "]" for name in self.types]
+        return outer.replace(text, [type_labels[code] for code in outer.type_codes.tolist()])
+
+    def encode(self, text: str, salt: str) -> tuple[str, dict]:
+        """Replace the outer entities by hashes, like encode_pii_in_text
+
+        Each distinct (type, text) pair is hashed once, the lookup table lists them in order
+        of first occurrence.
+        """
+        outer = self.take(self.outer_mask())
+        keys = outer.type_codes.astype(np.int64) * max(len(self.texts), 1) + outer.text_refs
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        pairs = [
+            (self.types[code], self.texts[ref])
+            for code, ref in zip(
+                outer.type_codes[first].tolist(), outer.text_refs[first].tolist()
+            )
+        ]
+        hashes = [
+            hashlib.md5((pii_type + pii + salt).encode()).hexdigest()
+            for pii_type, pii in pairs
+        ]
+        lookup_table = {}
+        for index in np.argsort(first).tolist():
+            pii_type, pii = pairs[index]
+            lookup_table[hashes[index]] = {TYPE: pii_type, TEXT: pii}
+        labels = ["[" + hashes[index] + "]" for index in inverse.tolist()]
+        return outer.replace(text, labels), lookup_table
+
+    def to_dicts(self, byte_text: str | None = None) -> list[dict]:
+        """Entity dicts of the response, with byte offsets in byte_text when given"""
+        starts = self.starts.tolist()
+        ends = self.ends.tolist()
+        types = [self.types[code] for code in self.type_codes.tolist()]
+        texts = [self.texts[ref] for ref in self.text_refs.tolist()]
+        entities = [
+            {TEXT: pii, START: start, END: end, TYPE: pii_type}
+            for pii, start, end, pii_type in zip(texts, starts, ends, types)
+        ]
+        if byte_text is not None:
+            start_bytes, end_bytes = self.byte_offsets(byte_text)
+            for ent, start_byte, end_byte in zip(
+                entities, start_bytes.tolist(), end_bytes.tolist()
+            ):
+                ent[ResponseKeys.START_BYTE.value] = start_byte
+                ent[ResponseKeys.END_BYTE.value] = end_byte
+        return entities
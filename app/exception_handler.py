@@ -1,12 +1,13 @@
 """Exception handling routines"""
 
 # Third party imports
-from fastapi import Request, status
+from fastapi import HTTPException, Request, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
 
 # Local imports
-from constants import ExceptionMessages
+from constants import VALID_INPUT_DESCRIPTION, ExceptionMessages
+from serialization import encoded_response
 
 
 def exception_processor(request: Request, exc: RequestValidationError):
@@ -16,9 +17,21 @@ def exception_processor(request: Request, exc: RequestValidationError):
         # custom exceptions should manage output formatting during creation not here
         if e["type"] == "value_error.str.regex":
             e["msg"] = ExceptionMessages.INVALID_CHAR.value
-            e["ctx"]["pattern"] = "Extended ASCII"
+            e["ctx"]["pattern"] = VALID_INPUT_DESCRIPTION
 
-    return JSONResponse(
+    return encoded_response(
+        request,
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-        content={"detail": exc.errors()},
+        # as FastAPI's own handler does, e.g. for the permitted members of an enum field
+        content={"detail": jsonable_encoder(exc.errors())},
+    )
+
+
+def http_exception_processor(request: Request, exc: HTTPException):
+    """Send HTTP errors such as 401 and 429 in the encoding negotiated by the client"""
+    return encoded_response(
+        request,
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers=exc.headers,
     )
@@ -0,0 +1,56 @@
+"""gunicorn settings of the production server: `gunicorn -c gunicorn.conf.py main:app`
+
+The app and its model are loaded once in the master process and the workers are forked from it,
+sharing the model memory copy-on-write. The app creates its pipeline on first use, so the
+master creates it explicitly before forking.
+"""
+
+# Standard library imports
+import gc
+import os
+
+# Local imports
+from constants import (
+    SERVER_BIND_KEY,
+    SERVER_DEFAULT_BIND,
+    SERVER_DEFAULT_GRACEFUL_TIMEOUT,
+    SERVER_DEFAULT_MAX_REQUESTS,
+    SERVER_DEFAULT_MAX_REQUESTS_JITTER,
+    SERVER_DEFAULT_WORKER_TIMEOUT,
+    SERVER_GRACEFUL_TIMEOUT_KEY,
+    SERVER_MAX_REQUESTS_JITTER_KEY,
+    SERVER_MAX_REQUESTS_KEY,
+    SERVER_WORKER_TIMEOUT_KEY,
+)
+from server import get_threads_per_worker, get_worker_count, pin_thread_pools
+
+# evaluated before the app is preloaded, so the native libraries start with the pinned sizes
+pin_thread_pools(get_threads_per_worker())
+
+bind = os.getenv(SERVER_BIND_KEY, SERVER_DEFAULT_BIND)
+workers = get_worker_count()
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# recycle workers to cap memory growth, the jitter keeps them from restarting together
+max_requests = int(os.getenv(SERVER_MAX_REQUESTS_KEY, str(SERVER_DEFAULT_MAX_REQUESTS)))
+max_requests_jitter = int(
+    os.getenv(SERVER_MAX_REQUESTS_JITTER_KEY, str(SERVER_DEFAULT_MAX_REQUESTS_JITTER))
+)
+# in-flight requests get this long to finish on shutdown or recycling
+graceful_timeout = int(
+    os.getenv(SERVER_GRACEFUL_TIMEOUT_KEY, str(SERVER_DEFAULT_GRACEFUL_TIMEOUT))
+)
+timeout = int(os.getenv(SERVER_WORKER_TIMEOUT_KEY, str(SERVER_DEFAULT_WORKER_TIMEOUT)))
+
+
+def pre_fork(server, worker):  # pylint: disable=unused-argument
+    """Load the model and move the preloaded objects out of the garbage collector's reach
+
+    Workers would otherwise each load their own model on startup. Collections in a worker
+    would write to every tracked object of the model and copy the pages holding them.
+    """
+    # imported here as the app is preloaded by then, creating the pipeline once per master
+    import main  # pylint: disable=import-outside-toplevel
+
+    main.get_pipeline()
+    gc.freeze()
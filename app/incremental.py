@@ -0,0 +1,98 @@
+"""Incremental annotation of edited documents reusing results of unchanged paragraphs"""
+
+# Standard library imports
+import os
+import re
+from typing import TYPE_CHECKING
+
+# Local imports
+from cache import LRUCache, content_key
+from constants import INCREMENTAL_CACHE_SIZE_KEY, INCREMENTAL_DEFAULT_CACHE_SIZE
+from metrics import register
+from processor import get_entities_from_pii
+from tracing import span
+
+if TYPE_CHECKING:
+    from entity_table import EntityTable
+
+# Paragraphs are separated by at least one blank line
+PARAGRAPH_SEPARATOR = re.compile(r"\n[ \t\r\f\v]*\n\s*")
+
+
+def split_paragraphs(text: str) -> list[tuple[int, str]]:
+    """Split a document into its non blank paragraphs and their offsets in the document"""
+    result = []
+    start = 0
+    for match in PARAGRAPH_SEPARATOR.finditer(text):
+        if text[start : match.start()].strip():
+            result.append((start, text[start : match.start()]))
+        start = match.end()
+    if text[start:].strip():
+        result.append((start, text[start:]))
+    return result
+
+
+def create_paragraph_cache() -> LRUCache:
+    """Build the cache of (pii, entities) per paragraph sized from the environment
+
+    Entities are stored with offsets relative to their paragraph so an entry can be reused
+    wherever the paragraph moves to in the document.
+    """
+    size = int(os.getenv(INCREMENTAL_CACHE_SIZE_KEY, str(INCREMENTAL_DEFAULT_CACHE_SIZE)))
+    cache = LRUCache(size)
+    register(
+        "incremental_cache_hit_rate",
+        "Fraction of paragraphs served from the incremental annotation cache",
+        cache.hit_rate,
+    )
+    return cache
+
+
+def run_incremental(pipeline, text: str, cache: LRUCache) -> tuple[dict, "EntityTable"]:
+    """Annotate a document sending only paragraphs missing from the cache to the pipeline
+
+    Returns the merged pipeline result keyed by the document, like run_text_pipeline_sync,
+    and an EntityTable of the sorted entities of the whole document with offsets rebased
+    onto it. Paragraph entities are cached as compact tables and rebased all at once. A
+    pipeline whose results change over time, like the dictionary pipeline when its lists are
+    reloaded, has a generation that is part of the cache keys so stale entries are not reused.
+    """
+    # imported here as numpy is only needed in incremental mode
+    from entity_table import EntityTable  # pylint: disable=import-outside-toplevel
+
+    # read before running the pipeline, results of a newer generation are then at worst
+    # cached under the older key
+    generation = getattr(pipeline, "generation", 0)
+    paragraphs = [
+        (offset, paragraph, (generation, content_key(paragraph)))
+        for offset, paragraph in split_paragraphs(text)
+    ]
+    entries = {}
+    missing = {}  # paragraphs to annotate keyed by content hash, duplicates are run once
+    for _, paragraph, key in paragraphs:
+        if key in entries or key in missing:
+            continue
+        entry = cache.get(key)
+        if entry is None:
+            missing[key] = paragraph
+        else:
+            entries[key] = entry
+
+    if missing:
+        with span("pipeline"):
+            results = pipeline.run_text_pipeline_sync(list(missing.values()))
+        for key, paragraph in missing.items():
+            pii = results[paragraph]
+            entry = (pii, EntityTable.from_entities(get_entities_from_pii({paragraph: pii})))
+            cache.put(key, entry)
+            entries[key] = entry
+
+    merged = {}
+    for _, _, key in paragraphs:
+        for pii_type, values in entries[key][0].items():
+            merged.setdefault(pii_type, []).extend(values)
+    # paragraphs are in document order so the rebased entities stay sorted
+    entities = EntityTable.concatenate(
+        [entries[key][1] for _, _, key in paragraphs], [offset for offset, _, _ in paragraphs]
+    )
+    return {text: merged}, entities
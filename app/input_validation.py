@@ -1,20 +1,65 @@
 """Custom input validation routines"""
 
+# Standard library imports
+import os
+import re
+
 # Local imports
-from constants import SUPPORTED_LANGUAGES, ExceptionMessages
-from custom_exceptions import LanguageValidationError
+from constants import (
+    INCREMENTAL_DEFAULT_MAX_LENGTH,
+    INCREMENTAL_MAX_LENGTH_KEY,
+    SUPPORTED_LANGUAGES,
+    TEXT_MAX_LENGTH,
+    VALID_INPUT_DESCRIPTION,
+    VALID_INPUT_PATTERN,
+    ExceptionMessages,
+)
+from custom_exceptions import (
+    LanguageValidationError,
+    TextLengthValidationError,
+    TextPatternValidationError,
+)
+
+# longest text accepted in incremental mode, where only edited paragraphs reach the model
+INCREMENTAL_MAX_LENGTH = max(
+    int(os.getenv(INCREMENTAL_MAX_LENGTH_KEY, str(INCREMENTAL_DEFAULT_MAX_LENGTH))),
+    TEXT_MAX_LENGTH,
+)
+VALID_INPUT = re.compile(VALID_INPUT_PATTERN)
 
 
-def validate_annotate(lang: str):
+def validate_annotate(lang: str, text: str, incremental: bool):
     """Validation of annotate endpoint parameters not built into fastapi"""
-    # currently only lang needs to be validated outside of standard fastapi checks
     validate_language(lang)
+    validate_text(text, incremental)
 
 
-def validate_anonymize(lang: str):
+def validate_anonymize(lang: str, text: str, incremental: bool):
     """Validation of anonymize endpoint parameters not built into fastapi"""
-    # currently only lang needs to be validated outside of standard fastapi checks
     validate_language(lang)
+    validate_text(text, incremental)
+
+
+def validate_scan(lang: str):
+    """Validation of scan endpoint parameters not built into fastapi"""
+    validate_language(lang)
+
+
+def validate_text(text: str, incremental: bool):
+    """Check the text against the limit of its mode, then against the pattern of valid input
+
+    fastapi only applies the larger limit and leaves the pattern to this check, so texts too
+    long for their mode are rejected without being scanned.
+    """
+    limit = INCREMENTAL_MAX_LENGTH if incremental else TEXT_MAX_LENGTH
+    if len(text) > limit:
+        raise TextLengthValidationError(
+            f"{ExceptionMessages.TEXT_TOO_LONG.value} {limit} characters", limit
+        )
+    if not VALID_INPUT.match(text):
+        raise TextPatternValidationError(
+            ExceptionMessages.INVALID_CHAR.value, VALID_INPUT_DESCRIPTION
+        )
 
 
 def validate_language(lang: str):
@@ -0,0 +1,247 @@
+"""Priority lanes admitting requests to the pipeline with weighted fair scheduling"""
+
+# Standard library imports
+import asyncio
+import json
+import os
+from collections import deque
+from contextlib import asynccontextmanager
+
+# Third party imports
+from fastapi import HTTPException, Request, status
+
+# Local imports
+from authorization import AUTH_ENABLED, is_valid_request, read_basic_credentials
+from compression import get_header
+from constants import (
+    LANE_CONCURRENCY_KEY,
+    LANE_DEFAULTS,
+    LANE_HEADER,
+    LANE_QUEUE_KEY,
+    LANE_RETRY_AFTER,
+    LANE_WEIGHT_KEY,
+    LANES_CAPACITY_KEY,
+    LANES_CREDENTIALS_KEY,
+    LANES_DEFAULT_CAPACITY,
+    LANES_ENABLED_KEY,
+    LANES_PATH_PREFIX,
+    LANES_ROUTES_KEY,
+    ExceptionMessages,
+    Lanes,
+)
+from metrics import Counter, register
+from serialization import encoded_response
+
+LANES_ENABLED = os.getenv(LANES_ENABLED_KEY, "false").lower() == "true"
+
+
+class LaneFullError(HTTPException):
+    """Raised when the queue of a lane is at its limit, answered with 503 and Retry-After"""
+
+    def __init__(self, lane: str):
+        self.lane = lane
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=ExceptionMessages.LANE_FULL.value,
+            headers={"Retry-After": str(LANE_RETRY_AFTER)},
+        )
+
+
+class Lane:
+    """Limits and scheduling state of a lane"""
+
+    def __init__(self, concurrency: int, queue_limit: int, weight: float):
+        self.concurrency = concurrency
+        self.queue_limit = queue_limit
+        self.weight = weight
+        self.active = 0
+        self.waiting = deque()  # futures of queued requests, in arrival order
+        self.virtual_time = 0.0  # service received, in units of 1 / weight per request
+
+
+class LaneScheduler:
+    """Admits at most capacity requests at once, each lane within its own limits
+
+    Whenever a slot frees up it goes to the lane with queued requests that has received the
+    least service relative to its weight (stride scheduling). A lane returning from idle starts
+    at the current virtual time, so it cannot claim service for the time it was idle. With the
+    concurrency of the bulk lane below the capacity, a slot is always left for interactive
+    requests. All methods run on the event loop, waiting requests do not hold a thread.
+    """
+
+    def __init__(self, lanes: dict[Lanes, Lane], capacity: int):
+        self.lanes = lanes
+        self.capacity = capacity
+        self.active = 0
+        self.virtual_time = 0.0
+        self.rejected = Counter(
+            "lane_rejected_total", "Requests rejected by a full lane queue"
+        )
+        for lane_id, lane in lanes.items():
+            register(
+                f"lane_{lane_id.value}_queued",
+                f"Requests waiting in the {lane_id.value} lane",
+                lambda lane=lane: len(lane.waiting),
+            )
+            register(
+                f"lane_{lane_id.value}_active",
+                f"Requests of the {lane_id.value} lane being processed",
+                lambda lane=lane: lane.active,
+            )
+
+    def admit(self, lane: Lane):
+        """Take a slot for the lane"""
+        lane.active += 1
+        self.active += 1
+        lane.virtual_time += 1 / lane.weight
+        self.virtual_time = max(self.virtual_time, lane.virtual_time - 1 / lane.weight)
+
+    def eligible(self, lane: Lane) -> bool:
+        """Whether the lane may take a free slot"""
+        return self.active < self.capacity and lane.active < lane.concurrency
+
+    async def acquire(self, lane_id: Lanes):
+        """Wait for a slot, raising LaneFullError when the lane's queue is full"""
+        lane = self.lanes[lane_id]
+        if not lane.waiting:
+            lane.virtual_time = max(lane.virtual_time, self.virtual_time)
+            if self.eligible(lane) and not self.others_waiting(lane):
+                self.admit(lane)
+                return
+        if len(lane.waiting) >= lane.queue_limit:
+            self.rejected.inc()
+            raise LaneFullError(lane_id.value)
+        future = asyncio.get_running_loop().create_future()
+        lane.waiting.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # the slot was granted as the request was cancelled
+                self.release(lane_id)
+            else:
+                lane.waiting.remove(future)
+            raise
+
+    def others_waiting(self, lane: Lane) -> bool:
+        """Whether another lane has queued requests that could use a free slot"""
+        return any(
+            other.waiting and other.active < other.concurrency
+            for other in self.lanes.values()
+            if other is not lane
+        )
+
+    def release(self, lane_id: Lanes):
+        """Return a slot and hand free slots to the queued requests due next"""
+        lane = self.lanes[lane_id]
+        lane.active -= 1
+        self.active -= 1
+        self.dispatch()
+
+    def dispatch(self):
+        """Grant free slots by weighted fair order"""
+        while self.active < self.capacity:
+            candidates = [
+                lane for lane in self.lanes.values() if lane.waiting and self.eligible(lane)
+            ]
+            if not candidates:
+                return
+            lane = min(candidates, key=lambda lane: lane.virtual_time)
+            future = lane.waiting.popleft()
+            self.admit(lane)
+            future.set_result(None)
+
+
+def load_lane_map(key: str) -> dict[str, Lanes]:
+    """Read a JSON object assigning paths or usernames to lanes from the environment"""
+    try:
+        return {name: Lanes(lane) for name, lane in json.loads(os.getenv(key, "{}")).items()}
+    except (ValueError, AttributeError) as e:
+        print(f"Invalid {key}, ignoring it: {e}")
+        return {}
+
+
+def create_scheduler() -> LaneScheduler:
+    """Build the scheduler from the environment"""
+    lanes = {}
+    for lane_id in Lanes:
+        concurrency, queue_limit, weight = LANE_DEFAULTS[lane_id.value]
+        name = lane_id.name
+        lanes[lane_id] = Lane(
+            max(int(os.getenv(LANE_CONCURRENCY_KEY.format(name), str(concurrency))), 1),
+            max(int(os.getenv(LANE_QUEUE_KEY.format(name), str(queue_limit))), 0),
+            max(float(os.getenv(LANE_WEIGHT_KEY.format(name), str(weight))), 0.01),
+        )
+    capacity = int(os.getenv(LANES_CAPACITY_KEY, str(LANES_DEFAULT_CAPACITY)))
+    return LaneScheduler(lanes, max(capacity, 1))
+
+
+class LaneAdmission:
+    """Lane selection and scheduler shared by the HTTP requests and the stream messages
+
+    The lane is chosen by the credential, then the priority header, then the route, and is
+    interactive otherwise. Neither the header nor an unverified username can raise the priority
+    of a request, both may only move it to the bulk lane.
+    """
+
+    def __init__(self, scheduler: LaneScheduler | None = None):
+        self.scheduler = scheduler or create_scheduler()
+        self.routes = load_lane_map(LANES_ROUTES_KEY)
+        self.credentials = load_lane_map(LANES_CREDENTIALS_KEY)
+
+    def select_lane(self, scope) -> Lanes:
+        """Choose the lane of a request"""
+        headers = scope["headers"]
+        if self.credentials:
+            credentials = read_basic_credentials(get_header(headers, b"authorization"))
+            lane = self.credentials.get(credentials.username) if credentials else None
+            # the password is only checked when the user is assigned a higher priority lane
+            if lane is Lanes.BULK or (
+                lane is not None and AUTH_ENABLED and is_valid_request(credentials)
+            ):
+                return lane
+        priority = (get_header(headers, LANE_HEADER.encode()) or "").strip().lower()
+        if priority == Lanes.BULK.value:
+            return Lanes.BULK
+        return self.routes.get(scope["path"], Lanes.INTERACTIVE)
+
+    @asynccontextmanager
+    async def slot(self, lane: Lanes):
+        """Hold a slot of the lane, raising LaneFullError when its queue is full"""
+        await self.scheduler.acquire(lane)
+        try:
+            yield
+        finally:
+            self.scheduler.release(lane)
+
+
+class LaneMiddleware:
+    """ASGI middleware queueing API requests in their lane until the scheduler admits them
+
+    Requests to a full lane are answered with 503 and Retry-After. WebSocket connections pass
+    through, their messages are admitted one by one by the stream endpoint.
+    """
+
+    def __init__(self, app, admission: LaneAdmission | None = None):
+        self.app = app
+        self.admission = admission or LaneAdmission()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(LANES_PATH_PREFIX):
+            await self.app(scope, receive, send)
+            return
+
+        lane = self.admission.select_lane(scope)
+        scheduler = self.admission.scheduler
+        try:
+            await scheduler.acquire(lane)
+        except LaneFullError as exc:
+            response = encoded_response(
+                Request(scope), exc.status_code, {"detail": exc.detail}, exc.headers
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            scheduler.release(lane)
@@ -0,0 +1,440 @@
+"""Reproducible load testing harness for capacity planning"""
+
+# Standard library imports
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+
+# Local imports
+from constants import (
+    AUTH_TYPE_KEY,
+    LOADTEST_DEFAULT_DURATION,
+    LOADTEST_DEFAULT_MIX,
+    LOADTEST_DEFAULT_PORT,
+    LOADTEST_ENDPOINTS,
+    LOADTEST_READY_PATH,
+    LOADTEST_STARTUP_TIMEOUT,
+    PASSWORD_KEY,
+    PATTERN_PIPELINE_DELAY_KEY,
+    PIPELINE_KEY,
+    TEXT_MAX_LENGTH,
+    USER_KEY,
+    AuthTypes,
+    PipelineTypes,
+)
+
+# Vocabulary used to synthesize request texts, entities are drawn from both DataFog and
+# PatternPipeline friendly forms so either pipeline finds a comparable number of them
+FILLER_WORDS = (
+    "the customer called about an order and asked for a refund because the parcel arrived "
+    "late please review the account notes before replying to this ticket thanks"
+).split()
+ENTITY_SNIPPETS = [
+    "Mr. Peter Parker",
+    "Dr. Jane Foster",
+    "Ms. Diana Prince",
+    "in New York",
+    "from Boston",
+    "near Queens",
+    "Daily Bugle Inc",
+    "Stark Industries Corp",
+    "Wayne Enterprises LLC",
+    "January 5, 2024",
+    "2023-11-02",
+    "10:30 am",
+    "French",
+    "American",
+]
+
+
+def generate_text(rng: random.Random, min_length: int, max_length: int, density: float) -> str:
+    """Build a text of roughly the requested length with density entities per 100 words"""
+    target = rng.randint(min_length, max_length)
+    words = []
+    length = 0
+    previous_entity = False
+    while length < target:
+        # never place two entities next to each other so their boundaries stay unambiguous
+        previous_entity = not previous_entity and rng.random() < density / 100
+        word = rng.choice(ENTITY_SNIPPETS if previous_entity else FILLER_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:TEXT_MAX_LENGTH].strip() or rng.choice(FILLER_WORDS)
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    """Parse 'endpoint=weight,...' into normalized endpoint ratios"""
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in LOADTEST_ENDPOINTS:
+            raise ValueError(f"unknown endpoint '{name}' in mix")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("endpoint mix weights must sum to more than zero")
+    return {name: weight / total for name, weight in weights.items()}
+
+
+def build_requests(
+    count: int, mix: dict[str, float], text_length: tuple[int, int], density: float, seed: int
+) -> list[tuple[str, str, bytes]]:
+    """Pre-generate a deterministic list of (endpoint, path, body) requests"""
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    result = []
+    for _ in range(count):
+        name = rng.choices(names, weights)[0]
+        body = {"text": generate_text(rng, text_length[0], text_length[1], density)}
+        if name == "encode":
+            body["salt"] = f"{rng.getrandbits(64):016x}"
+        result.append((name, LOADTEST_ENDPOINTS[name], json.dumps(body).encode()))
+    return result
+
+
+def percentile(values: list[float], pct: float) -> float | None:
+    """Nearest rank percentile of a sorted list"""
+    if not values:
+        return None
+    rank = math.ceil(pct / 100 * len(values))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+def summarize_latencies(latencies: list[float]) -> dict:
+    """Latency statistics in milliseconds"""
+    values = sorted(round(latency * 1000, 3) for latency in latencies)
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 3) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": values[-1] if values else None,
+    }
+
+
+def summarize(samples: list[tuple[str, int, float]], elapsed: float) -> dict:
+    """Aggregate (endpoint, status, latency) samples into a report"""
+    statuses = {}
+    per_endpoint = {}
+    for name, status, latency in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        per_endpoint.setdefault(name, []).append((status, latency))
+
+    ok = [latency for _, status, latency in samples if status == 200]
+    errors = len(samples) - len(ok)
+    return {
+        "requests": len(samples),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "status_codes": statuses,
+        "latency_ms": summarize_latencies(ok),
+        "endpoints": {
+            name: {
+                "requests": len(results),
+                "errors": sum(1 for status, _ in results if status != 200),
+                "latency_ms": summarize_latencies([lat for st, lat in results if st == 200]),
+            }
+            for name, results in per_endpoint.items()
+        },
+    }
+
+
+class LoadClient:
+    """Sends requests over one keep-alive connection per thread"""
+
+    def __init__(self, host: str, port: int, auth_header: str | None = None):
+        self.host = host
+        self.port = port
+        self.headers = {"Content-Type": "application/json"}
+        if auth_header:
+            self.headers["Authorization"] = auth_header
+        self.local = threading.local()
+
+    def send(self, path: str, body: bytes) -> int:
+        """POST body to path, returning the status code or 0 on connection failure"""
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            self.local.connection = connection
+        try:
+            connection.request("POST", path, body, self.headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self.local.connection = None
+            return 0
+
+
+def run_closed_loop(client: LoadClient, requests: list, concurrency: int, duration: float):
+    """Each of concurrency threads sends its next request as soon as the previous completes"""
+    samples = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(index: int):
+        position = index
+        while time.monotonic() < deadline:
+            name, path, body = requests[position % len(requests)]
+            start = time.perf_counter()
+            status = client.send(path, body)
+            latency = time.perf_counter() - start
+            with lock:
+                samples.append((name, status, latency))
+            position += concurrency
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.monotonic() - start
+
+
+def run_fixed_rate(
+    client: LoadClient, requests: list, rps: float, duration: float, limit: int
+):
+    """Send requests on a fixed schedule
+
+    Latency is measured from the scheduled send time so queueing delay is not hidden when the
+    server falls behind
+    """
+    samples = []
+    lock = threading.Lock()
+
+    def task(scheduled: float, request: tuple):
+        name, path, body = request
+        status = client.send(path, body)
+        latency = time.perf_counter() - scheduled
+        with lock:
+            samples.append((name, status, latency))
+
+    total = int(rps * duration)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=limit) as executor:
+        for i in range(total):
+            scheduled = start + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(task, scheduled, requests[i % len(requests)])
+    return samples, time.perf_counter() - start
+
+
+def read_memory(pid: int) -> dict | None:
+    """Read resident and peak resident memory of a process in MB from /proc"""
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as status:
+            fields = dict(line.split(":", 1) for line in status if ":" in line)
+    except OSError:
+        return None
+    return {
+        "rss_mb": round(int(fields["VmRSS"].split()[0]) / 1024, 1),
+        "peak_rss_mb": round(int(fields["VmHWM"].split()[0]) / 1024, 1),
+    }
+
+
+def child_pids(pid: int) -> list[int]:
+    """List direct children of a process by scanning /proc"""
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r", encoding="utf-8") as stat:
+                # the command name may contain spaces, fields after it are space separated
+                fields = stat.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def worker_memory(pid: int) -> dict:
+    """Memory of the server process and each of its workers"""
+    result = {"parent": read_memory(pid), "workers": {}}
+    for child in child_pids(pid):
+        memory = read_memory(child)
+        if memory is not None:
+            result["workers"][str(child)] = memory
+    return result
+
+
+def start_server(args, env: dict) -> subprocess.Popen:
+    """Launch the app under uvicorn and wait until it answers requests"""
+    command = [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "main:app",
+        "--host",
+        args.host,
+        "--port",
+        str(args.port),
+        "--workers",
+        str(args.workers),
+        "--log-level",
+        "warning",
+    ]
+    # pylint: disable=consider-using-with
+    server = subprocess.Popen(
+        command,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + LOADTEST_STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited during startup with code {server.returncode}")
+        try:
+            connection = http.client.HTTPConnection(args.host, args.port, timeout=1)
+            connection.request("GET", LOADTEST_READY_PATH)
+            if connection.getresponse().status == 200:
+                return server
+        except OSError:
+            pass
+        time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("server did not become ready in time")
+
+
+def run(args) -> dict:
+    """Run a load test as described by the parsed command line arguments"""
+    mix = parse_mix(args.mix)
+    expected = int(args.rps * args.duration) if args.rps else 10000
+    requests = build_requests(
+        min(max(expected, 1), 10000),
+        mix,
+        (args.min_length, args.max_length),
+        args.entity_density,
+        args.seed,
+    )
+
+    env = dict(os.environ)
+    env[PIPELINE_KEY] = args.pipeline
+    env[PATTERN_PIPELINE_DELAY_KEY] = str(args.stub_delay_ms)
+    auth_header = None
+    if args.auth:
+        user, password = "loadtest", secrets.token_hex(16)
+        env.update(
+            {AUTH_TYPE_KEY: AuthTypes.HTTP_BASIC.value, USER_KEY: user, PASSWORD_KEY: password}
+        )
+        auth_header = "Basic " + b64encode(f"{user}:{password}".encode()).decode()
+    else:
+        env[AUTH_TYPE_KEY] = AuthTypes.NO_AUTH.value
+
+    server = None if args.no_server else start_server(args, env)
+    try:
+        client = LoadClient(args.host, args.port, auth_header)
+        if args.warmup:
+            run_closed_loop(client, requests, args.concurrency, args.warmup)
+        if args.rps:
+            samples, elapsed = run_fixed_rate(
+                client, requests, args.rps, args.duration, args.max_inflight
+            )
+        else:
+            samples, elapsed = run_closed_loop(
+                client, requests, args.concurrency, args.duration
+            )
+        memory = worker_memory(server.pid) if server is not None else None
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    return {
+        "config": {
+            "pipeline": args.pipeline,
+            "workers": args.workers,
+            "mode": "fixed_rate" if args.rps else "closed_loop",
+            "rps": args.rps,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "mix": mix,
+            "text_length": [args.min_length, args.max_length],
+            "entity_density": args.entity_density,
+            "auth": args.auth,
+            "seed": args.seed,
+        },
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "results": summarize(samples, elapsed),
+        "memory": memory,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the load test argument parser"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--pipeline",
+        choices=[p.value for p in PipelineTypes],
+        default=PipelineTypes.PATTERN.value,
+    )
+    parser.add_argument(
+        "--stub-delay-ms",
+        type=float,
+        default=0.0,
+        help="simulated inference time per text for the pattern pipeline",
+    )
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=LOADTEST_DEFAULT_PORT)
+    parser.add_argument(
+        "--no-server",
+        action="store_true",
+        help="target an already running server instead of starting one",
+    )
+    parser.add_argument("--duration", type=float, default=LOADTEST_DEFAULT_DURATION)
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds of unrecorded load")
+    parser.add_argument("--rps", type=float, help="fixed request rate, closed loop if unset")
+    parser.add_argument("--concurrency", type=int, default=8, help="closed loop clients")
+    parser.add_argument(
+        "--max-inflight",
+        type=int,
+        default=256,
+        help="maximum outstanding requests in fixed rate mode",
+    )
+    parser.add_argument("--mix", default=LOADTEST_DEFAULT_MIX, help="endpoint=weight,...")
+    parser.add_argument("--min-length", type=int, default=100)
+    parser.add_argument("--max-length", type=int, default=TEXT_MAX_LENGTH)
+    parser.add_argument(
+        "--entity-density", type=float, default=5.0, help="entities per 100 words"
+    )
+    parser.add_argument("--auth", action="store_true", help="enable HTTP basic authentication")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON file the results are written to")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Load test entry point"""
+    args = build_parser().parse_args(argv)
+    report = run(args)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output)
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,81 +1,356 @@
 """API REST endpoints"""
 
 # Standard library imports
-from typing import Optional
+import functools
+import threading
+from contextlib import asynccontextmanager, nullcontext
+from typing import TYPE_CHECKING, Optional
 
 # Third party imports
-from datafog import DataFog
-from fastapi import Body, Depends, FastAPI, Request
+from fastapi import Body, Depends, FastAPI, Header, HTTPException, Request, WebSocket
 from fastapi.exceptions import RequestValidationError
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.status import WS_1008_POLICY_VIOLATION
 
 # Local imports
-from authorization import AUTH_ENABLED, get_authorization
-from constants import VALID_INPUT_PATTERN, AuthTypes
-from exception_handler import exception_processor
-from input_validation import validate_annotate, validate_anonymize
+from authorization import AUTH_ENABLED, authorize_websocket, get_authorization
+from coalescing import COALESCING_ENABLED, SingleFlight, request_key
+from compression import COMPRESSION_ENABLED, CompressionMiddleware
+from constants import (
+    METRICS_CONTENT_TYPE,
+    SALT_MAX_LENGTH,
+    SALT_MIN_LENGTH,
+    SCAN_TEXT_MAX_LENGTH,
+    TEXT_MIN_LENGTH,
+    VALID_INPUT_PATTERN,
+    AuthTypes,
+    PresenceModes,
+    ResponseKeys,
+    StreamKeys,
+    StreamOperations,
+)
+from deadline import DEFAULT_DEADLINE_MS, create_deadline_runner
+from dictionary import DictionaryPipeline
+from exception_handler import exception_processor, http_exception_processor
+from incremental import create_paragraph_cache, run_incremental
+from input_validation import (
+    INCREMENTAL_MAX_LENGTH,
+    validate_annotate,
+    validate_anonymize,
+    validate_scan,
+)
+from lanes import LANES_ENABLED, LaneAdmission, LaneMiddleware
+from metrics import render_metrics
+from pipeline import PatternPipeline, create_pipeline
+from presence import scan_text
 from processor import (
     anonymize_pii_for_output,
     encode_pii_for_output,
     format_pii_for_output,
 )
-from telemetry import get_telemetry_instance
+from profiling import PROFILING_ENABLED, ProfilingMiddleware, profiled
+from serialization import MsgpackRoute, NegotiatedResponse
+from streaming import serve_stream
+from telemetry import get_telemetry_instance, get_usage_reporter
+from tracing import TRACING_ENABLED, TracingMiddleware, span, traced
+
+if TYPE_CHECKING:
+    from entity_table import EntityTable
+
+_PIPELINE = None
+_PIPELINE_LOCK = threading.Lock()
+
+
+def get_pipeline():
+    """Provide the configured pipeline, created on first use rather than on import
+
+    gunicorn creates it in the master before forking, so its workers share the model.
+    """
+    global _PIPELINE
+    if _PIPELINE is None:
+        with _PIPELINE_LOCK:
+            # concurrent first requests share one pipeline instead of loading the model twice
+            if _PIPELINE is None:
+                _PIPELINE = create_pipeline()
+    return _PIPELINE
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """Load the model when the server starts so the first request does not wait for it"""
+    await run_in_threadpool(get_pipeline)
+    yield
+
+
+app = FastAPI(default_response_class=NegotiatedResponse, lifespan=lifespan)
+# accept and return MessagePack bodies on every route when the client negotiates it
+app.router.route_class = MsgpackRoute
+lane_admission = LaneAdmission() if LANES_ENABLED else None
+if LANES_ENABLED:
+    app.add_middleware(LaneMiddleware, admission=lane_admission)
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+if TRACING_ENABLED:
+    app.add_middleware(TracingMiddleware)
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+paragraph_cache = create_paragraph_cache()
+single_flight = SingleFlight()
+fallback_pipeline = PatternPipeline()
+deadline_runner = create_deadline_runner()
+get_telemetry_instance().report_basic_telemetry_in_background()
+usage = get_usage_reporter()
+authorize = traced("auth")(get_authorization)
+
+
+def run_pipeline(
+    text: str, lang: str, incremental: bool, deadline_ms: float | None = None
+) -> tuple[dict, "EntityTable", bool]:
+    """Run the pipeline on the text, reusing cached paragraphs in incremental mode
+
+    Identical concurrent texts share one pipeline run, post-processing stays per request.
+    When the run misses the deadline, the request or else the server-wide one, the result of
+    the pattern pipeline is returned instead and flagged as partial. Entities are returned as
+    an EntityTable.
+    """
+    # imported here as numpy is only loaded once the first text is processed
+    from entity_table import EntityTable  # pylint: disable=import-outside-toplevel
+
+    pipeline = get_pipeline()
+
+    def infer() -> tuple[dict, "EntityTable | None"]:
+        if incremental:
+            return run_incremental(pipeline, text, paragraph_cache)
+        with span("pipeline"):
+            if COALESCING_ENABLED:
+                result = single_flight.run(
+                    request_key(text, lang), lambda: pipeline.run_text_pipeline_sync([text])
+                )
+            else:
+                result = pipeline.run_text_pipeline_sync([text])
+        return result, None
+
+    def degrade() -> tuple[dict, None]:
+        with span("fallback"):
+            result = fallback_pipeline.run_text_pipeline_sync([text])
+            if isinstance(pipeline, DictionaryPipeline):
+                # the fallback applies the same dictionaries and allowlists as the model
+                result = pipeline.merge_results(result)
+        return result, None
+
+    if deadline_ms is None:
+        deadline_ms = DEFAULT_DEADLINE_MS
+    (result, entities), partial = deadline_runner.run(infer, degrade, deadline_ms)
+    if entities is None:
+        with span("entities"):
+            entities = EntityTable.from_pii(result)
+    return result, entities, partial
+
+
+def flag_partial(output: dict, partial: bool) -> dict:
+    """Mark an output computed by the fallback after a missed deadline"""
+    if partial:
+        output[ResponseKeys.PARTIAL.value] = True
+    return output
+
 
-app = FastAPI()
-df = DataFog()
-get_telemetry_instance().report_basic_telemetry()
+def record_usage(request: Request | WebSocket, output: dict):
+    """Count a processed text for usage telemetry under the path of its route when enabled"""
+    if usage is not None:
+        found = output.get(ResponseKeys.TITLE.value)
+        if found is not None:
+            # a grouped entity stands for one occurrence per span
+            count = sum(len(ent.get(ResponseKeys.SPANS.value, ())) or 1 for ent in found)
+        elif ResponseKeys.COUNTS.value in output:
+            # scans report the values found per type
+            count = sum(output[ResponseKeys.COUNTS.value].values())
+        else:
+            # encode returns a lookup table of the distinct replaced values instead of entities
+            count = len(output.get(ResponseKeys.LOOKUP_TABLE.value, ()))
+        # the route template rather than the requested path, which could carry any value
+        usage.record(request.scope["route"].path, entities=count)
 
 
 @app.post("/api/annotation/default")
+@profiled
 def annotate(
-    text: str = Body(embed=True, min_length=1, max_length=1000, pattern=VALID_INPUT_PATTERN),
+    request: Request,
+    text: str = Body(
+        embed=True,
+        min_length=TEXT_MIN_LENGTH,
+        # checked against TEXT_MAX_LENGTH outside of incremental mode and then against
+        # VALID_INPUT_PATTERN by the validation, so oversized texts are not scanned
+        max_length=INCREMENTAL_MAX_LENGTH,
+    ),
     lang: str = Body(embed=True, default="EN"),
-    auth_type: Optional[AuthTypes] = Depends(get_authorization),
+    incremental: bool = Body(embed=True, default=False),
+    byte_offsets: bool = Body(embed=True, default=False),
+    group: bool = Body(embed=True, default=False),
+    x_deadline_ms: Optional[float] = Header(default=None, gt=0),
+    auth_type: Optional[AuthTypes] = Depends(authorize),
 ):
     """entry point for annotate functionality"""
     if AUTH_ENABLED:
         print(f"Verified authorization: {auth_type.value}")
     # Use the custom validation imported above, currently only lang requires custom validation
-    validate_annotate(lang)
-    result = df.run_text_pipeline_sync([text])
-    output = format_pii_for_output(result)
+    with span("validate"):
+        validate_annotate(lang, text, incremental)
+    result, entities, partial = run_pipeline(text, lang, incremental, x_deadline_ms)
+    output = format_pii_for_output(result, entities, byte_offsets, group)
+    flag_partial(output, partial)
+    record_usage(request, output)
     return output
 
 
 @app.post("/api/anonymize/non-reversible")
+@profiled
 def anonymize(
-    text: str = Body(embed=True, min_length=1, max_length=1000, pattern=VALID_INPUT_PATTERN),
+    request: Request,
+    text: str = Body(
+        embed=True,
+        min_length=TEXT_MIN_LENGTH,
+        # checked against TEXT_MAX_LENGTH outside of incremental mode and then against
+        # VALID_INPUT_PATTERN by the validation, so oversized texts are not scanned
+        max_length=INCREMENTAL_MAX_LENGTH,
+    ),
     lang: str = Body(embed=True, default="EN"),
-    auth_type: Optional[AuthTypes] = Depends(get_authorization),
+    incremental: bool = Body(embed=True, default=False),
+    byte_offsets: bool = Body(embed=True, default=False),
+    group: bool = Body(embed=True, default=False),
+    x_deadline_ms: Optional[float] = Header(default=None, gt=0),
+    auth_type: Optional[AuthTypes] = Depends(authorize),
 ):
     """entry point for anonymize functionality"""
     if AUTH_ENABLED:
         print(f"Verified authorization: {auth_type.value}")
     # Use the custom validation imported above, currently only lang requires custom validation
-    validate_anonymize(lang)
-    result = df.run_text_pipeline_sync([text])
-    output = anonymize_pii_for_output(result)
+    with span("validate"):
+        validate_anonymize(lang, text, incremental)
+    result, entities, partial = run_pipeline(text, lang, incremental, x_deadline_ms)
+    output = anonymize_pii_for_output(result, entities, byte_offsets, group)
+    flag_partial(output, partial)
+    record_usage(request, output)
     return output
 
 
 @app.post("/api/anonymize/reversible")
+@profiled
 def encode(
-    text: str = Body(embed=True, min_length=1, max_length=1000, pattern=VALID_INPUT_PATTERN),
+    request: Request,
+    text: str = Body(
+        embed=True,
+        min_length=TEXT_MIN_LENGTH,
+        # checked against TEXT_MAX_LENGTH outside of incremental mode and then against
+        # VALID_INPUT_PATTERN by the validation, so oversized texts are not scanned
+        max_length=INCREMENTAL_MAX_LENGTH,
+    ),
     lang: str = Body(embed=True, default="EN"),
-    salt: str = Body(embed=True, min_length=16, max_length=64),
-    auth_type: Optional[AuthTypes] = Depends(get_authorization),
+    incremental: bool = Body(embed=True, default=False),
+    salt: str = Body(embed=True, min_length=SALT_MIN_LENGTH, max_length=SALT_MAX_LENGTH),
+    x_deadline_ms: Optional[float] = Header(default=None, gt=0),
+    auth_type: Optional[AuthTypes] = Depends(authorize),
 ):
     """entry point for reversible anonymize functionality"""
     if AUTH_ENABLED:
         print(f"Verified authorization: {auth_type.value}")
     # Use the custom validation imported above, currently only lang requires custom validation
-    validate_anonymize(lang)
-    result = df.run_text_pipeline_sync([text])
-    output = encode_pii_for_output(result, salt)
+    with span("validate"):
+        validate_anonymize(lang, text, incremental)
+    result, entities, partial = run_pipeline(text, lang, incremental, x_deadline_ms)
+    output = flag_partial(encode_pii_for_output(result, salt, entities), partial)
+    record_usage(request, output)
+    return output
+
+
+@app.post("/api/scan")
+@profiled
+def scan(
+    request: Request,
+    text: str = Body(
+        embed=True,
+        min_length=TEXT_MIN_LENGTH,
+        max_length=SCAN_TEXT_MAX_LENGTH,
+        pattern=VALID_INPUT_PATTERN,
+    ),
+    lang: str = Body(embed=True, default="EN"),
+    mode: PresenceModes = Body(embed=True, default=PresenceModes.COUNT),
+    auth_type: Optional[AuthTypes] = Depends(authorize),
+):
+    """entry point for checking whether and how much PII a text holds"""
+    if AUTH_ENABLED:
+        print(f"Verified authorization: {auth_type.value}")
+    with span("validate"):
+        validate_scan(lang)
+    with span("scan"):
+        output = scan_text(get_pipeline(), text, mode)
+    record_usage(request, output)
+    return output
+
+
+def process_stream_message(websocket: WebSocket, message: dict) -> dict:
+    """Produce the same output as the matching endpoint for a validated stream message"""
+    text = message[StreamKeys.TEXT.value]
+    lang = message[StreamKeys.LANG.value]
+    byte_offsets = message[StreamKeys.BYTE_OFFSETS.value]
+    group = message[StreamKeys.GROUP.value]
+    operation = message[StreamKeys.OP.value]
+    match operation:
+        case StreamOperations.ANNOTATE:
+            validate_annotate(lang, text, False)
+            result, entities, partial = run_pipeline(text, lang, False)
+            output = format_pii_for_output(result, entities, byte_offsets, group)
+        case StreamOperations.ANONYMIZE:
+            validate_anonymize(lang, text, False)
+            result, entities, partial = run_pipeline(text, lang, False)
+            output = anonymize_pii_for_output(result, entities, byte_offsets, group)
+        case StreamOperations.ENCODE:
+            validate_anonymize(lang, text, False)
+            result, entities, partial = run_pipeline(text, lang, False)
+            output = encode_pii_for_output(result, message[StreamKeys.SALT.value], entities)
+    flag_partial(output, partial)
+    record_usage(websocket, output)
     return output
 
 
+@app.websocket("/api/stream")
+async def stream(websocket: WebSocket):
+    """entry point for streaming requests over a WebSocket, authorized once per connection"""
+    try:
+        credentials = authorize_websocket(websocket)
+    except HTTPException:
+        await websocket.close(code=WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    admit = nullcontext
+    if lane_admission is not None:
+        # the lane middleware passes connections through, each message takes a slot of its own
+        lane = lane_admission.select_lane(websocket.scope)
+        admit = functools.partial(lane_admission.slot, lane)
+    await serve_stream(
+        websocket,
+        functools.partial(process_stream_message, websocket),
+        credentials.username if credentials else None,
+        admit=admit,
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics(auth_type: Optional[AuthTypes] = Depends(authorize)):
+    """entry point for the metrics of this worker process in Prometheus format"""
+    if AUTH_ENABLED:
+        print(f"Verified authorization: {auth_type.value}")
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """exception handling hook for input validation failures"""
     # offload actual processing to another to keep this uncluttered
     return exception_processor(request, exc)
+
+
+@app.exception_handler(HTTPException)
+async def http_exception_handler(request: Request, exc: HTTPException):
+    """exception handling hook for HTTP errors such as failed authorization"""
+    return http_exception_processor(request, exc)
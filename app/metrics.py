@@ -0,0 +1,66 @@
+"""Process wide metrics rendered in the Prometheus text exposition format"""
+
+# Standard library imports
+import threading
+from typing import Callable
+
+# Local imports
+from constants import METRICS_PREFIX, MetricTypes
+
+
+class Metric:
+    """A named value read from a callback each time metrics are rendered"""
+
+    def __init__(
+        self, name: str, description: str, metric_type: MetricTypes, func: Callable[[], float]
+    ):
+        self.name = METRICS_PREFIX + name
+        self.description = description
+        self.metric_type = metric_type
+        self.func = func
+
+    def render(self) -> str:
+        """Format the metric with its help and type lines"""
+        return (
+            f"# HELP {self.name} {self.description}\n"
+            f"# TYPE {self.name} {self.metric_type.value}\n"
+            f"{self.name} {self.func():g}\n"
+        )
+
+
+_REGISTRY: dict[str, Metric] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def register(
+    name: str,
+    description: str,
+    func: Callable[[], float],
+    metric_type: MetricTypes = MetricTypes.GAUGE,
+) -> Metric:
+    """Register a metric, replacing any previous metric of the same name"""
+    metric = Metric(name, description, metric_type, func)
+    with _REGISTRY_LOCK:
+        _REGISTRY[metric.name] = metric
+    return metric
+
+
+class Counter:
+    """Monotonic counter incremented from request handling threads"""
+
+    def __init__(self, name: str, description: str):
+        self.value = 0
+        self.lock = threading.Lock()
+        register(name, description, lambda: self.value, MetricTypes.COUNTER)
+
+    def inc(self, amount: int = 1):
+        """Increase the counter"""
+        with self.lock:
+            self.value += amount
+
+
+def render_metrics() -> str:
+    """Render every registered metric, sorted by name"""
+    with _REGISTRY_LOCK:
+        metrics = sorted(_REGISTRY.values(), key=lambda m: m.name)
+    return "".join(metric.render() for metric in metrics)
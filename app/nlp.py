@@ -0,0 +1,99 @@
+"""Slim spaCy pipeline loading only the components needed for PII entity recognition"""
+
+# Standard library imports
+import os
+import resource
+import time
+
+# Local imports
+from constants import (
+    NLP_DEFAULT_EXCLUDE,
+    NLP_DEFAULT_MODEL,
+    NLP_EXCLUDE_KEY,
+    NLP_LABELS_KEY,
+    NLP_MAX_TEXT_LENGTH,
+    NLP_MODEL_KEY,
+    NLP_REPORT_TEXT,
+    PII_ANNOTATION_LABELS,
+)
+from metrics import register
+
+
+def read_list(key: str, default: list[str]) -> list[str]:
+    """Read a comma separated list from the environment"""
+    value = os.getenv(key)
+    if value is None:
+        return list(default)
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def current_rss() -> int:
+    """Resident memory of this process in bytes"""
+    try:
+        with open("/proc/self/statm", encoding="utf-8") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # peak rather than current RSS, in KiB on Linux and bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class SpacyPipeline:
+    """spaCy model with the same interface and result structure as DataFog
+
+    Unlike DataFog(), which loads every default component of the model along with its image
+    services, only the components needed by the named entity recognizer are loaded. Results
+    hold the configured labels only, each with its entity texts in document order.
+    """
+
+    def __init__(self, nlp, labels: list[str]):
+        self.nlp = nlp
+        self.labels = labels
+
+    def empty_result(self) -> dict[str, list[str]]:
+        """Result of a text without entities"""
+        return {label: [] for label in self.labels}
+
+    def run_text_pipeline_sync(self, str_list: list[str]) -> dict[str, dict]:
+        """Annotate a list of texts in one batch, returning results keyed by text"""
+        texts = list(dict.fromkeys(str_list))
+        results = {}
+        # nlp.pipe batches the texts through each component
+        for text, doc in zip(texts, self.nlp.pipe(t[:NLP_MAX_TEXT_LENGTH] for t in texts)):
+            result = self.empty_result()
+            for ent in doc.ents:
+                if ent.label_ in result:
+                    result[ent.label_].append(ent.text)
+            results[text] = result
+        return results
+
+
+def report_pipeline(nlp, rss_before: int) -> dict:
+    """Print the memory taken by the model and the time each component takes on a sample"""
+    rss = current_rss() - rss_before
+    doc = nlp.make_doc(NLP_REPORT_TEXT)
+    timings = {}
+    for name, component in nlp.pipeline:
+        start = time.perf_counter()
+        doc = component(doc)
+        timings[name] = time.perf_counter() - start
+    print(f"NLP model loaded, components {nlp.pipe_names}, RSS +{rss / 2**20:.1f} MiB")
+    for name, seconds in timings.items():
+        print(f"NLP component {name}: {seconds * 1000:.2f} ms")
+    register(
+        "nlp_model_rss_bytes", "Resident memory added by loading the NLP model", lambda: rss
+    )
+    return {"rss": rss, "timings": timings}
+
+
+def create_spacy_pipeline() -> SpacyPipeline:
+    """Load the configured model without the excluded components and report its cost"""
+    # imported here as spaCy is only needed by this pipeline
+    import spacy  # pylint: disable=import-outside-toplevel
+
+    rss_before = current_rss()
+    nlp = spacy.load(
+        os.getenv(NLP_MODEL_KEY, NLP_DEFAULT_MODEL),
+        exclude=read_list(NLP_EXCLUDE_KEY, NLP_DEFAULT_EXCLUDE),
+    )
+    report_pipeline(nlp, rss_before)
+    return SpacyPipeline(nlp, read_list(NLP_LABELS_KEY, PII_ANNOTATION_LABELS))
@@ -0,0 +1,132 @@
+"""Resolution of overlapping entity spans"""
+
+# Standard library imports
+import bisect
+import os
+
+# Local imports
+from constants import (
+    DEFAULT_TYPE_PRIORITY,
+    OVERLAP_POLICY_KEY,
+    TYPE_PRIORITY_KEY,
+    OverlapPolicies,
+    ResponseKeys,
+)
+
+START = ResponseKeys.START_IDX.value
+END = ResponseKeys.END_IDX.value
+TYPE = ResponseKeys.ENTITY_TYPE.value
+
+
+def get_overlap_policy() -> OverlapPolicies:
+    """Read the overlap policy from the environment"""
+    try:
+        result = OverlapPolicies(
+            os.getenv(OVERLAP_POLICY_KEY, OverlapPolicies.LONGEST.value).lower()
+        )
+    except ValueError:
+        result = OverlapPolicies.LONGEST
+    return result
+
+
+def get_type_priority() -> dict[str, int]:
+    """Read the entity type precedence from the environment as a rank per type"""
+    types = os.getenv(TYPE_PRIORITY_KEY, ",".join(DEFAULT_TYPE_PRIORITY)).split(",")
+    return {pii_type.strip(): rank for rank, pii_type in enumerate(types) if pii_type.strip()}
+
+
+OVERLAP_POLICY = get_overlap_policy()
+TYPE_PRIORITY = get_type_priority()
+
+
+class PrefixMax:
+    """Fenwick tree of the largest value set at each position, queried over prefixes
+
+    Values at a position may only grow, which holds as each start is kept at most once.
+    """
+
+    def __init__(self, size: int):
+        self.tree = [-1] * (size + 1)
+
+    def update(self, position: int, value: int):
+        """Raise the value at position to value"""
+        position += 1
+        while position < len(self.tree):
+            self.tree[position] = max(self.tree[position], value)
+            position += position & -position
+
+    def query(self, count: int) -> int:
+        """Largest value at the first count positions, -1 when none is set"""
+        result = -1
+        while count > 0:
+            result = max(result, self.tree[count])
+            count -= count & -count
+        return result
+
+
+def resolve_overlaps(
+    entities: list,
+    policy: OverlapPolicies | None = None,
+    priority: dict[str, int] | None = None,
+) -> list:
+    """Keep entities whose spans do not cross, sorted by start with outer spans first"""
+    index = select_spans(
+        [ent[START] for ent in entities],
+        [ent[END] for ent in entities],
+        [ent[TYPE] for ent in entities],
+        policy,
+        priority,
+    )
+    return [entities[i] for i in index]
+
+
+def select_spans(
+    starts: list[int],
+    ends: list[int],
+    types: list[str],
+    policy: OverlapPolicies | None = None,
+    priority: dict[str, int] | None = None,
+) -> list[int]:
+    """Indices of the spans to keep, sorted by start with outer spans first
+
+    Candidates are visited in order of preference, longest span first or highest priority type
+    first, and kept when they do not overlap a span already kept. A candidate overlaps a kept
+    span exactly when some kept span starting before its end also ends after its start, so a
+    Fenwick tree of the largest kept end by start answers each check in O(log k), giving
+    O(k log k) overall. With keep_nested, spans lying entirely within a kept span are
+    returned as well.
+    """
+    policy = policy or OVERLAP_POLICY
+    priority = TYPE_PRIORITY if priority is None else priority
+    lowest = len(priority)  # types missing from the priority list rank last
+    if policy is OverlapPolicies.TYPE_PRIORITY:
+
+        def preference(i):
+            return (priority.get(types[i], lowest), starts[i] - ends[i], starts[i])
+
+    else:
+
+        def preference(i):
+            return (starts[i] - ends[i], priority.get(types[i], lowest), starts[i])
+
+    positions = sorted(set(starts))  # distinct starts of the candidates
+    kept_ends = PrefixMax(len(positions))
+    kept = []
+    rejected = []
+    for i in sorted(range(len(starts)), key=preference):
+        if kept_ends.query(bisect.bisect_left(positions, ends[i])) > starts[i]:
+            rejected.append(i)
+            continue
+        kept_ends.update(bisect.bisect_left(positions, starts[i]), ends[i])
+        kept.append(i)
+    kept.sort(key=lambda i: starts[i])
+
+    if policy is not OverlapPolicies.KEEP_NESTED:
+        return kept
+    kept_starts = [starts[i] for i in kept]
+    nested = []
+    for i in rejected:
+        index = bisect.bisect_right(kept_starts, starts[i])
+        if index > 0 and ends[kept[index - 1]] >= ends[i]:
+            nested.append(i)
+    return sorted(kept + nested, key=lambda i: (starts[i], -ends[i]))
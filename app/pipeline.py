@@ -0,0 +1,167 @@
+"""Construction of the PII detection pipeline"""
+
+# Standard library imports
+import importlib.metadata
+import os
+import re
+import time
+
+# Local imports
+from cache import content_key
+from constants import (
+    NLP_DEFAULT_MODEL,
+    PATTERN_PIPELINE_DELAY_KEY,
+    PII_ANNOTATION_LABELS,
+    PIPELINE_KEY,
+    PipelineTypes,
+)
+from dictionary import DICTIONARY_ENABLED, create_dictionary_pipeline
+from nlp import create_spacy_pipeline
+from sentence_cache import SENTENCE_CACHE_ENABLED, create_sentence_cache_pipeline
+from shared_cache import SHARED_CACHE_ENABLED, create_shared_cache_pipeline
+
+# Deterministic patterns approximating the entity types of the DataFog model
+_MONTHS = (
+    r"(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|June?|July?|Aug(?:ust)?"
+    r"|Sep(?:tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)"
+)
+ENTITY_PATTERNS = {
+    "DATE_TIME": re.compile(
+        r"\b(?:\d{4}-\d{2}-\d{2}|\d{1,2}/\d{1,2}/\d{2,4}"
+        rf"|{_MONTHS} \d{{1,2}}(?:, \d{{4}})?|\d{{1,2}}:\d{{2}}(?: ?[ap]m)?)\b"
+    ),
+    "LOC": re.compile(r"\b(?:in|from|near) ((?:[A-Z][a-z]+)(?: [A-Z][a-z]+)?)\b"),
+    "NRP": re.compile(
+        r"\b(?:American|British|Canadian|Chinese|French|German|Indian|Italian|Japanese"
+        r"|Mexican|Spanish|Christian|Muslim|Jewish|Hindu|Buddhist|Democrat|Republican)\b"
+    ),
+    "ORG": re.compile(
+        r"\b(?:[A-Z][\w&]*\s){1,3}(?:Inc|Corp|Corporation|LLC|Ltd|Company|Bank|University)\b"
+    ),
+    "PER": re.compile(r"\b(?:Mr|Mrs|Ms|Dr|Prof)\.? ((?:[A-Z][a-z]+)(?: [A-Z][a-z]+)?)\b"),
+}
+# Order in which overlapping matches are resolved, most specific patterns first
+PATTERN_PRIORITY = ["DATE_TIME", "PER", "ORG", "LOC", "NRP"]
+
+
+class PatternPipeline:
+    """Regex based stand in for DataFog with the same interface and result structure
+
+    Results are deterministic and need no model, which makes it suitable for load tests of the
+    HTTP layer. An optional per text delay simulates the cost of inference.
+    """
+
+    def __init__(self, delay_ms: float = 0.0):
+        self.delay = delay_ms / 1000
+
+    def annotate(self, text: str) -> dict[str, list[str]]:
+        """Detect entities in a single text, like the model a span belongs to one type only"""
+        result = {label: [] for label in PII_ANNOTATION_LABELS}
+        claimed = []  # (start, end) of every span already assigned to a type
+        for label in PATTERN_PRIORITY:
+            pattern = ENTITY_PATTERNS[label]
+            # use the first capture group when the pattern has one to drop context words
+            group = 1 if pattern.groups else 0
+            for match in pattern.finditer(text):
+                start, end = match.span(group)
+                if any(start < c_end and c_start < end for c_start, c_end in claimed):
+                    continue
+                claimed.append((start, end))
+                result[label].append(match.group(group))
+        return result
+
+    def run_text_pipeline_sync(self, str_list: list[str]) -> dict[str, dict]:
+        """Annotate a list of texts, returning results keyed by text like DataFog"""
+        results = {}
+        for text in str_list:
+            if self.delay:
+                time.sleep(self.delay)
+            results[text] = self.annotate(text)
+        return results
+
+
+def get_pipeline_type() -> PipelineTypes:
+    """Read the pipeline type from the environment"""
+    try:
+        result = PipelineTypes(os.getenv(PIPELINE_KEY, PipelineTypes.DATAFOG.value).lower())
+    except ValueError:
+        result = PipelineTypes.DATAFOG
+    return result
+
+
+def package_version(name: str) -> str:
+    """Installed version of a distribution, empty when it is not installed"""
+    try:
+        return importlib.metadata.version(name)
+    except importlib.metadata.PackageNotFoundError:
+        return ""
+
+
+def pipeline_fingerprint(pipeline_type: PipelineTypes, pipeline) -> str:
+    """Hash of the settings and library versions the results of a pipeline depend on
+
+    Part of the namespace of the shared cache, which outlives the workers, so results cached
+    before a model upgrade or a change of its settings are not served afterwards.
+    """
+    if pipeline_type is PipelineTypes.PATTERN:
+        parts = [ENTITY_PATTERNS[label].pattern for label in PATTERN_PRIORITY]
+    elif pipeline_type is PipelineTypes.SPACY:
+        meta = pipeline.nlp.meta
+        parts = [
+            package_version("spacy"),
+            meta.get("lang", ""),
+            meta.get("name", ""),
+            meta.get("version", ""),
+            *pipeline.nlp.pipe_names,
+            *pipeline.labels,
+        ]
+    else:
+        parts = [
+            package_version("datafog"),
+            package_version("spacy"),
+            package_version(NLP_DEFAULT_MODEL),
+        ]
+    return content_key("\n".join(parts)).hex()[:16]
+
+
+def create_pipeline(
+    pipeline_type: PipelineTypes | None = None,
+    sentence_cache: bool | None = None,
+    shared_cache: bool | None = None,
+    dictionary: bool | None = None,
+):
+    """Build the configured PII detection pipeline, optionally behind result caches
+
+    The per process sentence cache is consulted first, its misses then go to the cache shared
+    by the workers of the host. Dictionary terms are merged into the results outside the
+    caches, so reloaded lists apply to cached texts too.
+    """
+    pipeline_type = pipeline_type or get_pipeline_type()
+    if pipeline_type is PipelineTypes.PATTERN:
+        pipeline = PatternPipeline(float(os.getenv(PATTERN_PIPELINE_DELAY_KEY, "0")))
+    elif pipeline_type is PipelineTypes.SPACY:
+        pipeline = create_spacy_pipeline()
+    else:
+        # imported here as loading datafog loads the model
+        from datafog import DataFog  # pylint: disable=import-outside-toplevel
+
+        pipeline = DataFog()
+
+    if shared_cache is None:
+        shared_cache = SHARED_CACHE_ENABLED
+    if shared_cache:
+        fingerprint = pipeline_fingerprint(pipeline_type, pipeline)
+        pipeline = create_shared_cache_pipeline(
+            pipeline, f"{pipeline_type.value}:{fingerprint}:"
+        )
+
+    if sentence_cache is None:
+        sentence_cache = SENTENCE_CACHE_ENABLED
+    if sentence_cache:
+        pipeline = create_sentence_cache_pipeline(pipeline)
+
+    if dictionary is None:
+        dictionary = DICTIONARY_ENABLED
+    if dictionary:
+        pipeline = create_dictionary_pipeline(pipeline)
+    return pipeline
@@ -0,0 +1,116 @@
+"""Presence and density scans telling whether and how much PII a text holds
+
+Only the number of values the pipeline reports per type is needed, so entities are neither
+located, sorted nor serialized. Texts are processed in chunks, which lets a scan stop once its
+answer is known and estimate the density of very large texts from a sample.
+"""
+
+# Standard library imports
+import os
+
+# Local imports
+from constants import (
+    PRESENCE_CHUNK_CHARS_KEY,
+    PRESENCE_DEFAULT_CHUNK_CHARS,
+    PRESENCE_DEFAULT_SAMPLE_CHUNKS,
+    PRESENCE_DEFAULT_SAMPLE_THRESHOLD,
+    PRESENCE_SAMPLE_CHUNKS_KEY,
+    PRESENCE_SAMPLE_THRESHOLD_KEY,
+    PresenceModes,
+    ResponseKeys,
+)
+from metrics import Counter
+
+CHUNK_CHARS = int(os.getenv(PRESENCE_CHUNK_CHARS_KEY, str(PRESENCE_DEFAULT_CHUNK_CHARS)))
+SAMPLE_THRESHOLD = int(
+    os.getenv(PRESENCE_SAMPLE_THRESHOLD_KEY, str(PRESENCE_DEFAULT_SAMPLE_THRESHOLD))
+)
+CHUNK_SEPARATORS = ("\n", ". ", " ", "\t")
+SAMPLE_CHUNKS = int(os.getenv(PRESENCE_SAMPLE_CHUNKS_KEY, str(PRESENCE_DEFAULT_SAMPLE_CHUNKS)))
+
+chunks_scanned = Counter("scan_chunks_total", "Chunks run through the pipeline by scans")
+chunks_skipped = Counter(
+    "scan_chunks_skipped_total", "Chunks left out by early exit or sampling of scans"
+)
+
+
+def split_chunks(text: str, size: int) -> list[str]:
+    """Split a text into chunks of at most size characters, ending at a boundary if possible"""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + size
+        if end < len(text):
+            # break after the last line, else sentence, else word so entities stay whole
+            for separator in CHUNK_SEPARATORS:
+                cut = text.rfind(separator, start, end)
+                if cut > start:
+                    end = cut + len(separator)
+                    break
+        chunks.append(text[start:end])
+        start = end
+    return chunks
+
+
+def sample_chunks(chunks: list[str], count: int) -> list[str]:
+    """Pick count chunks spread evenly over the text, the same ones for the same text"""
+    if len(chunks) <= count:
+        return chunks
+    step = len(chunks) / count
+    return [chunks[int(i * step)] for i in range(count)]
+
+
+def count_values(pipeline, chunks: list[str], counts: dict[str, int]) -> dict[str, int]:
+    """Add the number of values the pipeline finds per type in the chunks to counts"""
+    texts = [chunk for chunk in chunks if chunk.strip()]
+    if not texts:
+        return counts
+    chunks_scanned.inc(len(texts))
+    results = pipeline.run_text_pipeline_sync(texts)
+    # results are keyed by text, repeated chunks are counted for each occurrence
+    for text in texts:
+        for pii_type, values in results[text].items():
+            if values:
+                counts[pii_type] = counts.get(pii_type, 0) + len(values)
+    return counts
+
+
+def scan_text(
+    pipeline,
+    text: str,
+    mode: PresenceModes,
+    chunk_chars: int = CHUNK_CHARS,
+    sample_threshold: int = SAMPLE_THRESHOLD,
+    sample_count: int = SAMPLE_CHUNKS,
+) -> dict:
+    """Whether the text holds PII, with the values found per type and the share scanned
+
+    In any mode batches of doubling size are scanned until one holds PII, the counts then
+    cover the chunks scanned so far. In count mode texts longer than sample_threshold are
+    estimated from sample_count chunks, the counts being extrapolated to the whole text.
+    """
+    chunks = split_chunks(text, chunk_chars)
+    counts = {}
+    if mode is PresenceModes.ANY:
+        scanned = 0
+        batch = 1
+        while scanned < len(chunks) and not counts:
+            count_values(pipeline, chunks[scanned : scanned + batch], counts)
+            scanned += batch
+            batch *= 2
+        sample = chunks[:scanned]
+    else:
+        sample = chunks
+        if len(text) > sample_threshold:
+            sample = sample_chunks(chunks, sample_count)
+        count_values(pipeline, sample, counts)
+    chunks_skipped.inc(len(chunks) - len(sample))
+
+    coverage = sum(len(chunk) for chunk in sample) / len(text)
+    if mode is PresenceModes.COUNT and coverage < 1:
+        counts = {pii_type: round(count / coverage) for pii_type, count in counts.items()}
+    return {
+        ResponseKeys.CONTAINS_PII.value: bool(counts),
+        ResponseKeys.COUNTS.value: counts,
+        ResponseKeys.COVERAGE.value: round(coverage, 4),
+    }
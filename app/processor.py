@@ -1,20 +1,63 @@
 """Collection of functional hooks that leverage specialized classes"""
 import hashlib
+import sys
 
-from constants import ResponseKeys
+from constants import OverlapPolicies, ResponseKeys
+from metrics import Counter
+from overlap import resolve_overlaps
+from tracing import span
 
+# pipeline results that could not be located in the original text
+entities_not_found = Counter(
+    "entities_not_found_total", "Entities reported by the pipeline but not found in the text"
+)
 
-def format_pii_for_output(pii: dict[str, dict]) -> dict:
-    """Reformat datafog library results to meet API contract"""
-    sorted_entities = get_entities_from_pii(pii)
+
+def format_pii_for_output(
+    pii: dict[str, dict],
+    entities: list | None = None,
+    byte_offsets: bool = False,
+    group: bool = False,
+) -> dict:
+    """Reformat datafog library results to meet API contract
+
+    entities may be passed when already computed, e.g. by incremental annotation, as a list
+    or an entity_table.EntityTable. With group each distinct value is listed once with all its
+    spans.
+    """
+    original_text = list(pii.keys())[0]  # original text fed to datafog library
+    if is_entity_table(entities):
+        entities = entities.to_dicts(original_text if byte_offsets else None)
+    else:
+        if entities is None:
+            with span("entities"):
+                entities = get_entities_from_pii(pii)
+        if byte_offsets:
+            add_byte_offsets(entities, original_text)
+    if group:
+        return {ResponseKeys.TITLE.value: format_groups(group_entities(entities))}
     # add sorted entities to the output dict
-    return {ResponseKeys.TITLE.value: sorted_entities}
+    return {ResponseKeys.TITLE.value: entities}
+
+
+def is_entity_table(entities) -> bool:
+    """Whether entities are held in an entity_table.EntityTable rather than a list of dicts
+
+    The module is not imported here as it imports numpy, no table exists before it is loaded
+    """
+    module = sys.modules.get("entity_table")
+    return module is not None and isinstance(entities, module.EntityTable)
+
 
+def get_entities_from_pii(
+    pii: dict[str, dict], policy: OverlapPolicies | None = None
+) -> list:
+    """Produce a sorted list of entities from the datafog library results
 
-def get_entities_from_pii(pii: dict[str, dict]) -> list:
-    """Produce a sorted list of entities from the datafog library results"""
+    Overlapping entities are resolved with the given or configured overlap policy
+    """
     entities = []  # list of entities to output
-    claimed_start_indices = set()  # Set of start indices of PII that have been found
+    claimed_start_indices = {}  # start indices of the PII found so far, per PII text
     original_text = list(pii.keys())[0]  # original text fed to datafog library
     dict_of_pii_types = pii[original_text]  # dict of PII entities keyed by type
     for k, v in dict_of_pii_types.items():
@@ -22,34 +65,83 @@ def get_entities_from_pii(pii: dict[str, dict]) -> list:
         # create_entities returns a list of entities, we must use extend to individually add
         # these to our output collection as append would add the whole list
         entities.extend(create_entities(original_text, k, v, claimed_start_indices))
-    # sort entities by the start index of the PII in the original text
-    return sorted(entities, key=lambda d: d[ResponseKeys.START_IDX.value])
+    # drop overlapping entities and sort by the start index of the PII in the original text
+    return resolve_overlaps(entities, policy)
+
+
+def group_entities(entities: list) -> dict[tuple[str, str], list]:
+    """Collect sorted entities by (type, text) in one pass, in order of first occurrence"""
+    type_key = ResponseKeys.ENTITY_TYPE.value
+    text_key = ResponseKeys.PII_TEXT.value
+    groups = {}
+    for ent in entities:
+        key = (ent[type_key], ent[text_key])
+        occurrences = groups.get(key)
+        if occurrences is None:
+            groups[key] = [ent]
+        else:
+            occurrences.append(ent)
+    return groups
+
+
+def format_groups(groups: dict[tuple[str, str], list]) -> list:
+    """List each distinct value once with the [start, end] spans of its occurrences"""
+    start_key = ResponseKeys.START_IDX.value
+    end_key = ResponseKeys.END_IDX.value
+    result = []
+    for (pii_type, pii), occurrences in groups.items():
+        item = {
+            ResponseKeys.PII_TEXT.value: pii,
+            ResponseKeys.ENTITY_TYPE.value: pii_type,
+            ResponseKeys.SPANS.value: [[ent[start_key], ent[end_key]] for ent in occurrences],
+        }
+        if ResponseKeys.START_BYTE.value in occurrences[0]:
+            item[ResponseKeys.BYTE_SPANS.value] = [
+                [ent[ResponseKeys.START_BYTE.value], ent[ResponseKeys.END_BYTE.value]]
+                for ent in occurrences
+            ]
+        result.append(item)
+    return result
 
 
 def create_entities(
-    original_text: str, pii_type: str, pii_list, seen_indices: set
+    original_text: str, pii_type: str, pii_list, seen_indices: dict[str, set]
 ) -> list:
     """Create an output list of PII entities from a list of PII of a particular type"""
+    return [
+        create_entity(pii, start, end, pii_type)
+        for start, end, pii in locate_pii(original_text, pii_list, seen_indices)
+    ]
+
+
+def locate_pii(
+    original_text: str, pii_list, seen_indices: dict[str, set]
+) -> list[tuple[int, int, str]]:
+    """Find a list of PII of a particular type in the text as (start, end, pii)
+
+    A start index is claimed per PII text, so a text reported under several types is matched
+    to distinct occurrences, while different texts starting at the same index are all kept
+    for resolve_overlaps to choose between.
+    """
     result = []
     start_index = 0
     for pii in pii_list:
-        # for each pii in the input list find it in the original text and create an response
-        # entity to add to the output list
-        result.append(
-            create_entity(original_text, start_index, pii_type, pii, seen_indices)
-        )
+        # for each pii in the input list find it in the original text
+        seen = seen_indices.setdefault(pii, set())
+        start, end = find_pii_in_text(original_text, start_index, pii, seen)
+        if start is None:
+            # the pii could not be located, leave it out rather than emit unusable offsets
+            entities_not_found.inc()
+            continue
+        result.append((start, end, pii))
         # begin the search for the next PII at the next character after the end of the PII
         # just added to the output by updating startIndex
-        start_index = result[-1][ResponseKeys.END_IDX.value] + 1
+        start_index = end + 1
     return result
 
 
-def create_entity(
-    text: str, start_index: int, pii_type: str, pii: str, seen: set
-) -> dict:
-    """Create an output PII entity from a singular datafog library result"""
-    # TODO: fail gracefully if we cant find the pii in the original text
-    start, end = find_pii_in_text(text, start_index, pii, seen)
+def create_entity(pii: str, start: int, end: int, pii_type: str) -> dict:
+    """Create an output PII entity from a singular located datafog library result"""
     result = {
         ResponseKeys.PII_TEXT.value: pii,
         ResponseKeys.START_IDX.value: start,
@@ -106,11 +198,28 @@ def find_pii_in_text(
     return (start, end)
 
 
-def anonymize_pii_for_output(pii: dict[str, dict]) -> dict:
+def anonymize_pii_for_output(
+    pii: dict[str, dict],
+    entities: list | None = None,
+    byte_offsets: bool = False,
+    group: bool = False,
+) -> dict:
     """Given datafog library results uses helper functions to anonymize and return the text"""
     original_text = list(pii.keys())[0]  # original text fed to datafog library
-    entities = get_entities_from_pii(pii)
-    anonymized_text = anonymize_pii_in_text(entities, original_text)
+    if is_entity_table(entities):
+        with span("anonymize"):
+            anonymized_text = entities.anonymize(original_text)
+        entities = entities.to_dicts(original_text if byte_offsets else None)
+    else:
+        if entities is None:
+            with span("entities"):
+                entities = get_entities_from_pii(pii)
+        if byte_offsets:
+            add_byte_offsets(entities, original_text)
+        with span("anonymize"):
+            anonymized_text = anonymize_pii_in_text(entities, original_text)
+    if group:
+        entities = format_groups(group_entities(entities))
     response = {
         ResponseKeys.PII_TEXT.value: anonymized_text,
         ResponseKeys.TITLE.value: entities,
@@ -118,28 +227,60 @@ def anonymize_pii_for_output(pii: dict[str, dict]) -> dict:
     return response
 
 
+def add_byte_offsets(entities: list, text: str) -> list:
+    """Add the UTF-8 byte offsets of sorted entities in a single pass over the text"""
+    start_key = ResponseKeys.START_IDX.value
+    end_key = ResponseKeys.END_IDX.value
+    if text.isascii():
+        # every character is a single byte
+        for ent in entities:
+            ent[ResponseKeys.START_BYTE.value] = ent[start_key]
+            ent[ResponseKeys.END_BYTE.value] = ent[end_key]
+        return entities
+
+    position = 0  # character offset reached so far
+    byte_position = 0  # byte offset of position
+    for ent in entities:
+        # only the text between consecutive entities and the entities themselves are encoded
+        byte_position += len(text[position : ent[start_key]].encode())
+        position = ent[start_key]
+        ent[ResponseKeys.START_BYTE.value] = byte_position
+        ent[ResponseKeys.END_BYTE.value] = byte_position + len(
+            text[position : ent[end_key]].encode()
+        )
+    return entities
+
+
 def anonymize_pii_in_text(pii_entities: list, text: str) -> str:
     """Anonymize the provided entities in the text"""
-    offset = 0  # track the changes in length of the text
-    original_text_length = len(text)
+    parts = []  # pieces of the output text, joined once at the end
+    position = 0  # end of the text consumed so far
     for ent in pii_entities:
-        place_holder = "[" + ent[ResponseKeys.ENTITY_TYPE.value] + "]"
-        # calculate the new start and stop indices to account for the updates so far
-        start = ent[ResponseKeys.START_IDX.value] - offset
-        stop = ent[ResponseKeys.END_IDX.value] - offset
-        # substitute into text subtracting offset
-        text = text[:start] + place_holder + text[stop:]
-        # update offset to account for the new string
-        offset = original_text_length - len(text)
+        start = ent[ResponseKeys.START_IDX.value]
+        if start < position:
+            # nested within an entity that has already been replaced
+            continue
+        parts.append(text[position:start])
+        parts.append("[" + ent[ResponseKeys.ENTITY_TYPE.value] + "]")
+        position = ent[ResponseKeys.END_IDX.value]
+    parts.append(text[position:])
 
-    return text
+    return "".join(parts)
 
 
-def encode_pii_for_output(pii: dict[str, dict], salt: str) -> dict:
+def encode_pii_for_output(
+    pii: dict[str, dict], salt: str, entities: list | None = None
+) -> dict:
     """Anonymize the provided entities in the text and return lookup table for decoding"""
     original_text = list(pii.keys())[0]  # original text fed to datafog library
-    entities = get_entities_from_pii(pii)
-    encoded_text, lookup_table = encode_pii_in_text(entities, original_text, salt)
+    if entities is None:
+        with span("entities"):
+            entities = get_entities_from_pii(pii)
+    with span("encode"):
+        if is_entity_table(entities):
+            encoded_text, lookup_table = entities.encode(original_text, salt)
+        else:
+            encoded_text, lookup_table = encode_pii_in_text(entities, original_text, salt)
     response = {
         ResponseKeys.PII_TEXT.value: encoded_text,
         ResponseKeys.LOOKUP_TABLE.value: lookup_table,
@@ -149,24 +290,30 @@ def encode_pii_for_output(pii: dict[str, dict], salt: str) -> dict:
 
 def encode_pii_in_text(pii_entities: list, text: str, salt: str) -> tuple[str, dict]:
     """Remove PII from original text, replace with md5 hash and reversal information"""
-    offset = 0  # track the changes in length of the text
-    original_text_length = len(text)
+    parts = []  # pieces of the output text, joined once at the end
+    position = 0  # end of the text consumed so far
     lookup_table = {}
+    # each distinct value is hashed once however often it occurs
+    hashes = {
+        key: hashlib.md5((key[0] + key[1] + salt).encode()).hexdigest()
+        for key in group_entities(pii_entities)
+    }
     for ent in pii_entities:
+        start = ent[ResponseKeys.START_IDX.value]
+        if start < position:
+            # nested within an entity that has already been replaced
+            continue
         pii = ent[ResponseKeys.PII_TEXT.value]
         pii_type = ent[ResponseKeys.ENTITY_TYPE.value]
-        md5_hash = hashlib.md5((pii_type + pii + salt).encode()).hexdigest()
-        # calculate the new start and stop indices to account for the updates so far
-        start = ent[ResponseKeys.START_IDX.value] - offset
-        stop = ent[ResponseKeys.END_IDX.value] - offset
-        # substitute into text subtracting offset
-        text = text[:start] + "[" + md5_hash + "]" + text[stop:]
-        # update offset to account for the new string
-        offset = original_text_length - len(text)
+        md5_hash = hashes[(pii_type, pii)]
+        parts.append(text[position:start])
+        parts.append("[" + md5_hash + "]")
+        position = ent[ResponseKeys.END_IDX.value]
 
         lookup_table[md5_hash] = {
             ResponseKeys.ENTITY_TYPE.value: pii_type,
             ResponseKeys.PII_TEXT.value: pii
         }
+    parts.append(text[position:])
 
-    return (text, lookup_table)
+    return ("".join(parts), lookup_table)
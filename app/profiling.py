@@ -0,0 +1,143 @@
+"""Opt-in per request CPU profiling"""
+
+# Standard library imports
+import cProfile
+import functools
+import os
+import pstats
+import random
+import re
+import secrets
+import time
+from contextvars import ContextVar
+
+# Third party imports
+from starlette.concurrency import run_in_threadpool
+
+# Local imports
+from constants import (
+    PROFILE_DEFAULT_DIR,
+    PROFILE_DEFAULT_MAX_FILES,
+    PROFILE_DIR_KEY,
+    PROFILE_ENABLED_KEY,
+    PROFILE_FILE_SUFFIX,
+    PROFILE_HEADER,
+    PROFILE_MAX_FILES_KEY,
+    PROFILE_SAMPLE_RATE_KEY,
+    PROFILE_TOKEN_KEY,
+)
+
+PROFILING_ENABLED = os.getenv(PROFILE_ENABLED_KEY, "false").lower() == "true"
+
+# Profiles collected from threadpool threads for the request currently being profiled
+_ACTIVE_PROFILES: ContextVar[list | None] = ContextVar("active_profiles", default=None)
+
+
+def profiled(func):
+    """Decorate a sync endpoint so its threadpool execution is included in request profiles
+
+    When profiling is disabled the function is returned untouched so there is no overhead
+    """
+    if not PROFILING_ENABLED:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiles = _ACTIVE_PROFILES.get()
+        if profiles is None:
+            return func(*args, **kwargs)
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(func, *args, **kwargs)
+        finally:
+            profiles.append(profiler)
+
+    return wrapper
+
+
+class ProfilingMiddleware:
+    """ASGI middleware writing a cProfile dump for sampled or explicitly flagged requests
+
+    A profiler on the event loop thread sees every coroutine that runs while it is enabled and
+    only one can be active per thread, so at most one request is profiled at a time. Requests
+    sampled meanwhile are served without a profile. The loop side of a profile may still hold
+    some work of concurrent unprofiled requests, the threadpool side only holds its own.
+    """
+
+    def __init__(
+        self,
+        app,
+        sample_rate: float | None = None,
+        directory: str | None = None,
+        max_files: int | None = None,
+        token: str | None = None,
+    ):
+        self.app = app
+        if sample_rate is None:
+            sample_rate = float(os.getenv(PROFILE_SAMPLE_RATE_KEY, "0"))
+        self.sample_rate = sample_rate
+        self.directory = directory or os.getenv(PROFILE_DIR_KEY, PROFILE_DEFAULT_DIR)
+        if max_files is None:
+            max_files = int(os.getenv(PROFILE_MAX_FILES_KEY, str(PROFILE_DEFAULT_MAX_FILES)))
+        self.max_files = max_files
+        self.token = token if token is not None else os.getenv(PROFILE_TOKEN_KEY)
+        # set while a request is profiled, only read and written on the event loop thread
+        self.busy = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.busy or not self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self.busy = True
+        profiles = []
+        reset_token = _ACTIVE_PROFILES.set(profiles)
+        # profiles the event loop side of the request: routing, validation and serialization
+        loop_profiler = cProfile.Profile()
+        loop_profiler.enable()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            loop_profiler.disable()
+            self.busy = False
+            _ACTIVE_PROFILES.reset(reset_token)
+            await run_in_threadpool(self.write_profile, scope, [loop_profiler, *profiles])
+
+    def should_profile(self, scope) -> bool:
+        """Decide whether the request is sampled or carries a valid debug header"""
+        if self.token:
+            for name, value in scope.get("headers", []):
+                if name.decode("latin-1").lower() == PROFILE_HEADER:
+                    return secrets.compare_digest(value, self.token.encode("utf8"))
+        return random.random() < self.sample_rate
+
+    def write_profile(self, scope, profilers: list) -> str | None:
+        """Merge the collected profiles into a single pstats file and rotate old files"""
+        try:
+            stats = pstats.Stats(profilers[0])
+            for profiler in profilers[1:]:
+                stats.add(profiler)
+            os.makedirs(self.directory, exist_ok=True)
+            path_name = re.sub(r"[^A-Za-z0-9]+", "_", scope.get("path", "")).strip("_")
+            filename = f"{time.time_ns()}-{scope.get('method', '')}-{path_name}"
+            filepath = os.path.join(self.directory, filename + PROFILE_FILE_SUFFIX)
+            stats.dump_stats(filepath)
+            self.rotate()
+            return filepath
+        except OSError as e:
+            print(f"Failed to write profile to '{self.directory}': {e}")
+        return None
+
+    def rotate(self):
+        """Delete the oldest profiles so at most max_files remain in the directory"""
+        files = sorted(
+            entry.path
+            for entry in os.scandir(self.directory)
+            if entry.is_file() and entry.name.endswith(PROFILE_FILE_SUFFIX)
+        )
+        # filenames start with a nanosecond timestamp so lexical order is age order
+        for path in files[: max(len(files) - self.max_files, 0)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,124 @@
+"""In-memory token bucket rate limiting per credential and per client address"""
+
+# Standard library imports
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Third party imports
+from fastapi import HTTPException, Request, status
+from fastapi.requests import HTTPConnection
+
+# Local imports
+from constants import (
+    RATE_LIMIT_COST_BYTES_KEY,
+    RATE_LIMIT_CREDENTIAL_BURST_KEY,
+    RATE_LIMIT_CREDENTIAL_RATE_KEY,
+    RATE_LIMIT_DEFAULT_COST_BYTES,
+    RATE_LIMIT_DEFAULT_CREDENTIAL_BURST,
+    RATE_LIMIT_DEFAULT_CREDENTIAL_RATE,
+    RATE_LIMIT_DEFAULT_IP_BURST,
+    RATE_LIMIT_DEFAULT_IP_RATE,
+    RATE_LIMIT_DEFAULT_MAX_KEYS,
+    RATE_LIMIT_ENABLED_KEY,
+    RATE_LIMIT_IP_BURST_KEY,
+    RATE_LIMIT_IP_RATE_KEY,
+    RATE_LIMIT_MAX_KEYS_KEY,
+    ExceptionMessages,
+)
+from metrics import Counter
+
+RATE_LIMIT_ENABLED = os.getenv(RATE_LIMIT_ENABLED_KEY, "false").lower() == "true"
+
+rate_limited = Counter("rate_limited_total", "Requests rejected by the rate limiter")
+
+
+class RateLimiter:
+    """Token buckets refilled at rate cost units per second up to burst, one per key
+
+    Each check is a dictionary lookup and a little arithmetic. Only the most recently used
+    max_keys buckets are kept, a bucket evicted for being idle would have refilled anyway.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()  # key -> (tokens, monotonic time of the last update)
+        self.lock = threading.Lock()
+
+    def acquire(self, key, cost: float, now: float | None = None) -> float:
+        """Take cost tokens from the bucket of key, returning 0 or the seconds to wait"""
+        now = time.monotonic() if now is None else now
+        # a request costing more than the burst is let through once the bucket is full
+        cost = min(cost, self.burst)
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost - tokens) / self.rate
+            self.buckets[key] = (tokens, now)
+            self.buckets.move_to_end(key)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return wait
+
+
+def create_limiter(rate_key: str, burst_key: str, rate: float, burst: float):
+    """Build a limiter from the environment, None when its rate is 0"""
+    rate = float(os.getenv(rate_key, str(rate)))
+    if rate <= 0:
+        return None
+    burst = float(os.getenv(burst_key, str(burst)))
+    max_keys = int(os.getenv(RATE_LIMIT_MAX_KEYS_KEY, str(RATE_LIMIT_DEFAULT_MAX_KEYS)))
+    return RateLimiter(rate, max(burst, 1.0), max_keys)
+
+
+CREDENTIAL_LIMITER = create_limiter(
+    RATE_LIMIT_CREDENTIAL_RATE_KEY,
+    RATE_LIMIT_CREDENTIAL_BURST_KEY,
+    RATE_LIMIT_DEFAULT_CREDENTIAL_RATE,
+    RATE_LIMIT_DEFAULT_CREDENTIAL_BURST,
+)
+IP_LIMITER = create_limiter(
+    RATE_LIMIT_IP_RATE_KEY,
+    RATE_LIMIT_IP_BURST_KEY,
+    RATE_LIMIT_DEFAULT_IP_RATE,
+    RATE_LIMIT_DEFAULT_IP_BURST,
+)
+COST_BYTES = int(os.getenv(RATE_LIMIT_COST_BYTES_KEY, str(RATE_LIMIT_DEFAULT_COST_BYTES)))
+
+
+def message_cost(size: int) -> float:
+    """Weigh a request or message by its size, one unit plus one per COST_BYTES"""
+    return 1.0 + max(size, 0) // COST_BYTES
+
+
+async def request_cost(request: Request) -> float:
+    """Weigh a request by the size of its decoded body, which FastAPI has already read"""
+    # Content-Length is absent from chunked requests and may be forged, the body is not
+    return message_cost(len(await request.body()))
+
+
+def check_rate_limit(limiter: RateLimiter | None, key, cost: float):
+    """Raise a 429 with Retry-After when the bucket of key cannot pay for the request"""
+    if limiter is None or key is None:
+        return
+    wait = limiter.acquire(key, cost)
+    if wait > 0:
+        rate_limited.inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=ExceptionMessages.RATE_LIMITED.value,
+            headers={"Retry-After": str(math.ceil(wait))},
+        )
+
+
+def client_address(connection: HTTPConnection) -> str | None:
+    """Address of the client, as resolved by the server from trusted proxy headers"""
+    return connection.client.host if connection.client is not None else None
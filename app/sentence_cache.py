@@ -0,0 +1,107 @@
+"""Sentence level cache of pipeline results for texts sharing boilerplate"""
+
+# Standard library imports
+import os
+import re
+
+# Local imports
+from cache import LRUCache, content_key
+from constants import (
+    SENTENCE_ABBREVIATIONS,
+    SENTENCE_CACHE_DEFAULT_SIZE,
+    SENTENCE_CACHE_ENABLED_KEY,
+    SENTENCE_CACHE_SIZE_KEY,
+)
+from metrics import Counter, register
+
+SENTENCE_CACHE_ENABLED = os.getenv(SENTENCE_CACHE_ENABLED_KEY, "false").lower() == "true"
+
+# Sentences end at terminal punctuation followed by whitespace, or at a line break
+SENTENCE_BOUNDARY = re.compile(r"[.!?]+[\"')\]]*\s+|\s*\n\s*")
+
+
+def is_abbreviation(preceding: str) -> bool:
+    """Whether a period after this text belongs to an abbreviation or an initial"""
+    words = preceding.split()
+    if not words:
+        return False
+    word = words[-1].rstrip(".").lower()
+    return word in SENTENCE_ABBREVIATIONS or (len(word) == 1 and word.isalpha())
+
+
+def split_sentences(text: str) -> list[str]:
+    """Split a text into sentences, dropping the whitespace between them"""
+    result = []
+    start = 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        if text[match.start()] == "." and "\n" not in match.group():
+            if is_abbreviation(text[start : match.start()]):
+                continue
+        sentence = text[start : match.end()].strip()
+        if sentence:
+            result.append(sentence)
+        start = match.end()
+    if text[start:].strip():
+        result.append(text[start:].strip())
+    return result
+
+
+class SentenceCachePipeline:
+    """Wraps a pipeline, running inference only on sentences missing from an LRU cache
+
+    Results are stitched back per text into the {text: {type: [...]}} structure of the wrapped
+    pipeline. Entities spanning a sentence boundary are not detected in this mode.
+    """
+
+    def __init__(self, pipeline, cache: LRUCache):
+        self.pipeline = pipeline
+        self.cache = cache
+        self.inferred = Counter(
+            "sentence_cache_inferred_total", "Sentences run through the model on a cache miss"
+        )
+        register(
+            "sentence_cache_hit_rate",
+            "Fraction of sentence lookups served from the sentence cache",
+            cache.hit_rate,
+        )
+
+    def run_text_pipeline_sync(self, str_list: list[str]) -> dict[str, dict]:
+        """Annotate a list of texts, returning results keyed by text like DataFog"""
+        # a text without sentence boundaries is cached whole
+        keyed = {
+            text: [(s, content_key(s)) for s in split_sentences(text) or [text]]
+            for text in str_list
+        }
+        entries = {}
+        missing = {}  # sentences to annotate keyed by content hash, duplicates are run once
+        for sentences in keyed.values():
+            for sentence, key in sentences:
+                if key in entries or key in missing:
+                    continue
+                entry = self.cache.get(key)
+                if entry is None:
+                    missing[key] = sentence
+                else:
+                    entries[key] = entry
+
+        if missing:
+            results = self.pipeline.run_text_pipeline_sync(list(missing.values()))
+            self.inferred.inc(len(missing))
+            for key, sentence in missing.items():
+                entries[key] = results[sentence]
+                self.cache.put(key, results[sentence])
+
+        output = {}
+        for text, sentences in keyed.items():
+            merged = {}
+            for _, key in sentences:
+                for pii_type, values in entries[key].items():
+                    merged.setdefault(pii_type, []).extend(values)
+            output[text] = merged
+        return output
+
+
+def create_sentence_cache_pipeline(pipeline) -> SentenceCachePipeline:
+    """Wrap a pipeline with a sentence cache sized from the environment"""
+    size = int(os.getenv(SENTENCE_CACHE_SIZE_KEY, str(SENTENCE_CACHE_DEFAULT_SIZE)))
+    return SentenceCachePipeline(pipeline, LRUCache(size))
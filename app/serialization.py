@@ -0,0 +1,134 @@
+"""MessagePack request and response bodies negotiated with Content-Type and Accept"""
+
+# Standard library imports
+from contextvars import ContextVar
+from typing import Any, Callable
+
+# Third party imports
+import msgpack
+from fastapi import Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from starlette.background import BackgroundTask
+
+# Local imports
+from constants import (
+    JSON_CONTENT_TYPE,
+    MSGPACK_CONTENT_TYPE,
+    MSGPACK_CONTENT_TYPES,
+    ExceptionMessages,
+)
+from custom_exceptions import build_error_detail
+
+# set while a route handler serves a client that negotiated MessagePack responses
+use_msgpack: ContextVar[bool] = ContextVar("use_msgpack", default=False)
+
+
+def media_type(content_type: str | None) -> str:
+    """Media type of a Content-Type header without its parameters"""
+    return (content_type or "").partition(";")[0].strip().lower()
+
+
+def accepts_msgpack(accept: str | None) -> bool:
+    """Whether an Accept header prefers MessagePack, JSON wins ties and wildcards"""
+    if not accept:
+        return False
+    weights = {}
+    for item in accept.split(","):
+        name, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            param = param.strip()
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        weights[name.strip().lower()] = quality
+
+    msgpack_quality = max(weights.get(name, 0.0) for name in MSGPACK_CONTENT_TYPES)
+    json_quality = weights.get(
+        JSON_CONTENT_TYPE, weights.get("application/*", weights.get("*/*", 0.0))
+    )
+    return msgpack_quality > 0 and msgpack_quality > json_quality
+
+
+def packb(content: Any) -> bytes:
+    """Encode a JSON compatible value, integers are packed natively"""
+    return msgpack.packb(content, use_bin_type=True)
+
+
+def unpackb(body: bytes) -> Any:
+    """Decode a request body, raising a validation error like invalid JSON would"""
+    try:
+        return msgpack.unpackb(body, raw=False)
+    except (ValueError, msgpack.UnpackException) as exc:
+        raise RequestValidationError(
+            build_error_detail(
+                ["body"], "value_error.msgpack", ExceptionMessages.INVALID_MSGPACK.value
+            )
+        ) from exc
+
+
+class NegotiatedResponse(JSONResponse):
+    """Default response of the routes, MessagePack when the client negotiated it"""
+
+    def __init__(
+        self,
+        content: Any,
+        status_code: int = 200,
+        headers: dict | None = None,
+        media_type: str | None = None,
+        background: BackgroundTask | None = None,
+    ):
+        if media_type is None and use_msgpack.get():
+            media_type = MSGPACK_CONTENT_TYPE
+        super().__init__(content, status_code, headers, media_type, background)
+
+    def render(self, content: Any) -> bytes:
+        if self.media_type == MSGPACK_CONTENT_TYPE:
+            return packb(content)
+        return super().render(content)
+
+
+def encoded_response(
+    request: Request | None, status_code: int, content: Any, headers: dict | None = None
+) -> Response:
+    """Build an error response in the encoding the client asked for, JSON without a request"""
+    if request is not None and accepts_msgpack(request.headers.get("accept")):
+        return Response(packb(content), status_code, headers, MSGPACK_CONTENT_TYPE)
+    return JSONResponse(content, status_code, headers)
+
+
+class MsgpackRoute(APIRoute):
+    """Route decoding MessagePack bodies and encoding responses as negotiated
+
+    Decoded bodies are handed to FastAPI as parsed JSON, so validation and the endpoint
+    signatures are the same for both encodings.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            if media_type(request.headers.get("content-type")) in MSGPACK_CONTENT_TYPES:
+                body = await request.body()
+                scope = dict(request.scope)
+                scope["headers"] = [
+                    (name, value)
+                    for name, value in request.scope["headers"]
+                    if name != b"content-type"
+                ] + [(b"content-type", JSON_CONTENT_TYPE.encode("latin-1"))]
+                request = Request(scope, request.receive)
+                # Request.json() returns the cached value instead of parsing the body
+                request._body = body  # pylint: disable=protected-access
+                if body:
+                    request._json = unpackb(body)  # pylint: disable=protected-access
+            token = use_msgpack.set(accepts_msgpack(request.headers.get("accept")))
+            try:
+                return await handler(request)
+            finally:
+                use_msgpack.reset(token)
+
+        return route_handler
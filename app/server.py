@@ -0,0 +1,76 @@
+"""Sizing of the production multi-worker server, used by gunicorn.conf.py"""
+
+# Standard library imports
+import math
+import os
+
+# Local imports
+from constants import (
+    CGROUP_ROOT,
+    NATIVE_THREAD_ENV_VARS,
+    SERVER_AUTO_WORKERS,
+    SERVER_DEFAULT_THREADS_PER_WORKER,
+    SERVER_THREADS_PER_WORKER_KEY,
+    SERVER_WORKERS_KEY,
+)
+
+
+def read_cgroup_cpu_limit(root: str = CGROUP_ROOT) -> float | None:
+    """Read the CPU quota of the container in cores, None when unlimited or unknown"""
+    try:
+        # cgroup v2, "<quota> <period>" or "max <period>"
+        with open(os.path.join(root, "cpu.max"), encoding="utf-8") as file:
+            quota, period = file.read().split()[:2]
+        if quota == "max":
+            return None
+        return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        # cgroup v1, a quota of -1 means unlimited
+        with open(os.path.join(root, "cpu", "cpu.cfs_quota_us"), encoding="utf-8") as file:
+            quota = int(file.read())
+        with open(os.path.join(root, "cpu", "cpu.cfs_period_us"), encoding="utf-8") as file:
+            period = int(file.read())
+    except (OSError, ValueError):
+        return None
+    return quota / period if quota > 0 and period > 0 else None
+
+
+def available_cpus(root: str = CGROUP_ROOT) -> int:
+    """Cores this process may use, honouring CPU affinity and the cgroup quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover - not available on macOS
+        cpus = os.cpu_count() or 1
+    limit = read_cgroup_cpu_limit(root)
+    if limit is not None:
+        cpus = min(cpus, math.ceil(limit))
+    return max(cpus, 1)
+
+
+def get_threads_per_worker() -> int:
+    """Read the size of the native thread pools of each worker from the environment"""
+    return max(
+        int(os.getenv(SERVER_THREADS_PER_WORKER_KEY, str(SERVER_DEFAULT_THREADS_PER_WORKER))),
+        1,
+    )
+
+
+def get_worker_count(root: str = CGROUP_ROOT) -> int:
+    """Read the worker count, by default one per available core given the thread pool size"""
+    value = os.getenv(SERVER_WORKERS_KEY, SERVER_AUTO_WORKERS).strip().lower()
+    if value != SERVER_AUTO_WORKERS:
+        return max(int(value), 1)
+    return max(available_cpus(root) // get_threads_per_worker(), 1)
+
+
+def pin_thread_pools(threads: int):
+    """Size the thread pools of BLAS/OpenMP libraries, must run before they are imported
+
+    Explicit settings in the environment are kept. Besides avoiding oversubscription when
+    several workers share the cores, keeping OpenMP single threaded in the parent avoids
+    forking a process whose OpenMP pool is already running.
+    """
+    for name in NATIVE_THREAD_ENV_VARS:
+        os.environ.setdefault(name, str(threads))
@@ -0,0 +1,204 @@
+"""Result cache shared by the worker processes of a host, stored in SQLite"""
+
+# Standard library imports
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# Third party imports
+import msgpack
+
+# Local imports
+from cache import content_key
+from constants import (
+    SHARED_CACHE_CHECK_INTERVAL,
+    SHARED_CACHE_DEFAULT_MAX_BYTES,
+    SHARED_CACHE_DEFAULT_PATH,
+    SHARED_CACHE_ENABLED_KEY,
+    SHARED_CACHE_EVICT_FRACTION,
+    SHARED_CACHE_MAX_BYTES_KEY,
+    SHARED_CACHE_PATH_KEY,
+    SHARED_CACHE_REFRESH_SECONDS,
+    SHARED_CACHE_TIMEOUT,
+)
+from metrics import register
+
+SHARED_CACHE_ENABLED = os.getenv(SHARED_CACHE_ENABLED_KEY, "false").lower() == "true"
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS results "
+    "(key BLOB PRIMARY KEY, value BLOB NOT NULL, used REAL NOT NULL) WITHOUT ROWID"
+)
+
+
+def encode_result(result: dict[str, list[str]]) -> bytes:
+    """Pack a pipeline result {type: [values]} into MessagePack"""
+    return msgpack.packb(result, use_bin_type=True)
+
+
+def decode_result(data: bytes) -> dict[str, list[str]]:
+    """Unpack a pipeline result"""
+    return msgpack.unpackb(data, raw=False)
+
+
+class SharedCache:
+    """Bounded cache in an SQLite database in WAL mode, used by every worker of the host
+
+    Readers never block the writer and entries outlive the workers that wrote them. Once the
+    database and its write-ahead log exceed max_bytes the log is checkpointed and truncated,
+    and if that is not enough the least recently used tenth of the entries is deleted. The
+    last use of an entry is only updated on a hit once it is older than a minute, so lookups
+    rarely write. Lock timeouts and other database errors count as misses, the cache never
+    fails a request.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.local = threading.local()  # one connection per thread
+        self.stats_lock = threading.Lock()  # requests update the counters from many threads
+        self.writes = 0
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self.connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        """Connection of the calling thread, reopened after a fork"""
+        connection = getattr(self.local, "connection", None)
+        if connection is None or self.local.pid != os.getpid():
+            connection = sqlite3.connect(
+                self.path, timeout=SHARED_CACHE_TIMEOUT, isolation_level=None
+            )
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return connection
+
+    def get(self, key: bytes):
+        """Return the cached result or None"""
+        try:
+            connection = self.connection()
+            row = connection.execute(
+                "SELECT value, used FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                now = time.time()
+                if now - row[1] > SHARED_CACHE_REFRESH_SECONDS:
+                    connection.execute("UPDATE results SET used = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            logger.warning("Shared cache lookup failed: %s", e)
+            row = None
+        with self.stats_lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return None if row is None else decode_result(row[0])
+
+    def put(self, key: bytes, result: dict):
+        """Store a result, evicting old entries when the database has grown too large"""
+        try:
+            connection = self.connection()
+            connection.execute(
+                "INSERT OR REPLACE INTO results (key, value, used) VALUES (?, ?, ?)",
+                (key, encode_result(result), time.time()),
+            )
+            with self.stats_lock:
+                self.writes += 1
+                check = self.writes % SHARED_CACHE_CHECK_INTERVAL == 0
+            if check:
+                self.evict()
+        except sqlite3.Error as e:
+            logger.warning("Shared cache store failed: %s", e)
+
+    def size(self) -> int:
+        """Bytes used by entries, excluding free pages, and by the write-ahead log"""
+        connection = self.connection()
+        page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+        page_count = connection.execute("PRAGMA page_count").fetchone()[0]
+        free_pages = connection.execute("PRAGMA freelist_count").fetchone()[0]
+        try:
+            wal_size = os.path.getsize(self.path + "-wal")
+        except OSError:
+            wal_size = 0
+        return (page_count - free_pages) * page_size + wal_size
+
+    def evict(self) -> int:
+        """Delete the least recently used entries while over the size bound"""
+        if self.size() <= self.max_bytes:
+            return 0
+        connection = self.connection()
+        # move the log into the database and empty it, unless a reader still needs it
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        if self.size() <= self.max_bytes:
+            return 0
+        count = connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        limit = max(int(count * SHARED_CACHE_EVICT_FRACTION), 1)
+        # freed pages are reused by later writes, so the file stops growing
+        deleted = connection.execute(
+            "DELETE FROM results WHERE key IN "
+            "(SELECT key FROM results ORDER BY used LIMIT ?)",
+            (limit,),
+        ).rowcount
+        # the deletion itself went through the log
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return deleted
+
+    def hit_rate(self) -> float:
+        """Fraction of lookups of this process served from the cache"""
+        with self.stats_lock:
+            hits, lookups = self.hits, self.hits + self.misses
+        return hits / lookups if lookups else 0.0
+
+
+class SharedCachePipeline:
+    """Wraps a pipeline, running inference only on texts missing from the shared cache"""
+
+    def __init__(self, pipeline, cache: SharedCache, namespace: str = ""):
+        self.pipeline = pipeline
+        self.cache = cache
+        self.namespace = namespace  # keeps results of different pipelines apart
+        register(
+            "shared_cache_hit_rate",
+            "Fraction of lookups of this worker served from the shared result cache",
+            cache.hit_rate,
+        )
+
+    def run_text_pipeline_sync(self, str_list: list[str]) -> dict[str, dict]:
+        """Annotate a list of texts, returning results keyed by text like DataFog"""
+        results = {}
+        missing = {}  # texts to annotate, with their keys
+        for text in str_list:
+            if text in results or text in missing:
+                continue
+            key = content_key(self.namespace + text)
+            result = self.cache.get(key)
+            if result is None:
+                missing[text] = key
+            else:
+                results[text] = result
+
+        if missing:
+            computed = self.pipeline.run_text_pipeline_sync(list(missing))
+            for text, key in missing.items():
+                results[text] = computed[text]
+                self.cache.put(key, computed[text])
+        return {text: results[text] for text in str_list}
+
+
+def create_shared_cache_pipeline(pipeline, namespace: str) -> SharedCachePipeline:
+    """Wrap a pipeline with the shared cache configured in the environment"""
+    cache = SharedCache(
+        os.getenv(SHARED_CACHE_PATH_KEY, SHARED_CACHE_DEFAULT_PATH),
+        int(os.getenv(SHARED_CACHE_MAX_BYTES_KEY, str(SHARED_CACHE_DEFAULT_MAX_BYTES))),
+    )
+    return SharedCachePipeline(pipeline, cache, namespace)
@@ -0,0 +1,238 @@
+"""WebSocket streaming of annotation and anonymization requests over one connection"""
+
+# Standard library imports
+import asyncio
+import json
+import os
+import re
+from contextlib import nullcontext
+from typing import AsyncContextManager, Callable
+
+# Third party imports
+from fastapi import HTTPException, WebSocket, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+
+# Local imports
+from constants import (
+    SALT_MAX_LENGTH,
+    SALT_MIN_LENGTH,
+    STREAM_DEFAULT_LANG,
+    STREAM_DEFAULT_MAX_IN_FLIGHT,
+    STREAM_MAX_IN_FLIGHT_KEY,
+    TEXT_MAX_LENGTH,
+    TEXT_MIN_LENGTH,
+    VALID_INPUT_DESCRIPTION,
+    VALID_INPUT_PATTERN,
+    ExceptionMessages,
+    StreamKeys,
+    StreamOperations,
+)
+from custom_exceptions import StreamMessageError, build_error_detail
+from ratelimit import (
+    CREDENTIAL_LIMITER,
+    IP_LIMITER,
+    RATE_LIMIT_ENABLED,
+    check_rate_limit,
+    message_cost,
+)
+
+VALID_INPUT = re.compile(VALID_INPUT_PATTERN)
+STREAM_MAX_IN_FLIGHT = int(
+    os.getenv(STREAM_MAX_IN_FLIGHT_KEY, str(STREAM_DEFAULT_MAX_IN_FLIGHT))
+)
+
+
+def field_error(field: StreamKeys, error_type: str, msg: str, ctx: dict | None = None):
+    """Describe a failed field check like the errors of the HTTP endpoints"""
+    return build_error_detail(["message", field.value], error_type, msg, ctx)[0]
+
+
+def check_string(
+    message: dict, field: StreamKeys, min_length: int, max_length: int, errors: list
+) -> str | None:
+    """Check a required string field, adding any failure to errors"""
+    value = message.get(field.value)
+    if value is None:
+        errors.append(
+            field_error(field, "value_error.missing", ExceptionMessages.MISSING_FIELD.value)
+        )
+    elif not isinstance(value, str):
+        errors.append(
+            field_error(field, "type_error.str", ExceptionMessages.INVALID_TYPE.value)
+        )
+    elif not min_length <= len(value) <= max_length:
+        msg = f"{ExceptionMessages.INVALID_LENGTH.value} {min_length} and {max_length}"
+        errors.append(field_error(field, "value_error.any_str.length", msg))
+    else:
+        return value
+    return None
+
+
+def parse_message(raw: str) -> dict:
+    """Decode and validate a stream message, raising StreamMessageError on failure
+
+    Returns the message with defaults applied and op converted to a StreamOperations
+    """
+    try:
+        message = json.loads(raw)
+    except ValueError:
+        message = None
+    if not isinstance(message, dict):
+        raise StreamMessageError(
+            build_error_detail(
+                ["message"], "type_error.dict", ExceptionMessages.INVALID_MESSAGE.value
+            )
+        )
+
+    errors = []
+    result = {StreamKeys.ID.value: message.get(StreamKeys.ID.value)}
+    try:
+        operation = StreamOperations(message.get(StreamKeys.OP.value))
+    except ValueError:
+        supported = ", ".join(op.value for op in StreamOperations)
+        msg = f"{ExceptionMessages.UNSUPPORTED_OPERATION.value} {supported}"
+        errors.append(field_error(StreamKeys.OP, "value_error.operation", msg))
+        operation = None
+    result[StreamKeys.OP.value] = operation
+
+    text = check_string(message, StreamKeys.TEXT, TEXT_MIN_LENGTH, TEXT_MAX_LENGTH, errors)
+    if text is not None and not VALID_INPUT.match(text):
+        errors.append(
+            field_error(
+                StreamKeys.TEXT,
+                "value_error.str.regex",
+                ExceptionMessages.INVALID_CHAR.value,
+                {"pattern": VALID_INPUT_DESCRIPTION},
+            )
+        )
+    result[StreamKeys.TEXT.value] = text
+
+    lang = message.get(StreamKeys.LANG.value, STREAM_DEFAULT_LANG)
+    if not isinstance(lang, str):
+        errors.append(
+            field_error(
+                StreamKeys.LANG, "type_error.str", ExceptionMessages.INVALID_TYPE.value
+            )
+        )
+    result[StreamKeys.LANG.value] = lang
+
+    if operation is StreamOperations.ENCODE:
+        result[StreamKeys.SALT.value] = check_string(
+            message, StreamKeys.SALT, SALT_MIN_LENGTH, SALT_MAX_LENGTH, errors
+        )
+
+    for field in (StreamKeys.BYTE_OFFSETS, StreamKeys.GROUP):
+        flag = message.get(field.value, False)
+        if not isinstance(flag, bool):
+            errors.append(
+                field_error(field, "type_error.bool", ExceptionMessages.INVALID_TYPE.value)
+            )
+        result[field.value] = flag
+
+    if errors:
+        raise StreamMessageError(errors)
+    return result
+
+
+def message_id(raw: str):
+    """Best effort correlation id of a message that failed validation"""
+    try:
+        message = json.loads(raw)
+    except ValueError:
+        return None
+    return message.get(StreamKeys.ID.value) if isinstance(message, dict) else None
+
+
+def http_error(exc: HTTPException) -> dict:
+    """Error of a response to a message failing with an HTTP error"""
+    error = {StreamKeys.STATUS.value: exc.status_code, StreamKeys.DETAIL.value: exc.detail}
+    if exc.headers and "Retry-After" in exc.headers:
+        error[StreamKeys.RETRY_AFTER.value] = int(exc.headers["Retry-After"])
+    return error
+
+
+def handle_message(raw: str, process: Callable[[dict], dict], address, username) -> dict:
+    """Validate, rate limit and process one message, turning failures into error responses"""
+    try:
+        message = parse_message(raw)
+        if RATE_LIMIT_ENABLED:
+            cost = message_cost(len(raw))
+            check_rate_limit(IP_LIMITER, address, cost)
+            check_rate_limit(CREDENTIAL_LIMITER, username, cost)
+        return {
+            StreamKeys.ID.value: message[StreamKeys.ID.value],
+            StreamKeys.RESULT.value: process(message),
+        }
+    except RequestValidationError as exc:
+        error = {
+            StreamKeys.STATUS.value: status.HTTP_422_UNPROCESSABLE_ENTITY,
+            StreamKeys.DETAIL.value: exc.errors(),
+        }
+    except HTTPException as exc:
+        error = http_error(exc)
+    except Exception as exc:  # pylint: disable=broad-except
+        # keep the connection and the other messages in flight alive
+        print(f"Stream message failed: {exc!r}")
+        error = {
+            StreamKeys.STATUS.value: status.HTTP_500_INTERNAL_SERVER_ERROR,
+            StreamKeys.DETAIL.value: ExceptionMessages.STREAM_MESSAGE_FAILED.value,
+        }
+    return {StreamKeys.ID.value: message_id(raw), StreamKeys.ERROR.value: error}
+
+
+async def serve_stream(
+    websocket: WebSocket,
+    process: Callable[[dict], dict],
+    username: str | None = None,
+    max_in_flight: int = STREAM_MAX_IN_FLIGHT,
+    admit: Callable[[], AsyncContextManager] = nullcontext,
+):
+    """Process the messages of an accepted connection until the client disconnects
+
+    Up to max_in_flight messages are processed concurrently and answered as they complete,
+    responses carry the id of their message. Once the limit is reached no further message is
+    read until a response has been sent, so a client sending faster than it is served, or not
+    reading its responses, is slowed down by the transport instead of growing server memory.
+    Each message is processed within admit, which may wait for capacity or reject the message
+    with an HTTPException.
+    """
+    slots = asyncio.Semaphore(max_in_flight)
+    send_lock = asyncio.Lock()
+    tasks = set()
+    address = websocket.client.host if websocket.client is not None else None
+
+    async def respond(raw: str):
+        try:
+            try:
+                async with admit():
+                    response = await run_in_threadpool(
+                        handle_message, raw, process, address, username
+                    )
+            except HTTPException as exc:
+                response = {
+                    StreamKeys.ID.value: message_id(raw),
+                    StreamKeys.ERROR.value: http_error(exc),
+                }
+            async with send_lock:
+                await websocket.send_text(json.dumps(response))
+        finally:
+            slots.release()
+
+    try:
+        while True:
+            await slots.acquire()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            raw = message.get("text")
+            if raw is None:
+                raw = (message.get("bytes") or b"").decode("utf-8", errors="replace")
+            task = asyncio.create_task(respond(raw))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        # let the responses of messages received before a clean close go out
+        await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -1,15 +1,16 @@
 """Collect anonymous statistics"""
 
 # Standard library imports
+import atexit
 import os
+import threading
+import time
 import uuid
+from collections import deque
 from urllib.parse import urlencode
 
-# Third party imports
-import requests
-import yaml
-
 # Local imports
+from config import get_config, reload_config
 from constants import (
     API_VERSION_KEY,
     APP_NAME,
@@ -19,10 +20,21 @@ from constants import (
     FILE_PATH_LIST,
     SYSTEM_FILE_NAME,
     TELEMETRY_APP_KEY,
+    TELEMETRY_TIMEOUT,
+    TELEMETRY_URL_KEY,
+    USAGE_DEFAULT_FLUSH_INTERVAL,
+    USAGE_DEFAULT_MAX_PENDING,
+    USAGE_FLUSH_INTERVAL_KEY,
+    USAGE_MAX_PENDING_KEY,
+    USAGE_TELEMETRY_ENABLED_KEY,
     UUID_KEY,
+    UsageKeys,
 )
 
 _TELEMETRY_INSTANCE = None
+_USAGE_REPORTER = None
+TELEMETRY_URL = os.getenv(TELEMETRY_URL_KEY, BASE_TELEMETRY_URL)
+USAGE_TELEMETRY_ENABLED = os.getenv(USAGE_TELEMETRY_ENABLED_KEY, "false").lower() == "true"
 
 
 class _Telemetry:
@@ -52,11 +64,14 @@ class _Telemetry:
 
     def report_basic_telemetry(self):
         """Compile and report usage telemetry information"""
+        # imported here as requests takes longer to import than the rest of the service
+        import requests  # pylint: disable=import-outside-toplevel
+
         data_points = self.collect_telemetry()
         telemetry_url = create_telemetry_url(data_points)
         # send telemetry to url
         try:
-            response = requests.get(telemetry_url, timeout=3)
+            response = requests.get(telemetry_url, timeout=TELEMETRY_TIMEOUT)
 
             if response.status_code == 200:
                 print("Sent telemetry successfully")
@@ -65,6 +80,126 @@ class _Telemetry:
                 print(f"Request failed with status code {response.status_code}")
         except requests.exceptions.Timeout:
             print("Telemetry request timed out")
+        except requests.exceptions.RequestException as e:
+            # telemetry must never prevent the service from starting, e.g. when offline
+            print(f"Telemetry request failed: {e}")
+
+    def report_basic_telemetry_in_background(self) -> threading.Thread:
+        """Report from a daemon thread, startup waits neither for the network nor requests"""
+        thread = threading.Thread(
+            target=self.report_basic_telemetry, name="basic-telemetry", daemon=True
+        )
+        thread.start()
+        return thread
+
+
+class UsageReporter:
+    """Per process usage counters, aggregated and sent from a background thread
+
+    Request threads only append to a bounded deque, which is atomic and takes no lock. Every
+    interval the thread drains it into one report per route and posts it over a reused
+    connection. When the thread falls behind the oldest counts are discarded, and a report that
+    cannot be delivered is dropped rather than retried.
+    """
+
+    def __init__(self, base_data: dict, url: str, interval: float, max_pending: int):
+        self.base_data = base_data
+        self.url = url
+        self.interval = interval
+        self.pending = deque(maxlen=max_pending)  # (route, texts, entities) per request
+        self.pid = None  # process the flush thread runs in, it does not survive a fork
+        self.start_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.session = None
+        self.last_flush = time.monotonic()
+
+    def record(self, route: str, texts: int = 1, entities: int = 0):
+        """Count a request, starting the flush thread on first use in this process"""
+        if self.pid != os.getpid():
+            self.start()
+        self.pending.append((route, texts, entities))
+
+    def start(self):
+        """Start the flush thread of the current process"""
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            # counts inherited from the parent process are reported by the parent
+            self.pending.clear()
+            # imported here as requests is only needed once usage is recorded
+            import requests  # pylint: disable=import-outside-toplevel
+
+            self.pid = os.getpid()
+            self.stopped = threading.Event()
+            self.session = requests.Session()
+            self.last_flush = time.monotonic()
+            threading.Thread(target=self.run, name="usage-telemetry", daemon=True).start()
+            atexit.register(self.stop)
+
+    def run(self):
+        """Flush every interval until stopped"""
+        while not self.stopped.wait(self.interval):
+            self.flush()
+
+    def stop(self):
+        """Stop the flush thread and send what is left"""
+        self.stopped.set()
+        self.flush()
+
+    def aggregate(self) -> dict:
+        """Drain the pending counts into totals per route"""
+        routes = {}
+        for _ in range(len(self.pending)):
+            try:
+                route, texts, entities = self.pending.popleft()
+            except IndexError:
+                break
+            totals = routes.setdefault(
+                route,
+                {
+                    UsageKeys.REQUESTS.value: 0,
+                    UsageKeys.TEXTS.value: 0,
+                    UsageKeys.ENTITIES.value: 0,
+                },
+            )
+            totals[UsageKeys.REQUESTS.value] += 1
+            totals[UsageKeys.TEXTS.value] += texts
+            totals[UsageKeys.ENTITIES.value] += entities
+        return routes
+
+    def flush(self) -> bool:
+        """Send one aggregated report, True when it was delivered"""
+        import requests  # pylint: disable=import-outside-toplevel
+
+        now = time.monotonic()
+        routes = self.aggregate()
+        if not routes or self.session is None:
+            return False
+        report = dict(self.base_data)
+        report[UsageKeys.ROUTES.value] = routes
+        report[UsageKeys.INTERVAL.value] = round(now - self.last_flush, 3)
+        self.last_flush = now
+        try:
+            response = self.session.post(self.url, json=report, timeout=TELEMETRY_TIMEOUT)
+            return response.status_code == 200
+        except requests.exceptions.RequestException as e:
+            print(f"Usage telemetry dropped: {e}")
+            return False
+
+
+def get_usage_reporter() -> UsageReporter | None:
+    """Provide access to the UsageReporter singleton, None when usage telemetry is disabled"""
+    global _USAGE_REPORTER
+    if _USAGE_REPORTER is None and USAGE_TELEMETRY_ENABLED:
+        data = get_telemetry_instance().collect_telemetry()
+        data[UUID_KEY] = str(data[UUID_KEY])
+        _USAGE_REPORTER = UsageReporter(
+            data,
+            TELEMETRY_URL,
+            float(os.getenv(USAGE_FLUSH_INTERVAL_KEY, str(USAGE_DEFAULT_FLUSH_INTERVAL))),
+            int(os.getenv(USAGE_MAX_PENDING_KEY, str(USAGE_DEFAULT_MAX_PENDING))),
+        )
+    return _USAGE_REPORTER
 
 
 def get_telemetry_instance() -> _Telemetry:
@@ -76,21 +211,23 @@ def get_telemetry_instance() -> _Telemetry:
 
 
 def load_uuid() -> uuid.UUID:
-    """read uuid from datafog config files"""
-    for config_dict, filename in config_generator(False):
-        try:
-            uid = uuid.UUID(config_dict[UUID_KEY])
-            return uid
-        except KeyError:
-            print(f"No UUID key in file '{filename}'")
-        except ValueError as ve:
-            print(f"Malformed UUID in file '{filename}', {ve}")
-
+    """read uuid from the cached configuration, which includes the datafog config files"""
+    value = get_config().get(UUID_KEY)
+    if value is None:
+        print("No UUID key in the configuration")
+        return None
+    try:
+        return uuid.UUID(str(value))
+    except ValueError as ve:
+        print(f"Malformed UUID in the configuration, {ve}")
     return None
 
 
 def persist_uuid(value):
     """Write newly generated uuid to highest allowed priority config file"""
+    # imported here as PyYAML is only needed when the uuid is first generated
+    import yaml  # pylint: disable=import-outside-toplevel
+
     new_data = {UUID_KEY : value}
     for config_dict, filename in config_generator(True):
         # Update the data with the new key-value pair
@@ -100,8 +237,9 @@ def persist_uuid(value):
         try:
             with open(filename, "w", encoding=CONFIG_ENCODING) as file:
                 yaml.safe_dump(config_dict, file, default_flow_style=False)
-            # Successfully wrote UUID to file, log and return
+            # Successfully wrote UUID to file, log, refresh the cached configuration and return
             print(f"Updated YAML data written to {filename}")
+            reload_config()
             return
         except (IOError, OSError) as e:
             print(f"Error writing to file '{filename}': {e}")
@@ -110,13 +248,16 @@ def persist_uuid(value):
 def create_telemetry_url(parameters: dict) -> str:
     """Compose telemetry url including query parameters"""
     if not parameters:
-        return BASE_TELEMETRY_URL
+        return TELEMETRY_URL
     query_params_string = urlencode(parameters)
-    return f"{BASE_TELEMETRY_URL}?{query_params_string}"
+    return f"{TELEMETRY_URL}?{query_params_string}"
 
 
 def load_system_yaml(filepath: str, create_new: bool) -> dict:
     """Load system configuration from path, optionally create new file at path"""
+    # imported here as PyYAML is only needed when a system file is read or created
+    import yaml  # pylint: disable=import-outside-toplevel
+
     if os.path.exists(filepath):
         try:
             # Open existing file to update
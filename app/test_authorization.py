@@ -1,7 +1,7 @@
 """Unit tests for authorization.py"""
 
 # Standard library imports
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import pytest
 
@@ -16,7 +16,9 @@ from authorization import (
     is_valid_basic_request,
     is_valid_request,
     load_valid_credentials,
+    read_basic_credentials,
 )
+from config import ConfigSnapshot
 from constants import PASSWORD_KEY, USER_KEY, AuthTypes, ExceptionMessages
 
 TEST_USER = "jsmith"
@@ -42,7 +44,7 @@ def test_get_authorization_granted(mock_is_valid_request):
     # Define the mock return
     mock_is_valid_request.return_value = True
 
-    result = get_authorization(None)
+    result = get_authorization(MagicMock(), None, 1.0)
 
     assert result == AuthTypes.HTTP_BASIC
     mock_is_valid_request.assert_called_once()
@@ -52,7 +54,7 @@ def test_get_authorization_granted(mock_is_valid_request):
 @patch("authorization.AUTH_ENABLED", False)
 @patch("authorization.ACTIVE_AUTH_TYPE", AuthTypes.NO_AUTH)
 def test_get_authorization_no_auth(mock_is_valid_request):
-    result = get_authorization(None)
+    result = get_authorization(MagicMock(), None, 1.0)
 
     assert result == AuthTypes.NO_AUTH
     mock_is_valid_request.assert_not_called()
@@ -66,7 +68,7 @@ def test_get_authorization_rejected(mock_is_valid_request):
     mock_is_valid_request.return_value = False
 
     with pytest.raises(HTTPException) as exc_info:
-        get_authorization(None)
+        get_authorization(MagicMock(), None, 1.0)
 
     assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
     assert exc_info.value.detail == ExceptionMessages.UNAUTHORIZED.value
@@ -182,15 +184,20 @@ def test_is_valid_basic_request_false_both(mock_load_valid_credentials):
     mock_load_valid_credentials.assert_called_once()
 
 
-@patch.dict("os.environ", {USER_KEY: "test_user", PASSWORD_KEY: "test_pass"})
-def test_load_valid_credentials_success():
+@patch(
+    "authorization.get_config",
+    return_value=ConfigSnapshot({USER_KEY: "test_user", PASSWORD_KEY: "test_pass"}, {}),
+)
+def test_load_valid_credentials_success(_):
     result = load_valid_credentials()
     assert result[0] == "test_user".encode("utf8")
     assert result[1] == "test_pass".encode("utf8")
 
 
-@patch.dict("os.environ", {PASSWORD_KEY: "test_pass"}, clear=True)
-def test_load_valid_credentials_no_user():
+@patch(
+    "authorization.get_config", return_value=ConfigSnapshot({PASSWORD_KEY: "test_pass"}, {})
+)
+def test_load_valid_credentials_no_user(_):
     with pytest.raises(HTTPException) as exc_info:
         load_valid_credentials()
 
@@ -198,10 +205,19 @@ def test_load_valid_credentials_no_user():
     assert exc_info.value.detail == ExceptionMessages.AUTH_USER_KEY.value
 
 
-@patch.dict("os.environ", {USER_KEY: "test_user"}, clear=True)
-def test_load_valid_credentials_no_password():
+@patch("authorization.get_config", return_value=ConfigSnapshot({USER_KEY: "test_user"}, {}))
+def test_load_valid_credentials_no_password(_):
     with pytest.raises(HTTPException) as exc_info:
         load_valid_credentials()
 
     assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
     assert exc_info.value.detail == ExceptionMessages.AUTH_USER_KEY.value
+
+
+def test_read_basic_credentials():
+    credentials = read_basic_credentials("Basic anNtaXRoOjEyMzQ=")
+    assert credentials == HTTPBasicCredentials(username=TEST_USER, password=TEST_PASSWORD)
+    assert read_basic_credentials(None) is None
+    assert read_basic_credentials("Bearer anNtaXRoOjEyMzQ=") is None
+    assert read_basic_credentials("Basic not-base64!") is None
+    assert read_basic_credentials("Basic anNtaXRo") is None, "no password separator"
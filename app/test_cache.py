@@ -0,0 +1,30 @@
+"""Unit tests for cache.py"""
+
+# Local imports
+from cache import LRUCache, content_key
+
+
+def test_content_key():
+    assert content_key("a") == content_key("a")
+    assert content_key("a") != content_key("b")
+    assert len(content_key("a")) == 16
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put(content_key("a"), 1)
+    cache.put(content_key("b"), 2)
+    assert cache.get(content_key("a")) == 1
+    cache.put(content_key("c"), 3)
+    assert cache.get(content_key("b")) is None, "least recently used entry must be evicted"
+    assert cache.get(content_key("a")) == 1
+
+
+def test_lru_cache_hit_rate():
+    cache = LRUCache(2)
+    assert cache.hit_rate() == 0.0
+    cache.put("a", 1)
+    cache.get("a")
+    cache.get("b")
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.hit_rate() == 0.5
@@ -0,0 +1,287 @@
+"""Unit tests for cli.py"""
+
+# Standard library imports
+import json
+from unittest.mock import patch
+
+import pytest
+
+# Local imports
+from cli import main, parse_record, process_batch, scan, scan_options, split_batches
+from constants import (
+    SALT_MIN_LENGTH,
+    SCAN_DEFAULT_TEXT_FIELD,
+    TEXT_MAX_LENGTH,
+    ScanFormats,
+    ScanModes,
+)
+
+TEST_TEXT = "Peter Parker lives in NYC"
+TEST_RESULT = {"LOC": ["NYC"], "PER": ["Peter Parker"]}
+
+
+class FakePipeline:
+    """Stand in for the datafog pipeline that records the texts it was called with"""
+
+    def __init__(self):
+        self.calls = []
+
+    def run_text_pipeline_sync(self, texts):
+        self.calls.append(texts)
+        return {text: TEST_RESULT for text in texts}
+
+
+def write_lines(path, lines):
+    path.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+    return str(path)
+
+
+def read_output(path):
+    with open(path, "r", encoding="utf-8") as file:
+        return [json.loads(line) for line in file]
+
+
+def test_split_batches():
+    data = b"a\nb\nc\nd\ne"
+    result = list(split_batches(data, 2))
+    assert result == [(0, 4, 0), (4, 8, 2), (8, 9, 4)], "batches split incorrectly"
+
+
+def test_split_batches_resume_offset():
+    data = b"a\nb\nc\n"
+    result = list(split_batches(data, 2, start=2, first_line=1))
+    assert result == [(2, 6, 1)], "batches split incorrectly from an offset"
+
+
+def test_parse_record_text():
+    assert parse_record(b"hello\r\n", ScanFormats.TEXT, "text") == "hello"
+
+
+def test_parse_record_jsonl():
+    raw = json.dumps({"body": TEST_TEXT}).encode()
+    assert parse_record(raw, ScanFormats.JSONL, "body") == TEST_TEXT
+
+
+def test_parse_record_jsonl_missing_field():
+    with pytest.raises(ValueError):
+        parse_record(b'{"other": 1}', ScanFormats.JSONL, "text")
+
+
+@patch("cli._WORKER_STATE", new_callable=dict)
+def test_process_batch_deduplicates_texts(mock_state):
+    pipeline = FakePipeline()
+    mock_state.update(
+        {
+            "pipeline": pipeline,
+            "map": f"{TEST_TEXT}\n\n{TEST_TEXT}\n".encode(),
+            "mode": ScanModes.ANNOTATE,
+            "salt": None,
+            "text_field": "text",
+            "format": ScanFormats.TEXT,
+            "max_length": 1000,
+        }
+    )
+    end, next_line, lines = process_batch((0, len(mock_state["map"]), 5))
+
+    assert end == len(mock_state["map"])
+    assert next_line == 8, "empty lines must still be counted"
+    assert pipeline.calls == [[TEST_TEXT]], "duplicate texts should be processed once"
+    assert [json.loads(line)["line"] for line in lines] == [5, 7]
+
+
+class FailingPipeline(FakePipeline):
+    """Pipeline failing on any batch holding the text 'bad'"""
+
+    def run_text_pipeline_sync(self, texts):
+        if "bad" in texts:
+            raise RuntimeError("cannot process")
+        return super().run_text_pipeline_sync(texts)
+
+
+@patch("cli._WORKER_STATE", new_callable=dict)
+def test_process_batch_reports_bad_records(mock_state):
+    pipeline = FailingPipeline()
+    mock_state.update(
+        {
+            "pipeline": pipeline,
+            "map": f"{TEST_TEXT}\n \t\nbad\n{'x' * 26}\n".encode(),
+            "mode": ScanModes.ANNOTATE,
+            "salt": None,
+            "text_field": "text",
+            "format": ScanFormats.TEXT,
+            "max_length": len(TEST_TEXT),
+        }
+    )
+    _, next_line, lines = process_batch((0, len(mock_state["map"]), 0))
+
+    records = [json.loads(line) for line in lines]
+    assert next_line == 4
+    assert [record["line"] for record in records] == [0, 2, 3], "blank lines are skipped"
+    assert records[0]["entities"][0]["text"] == "Peter Parker"
+    assert records[1]["error"] == "pipeline failed: cannot process"
+    assert records[2]["error"] == "record is longer than 25 characters"
+
+
+@patch("cli.create_pipeline")
+def test_scan_anonymize(mock_load, tmp_path):
+    mock_load.return_value = FakePipeline()
+    input_path = write_lines(tmp_path / "in.txt", [TEST_TEXT, TEST_TEXT])
+    output_path = str(tmp_path / "out.jsonl")
+
+    summary = scan(input_path, output_path, mode=ScanModes.ANONYMIZE, workers=1)
+
+    output = read_output(output_path)
+    assert summary["records"] == 2
+    assert output[0] == {
+        "line": 0,
+        "text": "[PER] lives in [LOC]",
+        "entities": [
+            {"text": "Peter Parker", "start": 0, "end": 12, "type": "PER"},
+            {"text": "NYC", "start": 22, "end": 25, "type": "LOC"},
+        ],
+    }
+
+
+@patch("cli.create_pipeline")
+def test_scan_jsonl_reports_bad_records(mock_load, tmp_path):
+    mock_load.return_value = FakePipeline()
+    input_path = write_lines(tmp_path / "in.jsonl", [json.dumps({"text": TEST_TEXT}), "{"])
+    output_path = str(tmp_path / "out.jsonl")
+
+    scan(input_path, output_path, fmt=ScanFormats.JSONL, workers=1)
+
+    output = read_output(output_path)
+    assert output[0]["entities"][0]["text"] == "Peter Parker"
+    assert output[1]["line"] == 1
+    assert "error" in output[1]
+
+
+@patch("cli.create_pipeline")
+def test_scan_resume_from_checkpoint(mock_load, tmp_path):
+    pipeline = FakePipeline()
+    mock_load.return_value = pipeline
+    lines = [f"{TEST_TEXT} {i}" for i in range(4)]
+    input_path = write_lines(tmp_path / "in.txt", lines)
+    output_path = tmp_path / "out.jsonl"
+    checkpoint_path = tmp_path / "scan.ckpt"
+    first_batch = len(lines[0]) + len(lines[1]) + 2
+    # simulate a crash after the first batch, leaving a partially written record behind
+    output_path.write_text('{"line": 0}\n{"line": 1}\n{"line": 2, "te', encoding="utf-8")
+    checkpoint = {
+        "input": input_path,
+        "input_offset": first_batch,
+        "output_offset": len('{"line": 0}\n{"line": 1}\n'),
+        "lines": 2,
+        "records": 2,
+        "options": scan_options(
+            ScanModes.ANNOTATE,
+            None,
+            ScanFormats.TEXT,
+            SCAN_DEFAULT_TEXT_FIELD,
+            TEXT_MAX_LENGTH,
+        ),
+    }
+    checkpoint_path.write_text(json.dumps(checkpoint), encoding="utf-8")
+
+    summary = scan(
+        input_path,
+        str(output_path),
+        batch_size=2,
+        workers=1,
+        checkpoint_path=str(checkpoint_path),
+    )
+
+    output = read_output(output_path)
+    assert summary["records"] == 2, "only the remaining records should be processed"
+    assert [record["line"] for record in output] == [0, 1, 2, 3]
+    assert pipeline.calls == [lines[2:]]
+    assert json.loads(checkpoint_path.read_text(encoding="utf-8"))["records"] == 4
+
+
+def test_scan_checkpoint_for_other_input(tmp_path):
+    input_path = write_lines(tmp_path / "in.txt", [TEST_TEXT])
+    checkpoint_path = tmp_path / "scan.ckpt"
+    checkpoint_path.write_text(json.dumps({"input": "/other/file"}), encoding="utf-8")
+    with pytest.raises(ValueError):
+        scan(input_path, str(tmp_path / "out.jsonl"), checkpoint_path=str(checkpoint_path))
+
+
+@patch("cli.create_pipeline")
+def test_scan_checkpoint_with_other_options(mock_load, tmp_path):
+    mock_load.return_value = FakePipeline()
+    input_path = write_lines(tmp_path / "in.txt", [TEST_TEXT, TEST_TEXT])
+    output_path = str(tmp_path / "out.jsonl")
+    checkpoint_path = str(tmp_path / "scan.ckpt")
+    salt = "s" * SALT_MIN_LENGTH
+    scan(input_path, output_path, workers=1, checkpoint_path=checkpoint_path)
+    saved = json.loads(open(checkpoint_path, encoding="utf-8").read())
+    assert saved["options"]["mode"] == ScanModes.ANNOTATE.value
+
+    with pytest.raises(ValueError, match="mode, salt"):
+        scan(
+            input_path,
+            output_path,
+            mode=ScanModes.ENCODE,
+            salt=salt,
+            workers=1,
+            checkpoint_path=checkpoint_path,
+        )
+    with pytest.raises(ValueError, match="format"):
+        scan(
+            input_path,
+            output_path,
+            fmt=ScanFormats.JSONL,
+            workers=1,
+            checkpoint_path=checkpoint_path,
+        )
+    assert len(read_output(output_path)) == 2, "the output must be left untouched"
+
+
+@patch("cli.create_pipeline")
+def test_scan_checkpoint_keeps_salt_digest(mock_load, tmp_path):
+    mock_load.return_value = FakePipeline()
+    input_path = write_lines(tmp_path / "in.txt", [TEST_TEXT])
+    checkpoint_path = tmp_path / "scan.ckpt"
+    salt = "s" * SALT_MIN_LENGTH
+    scan(
+        input_path,
+        str(tmp_path / "out.jsonl"),
+        mode=ScanModes.ENCODE,
+        salt=salt,
+        workers=1,
+        checkpoint_path=str(checkpoint_path),
+    )
+    assert salt not in checkpoint_path.read_text(encoding="utf-8")
+
+    with pytest.raises(ValueError, match="salt"):
+        scan(
+            input_path,
+            str(tmp_path / "out.jsonl"),
+            mode=ScanModes.ENCODE,
+            salt="t" * SALT_MIN_LENGTH,
+            workers=1,
+            checkpoint_path=str(checkpoint_path),
+        )
+
+
+@patch("cli.create_pipeline")
+def test_main_rejects_checkpoint_with_other_options(mock_load, tmp_path, capsys):
+    mock_load.return_value = FakePipeline()
+    input_path = write_lines(tmp_path / "in.txt", [TEST_TEXT])
+    output_path = str(tmp_path / "out.jsonl")
+    checkpoint_path = str(tmp_path / "scan.ckpt")
+    args = ["scan", input_path, output_path, "--workers", "1", "--checkpoint", checkpoint_path]
+    assert main(args) == 0
+
+    with pytest.raises(SystemExit):
+        main(args + ["--mode", "anonymize"])
+    assert "different options: mode" in capsys.readouterr().err
+
+
+def test_main_encode_requires_salt(tmp_path):
+    with pytest.raises(SystemExit):
+        main(["scan", "in.txt", str(tmp_path / "out.jsonl"), "--mode", "encode"])
+    with pytest.raises(SystemExit):
+        main(
+            ["scan", "in.txt", str(tmp_path / "out.jsonl"), "--mode", "encode", "--salt", "x"]
+        )
@@ -0,0 +1,63 @@
+"""Unit tests for coalescing.py"""
+
+# Standard library imports
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+# Local imports
+from coalescing import SingleFlight, request_key
+from metrics import render_metrics
+
+
+def test_request_key():
+    assert request_key("text", "EN") == request_key("text", "EN")
+    assert request_key("text", "EN") != request_key("text", "FR")
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow_call():
+        calls.append(1)
+        release.wait(5)
+        return {"text": {}}
+
+    with ThreadPoolExecutor(4) as executor:
+        futures = [executor.submit(flight.run, "key", slow_call) for _ in range(4)]
+        while flight.followers.value < 3:
+            threading.Event().wait(0.01)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert len(calls) == 1, "only the first caller must run the pipeline"
+    assert all(result is results[0] for result in results)
+    assert flight.rate() == 0.75
+    assert "datafog_coalescing_rate 0.75\n" in render_metrics()
+    assert flight.run("key", lambda: "new") == "new", "finished flights must not be reused"
+
+
+def test_single_flight_shares_errors():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def failing_call():
+        started.set()
+        release.wait(5)
+        raise ValueError("pipeline failed")
+
+    with ThreadPoolExecutor(2) as executor:
+        leader = executor.submit(flight.run, "key", failing_call)
+        started.wait(5)
+        follower = executor.submit(flight.run, "key", failing_call)
+        while flight.followers.value < 1:
+            threading.Event().wait(0.01)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(ValueError):
+                future.result()
+    assert not flight.flights
@@ -0,0 +1,200 @@
+"""Unit tests for compression.py"""
+
+# Standard library imports
+import gzip
+import json
+import os
+from unittest.mock import patch
+
+import pytest
+
+# Third party imports
+from fastapi import Body, FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+# Local imports
+from compression import (
+    CompressionMiddleware,
+    GzipStream,
+    RouteCompression,
+    available_encodings,
+    decompress_body,
+    load_route_settings,
+    negotiate_encoding,
+)
+from constants import (
+    COMPRESSION_LEVEL_KEY,
+    COMPRESSION_MIN_SIZE_KEY,
+    COMPRESSION_ROUTES_KEY,
+    ContentEncodings,
+)
+
+LARGE_TEXT = "Peter Parker lives in New York. " * 100
+ALL_ENCODINGS = [ContentEncodings.ZSTD, ContentEncodings.BROTLI, ContentEncodings.GZIP]
+
+
+def create_test_client(**kwargs) -> TestClient:
+    """Build an app echoing its input, with a small and a streamed route"""
+    test_app = FastAPI()
+
+    @test_app.post("/api/echo")
+    def echo(text: str = Body(embed=True)):
+        return {"text": text}
+
+    @test_app.get("/api/stream")
+    def stream():
+        return StreamingResponse(
+            (LARGE_TEXT.encode() for _ in range(3)), media_type="text/plain"
+        )
+
+    kwargs.setdefault("default", RouteCompression(6, 100))
+    kwargs.setdefault("max_request_size", 10000)
+    test_app.add_middleware(CompressionMiddleware, **kwargs)
+    return TestClient(test_app)
+
+
+def test_negotiate_encoding_quality_values():
+    assert negotiate_encoding("gzip, br;q=0.5", ALL_ENCODINGS) == ContentEncodings.GZIP
+    assert negotiate_encoding("gzip, br", ALL_ENCODINGS) == ContentEncodings.BROTLI
+    assert negotiate_encoding("*", ALL_ENCODINGS) == ContentEncodings.ZSTD
+    assert negotiate_encoding("gzip;q=0, identity", ALL_ENCODINGS) is None
+    assert negotiate_encoding("", ALL_ENCODINGS) is None
+    assert negotiate_encoding("zstd", [ContentEncodings.GZIP]) is None
+
+
+def test_gzip_stream_chunks_are_decodable_incrementally():
+    stream = GzipStream(6)
+    data = stream.compress(b"hello ") + stream.compress(b"world") + stream.finish()
+    assert gzip.decompress(data) == b"hello world"
+
+
+@pytest.mark.parametrize("encoding", list(available_encodings()))
+def test_decompress_body_round_trip(encoding):
+    stream = available_encodings()[encoding](3)
+    data = stream.compress(LARGE_TEXT.encode()) + stream.finish()
+    assert decompress_body(encoding, data, 10**6) == LARGE_TEXT.encode()
+    with pytest.raises(OverflowError):
+        decompress_body(encoding, data, 100)
+
+
+@patch.dict(
+    "os.environ",
+    {
+        COMPRESSION_LEVEL_KEY: "4",
+        COMPRESSION_MIN_SIZE_KEY: "64",
+        COMPRESSION_ROUTES_KEY: json.dumps({"/api/echo": {"level": 9}}),
+    },
+)
+def test_load_route_settings():
+    default, routes = load_route_settings()
+    assert (default.level, default.min_size) == (4, 64)
+    assert (routes["/api/echo"].level, routes["/api/echo"].min_size) == (9, 64)
+
+
+@patch("builtins.print")
+@patch.dict("os.environ", {COMPRESSION_ROUTES_KEY: "not json"})
+def test_load_route_settings_invalid(mock_print):
+    _, routes = load_route_settings()
+    assert routes == {}
+    mock_print.assert_called_once()
+
+
+def test_response_compressed_above_threshold():
+    client = create_test_client()
+    response = client.post(
+        "/api/echo", json={"text": LARGE_TEXT}, headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.json() == {"text": LARGE_TEXT}, "client must transparently decode gzip"
+
+
+def test_response_below_threshold_not_compressed():
+    client = create_test_client()
+    response = client.post(
+        "/api/echo", json={"text": "hi"}, headers={"Accept-Encoding": "gzip"}
+    )
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding", "caches must not reuse it for all"
+
+
+def test_response_without_accepted_encoding_varies():
+    client = create_test_client()
+    response = client.post(
+        "/api/echo", json={"text": LARGE_TEXT}, headers={"Accept-Encoding": "identity"}
+    )
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+def test_response_route_threshold_override():
+    client = create_test_client(routes={"/api/echo": RouteCompression(1, 10**6)})
+    response = client.post(
+        "/api/echo", json={"text": LARGE_TEXT}, headers={"Accept-Encoding": "gzip"}
+    )
+    assert "content-encoding" not in response.headers
+
+
+def test_streamed_response_compressed_incrementally():
+    client = create_test_client()
+    response = client.get("/api/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text == LARGE_TEXT * 3
+
+
+def test_compressed_request_body():
+    client = create_test_client()
+    body = gzip.compress(json.dumps({"text": "hello"}).encode())
+    response = client.post(
+        "/api/echo",
+        content=body,
+        headers={"Content-Encoding": "gzip", "Content-Type": "application/json"},
+    )
+    assert response.status_code == 200
+    assert response.json() == {"text": "hello"}
+
+
+def test_compressed_request_body_too_large():
+    client = create_test_client(max_request_size=100)
+    body = gzip.compress(json.dumps({"text": LARGE_TEXT}).encode())
+    response = client.post(
+        "/api/echo",
+        content=body,
+        headers={"Content-Encoding": "gzip", "Content-Type": "application/json"},
+    )
+    assert response.status_code == 413
+    assert response.json()["detail"].startswith("Decompressed")
+
+
+def test_compressed_request_body_compressed_size_limited():
+    client = create_test_client(max_request_size=100)
+    body = os.urandom(200)  # rejected by its size before it is decompressed
+    response = client.post(
+        "/api/echo",
+        content=body,
+        headers={"Content-Encoding": "gzip", "Content-Type": "application/json"},
+    )
+    assert response.status_code == 413
+    assert response.json()["detail"].startswith("Compressed")
+
+
+def test_compressed_request_body_invalid():
+    client = create_test_client()
+    response = client.post(
+        "/api/echo",
+        content=b"not gzip",
+        headers={"Content-Encoding": "gzip", "Content-Type": "application/json"},
+    )
+    assert response.status_code == 400
+
+
+def test_compressed_request_body_unsupported():
+    client = create_test_client()
+    response = client.post(
+        "/api/echo",
+        content=b"{}",
+        headers={"Content-Encoding": "compress", "Content-Type": "application/json"},
+    )
+    assert response.status_code == 415
@@ -0,0 +1,73 @@
+"""Unit tests for config.py"""
+
+# Standard library imports
+import os
+from unittest.mock import patch
+
+import pytest
+
+# Local imports
+import config
+from constants import PASSWORD_KEY, USER_KEY
+
+
+@pytest.fixture(name="paths")
+def fixture_paths(tmp_path):
+    dotenv_path = str(tmp_path / ".env")
+    yaml_paths = (str(tmp_path / "high.yaml"), str(tmp_path / "low.yaml"))
+    with patch("config.DOTENV_PATH", dotenv_path), patch(
+        "config.YAML_PATHS", yaml_paths
+    ), patch("config.WATCHED_PATHS", (dotenv_path,) + yaml_paths), patch(
+        "config._DOTENV_EXPORTED", {USER_KEY: "exported"}
+    ), patch(
+        "config._SNAPSHOT", config.ConfigSnapshot({}, {})
+    ):
+        yield dotenv_path, yaml_paths
+
+
+def write(path: str, content: str, mtime_ns: int):
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(content)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_precedence(paths):
+    dotenv_path, (high, low) = paths
+    write(low, "A: low\nB: low\nC: low\n", 1)
+    write(high, "A: high\nB: high\n", 1)
+    write(dotenv_path, "A=dotenv\n", 1)
+    with patch.dict(os.environ, {"A": "env"}):
+        snapshot = config.reload_config()
+        assert snapshot.get("A") == "env"
+    assert snapshot.get("B") == "high", "earlier system files take precedence"
+    assert snapshot.get("C") == "low"
+    assert snapshot.get("missing", "default") == "default"
+    with pytest.raises(TypeError):
+        snapshot.values["A"] = "changed"
+
+
+def test_exported_dotenv_values_follow_the_file(paths):
+    dotenv_path = paths[0]
+    write(dotenv_path, f"{USER_KEY}=changed\n{PASSWORD_KEY}=secret\n", 1)
+    with patch.dict(os.environ, {USER_KEY: "exported"}):
+        snapshot = config.reload_config()
+    assert snapshot.get(USER_KEY) == "changed", "stale exported value must not win"
+    assert snapshot.get(PASSWORD_KEY) == "secret"
+
+
+@patch("builtins.print")
+def test_reload_if_changed(_, paths):
+    dotenv_path = paths[0]
+    write(dotenv_path, f"{PASSWORD_KEY}=first\n", 1)
+    first = config.reload_config()
+    assert not config.reload_if_changed(), "nothing changed"
+    assert config.get_config() is first
+
+    write(dotenv_path, f"{PASSWORD_KEY}=second\n", 2)
+    assert config.reload_if_changed()
+    assert config.get_config().get(PASSWORD_KEY) == "second"
+    assert first.get(PASSWORD_KEY) == "first", "snapshots in use are never modified"
+
+    os.remove(dotenv_path)
+    assert config.reload_if_changed()
+    assert config.get_config().get(PASSWORD_KEY) is None
@@ -0,0 +1,60 @@
+"""Unit tests for deadline.py"""
+
+# Standard library imports
+import threading
+from contextvars import ContextVar
+
+import pytest
+
+# Local imports
+from deadline import DeadlineRunner
+
+runner = DeadlineRunner(4)
+current_trace = ContextVar("current_trace", default=None)
+
+
+def test_no_deadline_runs_inline():
+    caller = threading.get_ident()
+    assert runner.run(threading.get_ident, lambda: None, None) == (caller, False)
+    assert runner.run(threading.get_ident, lambda: None, 0) == (caller, False)
+
+
+def test_deadline_met_and_missed():
+    release = threading.Event()
+    requests, exceeded = runner.requests.value, runner.exceeded.value
+    assert runner.run(lambda: "model", lambda: "fallback", 1000) == ("model", False)
+    assert runner.run(lambda: release.wait(5), lambda: "fallback", 10) == ("fallback", True)
+    release.set()
+    assert runner.requests.value - requests == 2
+    assert runner.exceeded.value - exceeded == 1
+    assert 0 < runner.hit_rate() <= 1
+
+
+def test_errors_propagate():
+    def broken():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        runner.run(broken, lambda: "fallback", 1000)
+
+
+def test_context_is_kept():
+    token = current_trace.set("trace")
+    try:
+        assert runner.run(current_trace.get, lambda: None, 1000) == ("trace", False)
+    finally:
+        current_trace.reset(token)
+
+
+def test_busy_workers_fall_back_at_once():
+    busy = DeadlineRunner(1)
+    release = threading.Event()
+    assert busy.run(lambda: release.wait(5), lambda: "fallback", 10) == ("fallback", True)
+    # the late run still holds the only worker, the next request does not wait for it
+    assert busy.run(lambda: "model", lambda: "fallback", 1000) == ("fallback", True)
+    assert busy.rejected.value >= 1
+    release.set()
+    # the worker is free again once the late run returns
+    assert busy.slots.acquire(timeout=5)
+    busy.slots.release()
+    assert busy.run(lambda: "model", lambda: "fallback", 1000) == ("model", False)
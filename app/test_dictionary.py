@@ -0,0 +1,133 @@
+"""Unit tests for dictionary.py"""
+
+# Standard library imports
+import os
+from unittest.mock import patch
+
+# Local imports
+import dictionary as dictionary_module
+from cache import LRUCache
+from constants import DICTIONARY_WATCH_INTERVAL_KEY, PipelineTypes
+from dictionary import (
+    DictionaryMatcher,
+    DictionaryPipeline,
+    create_dictionary_pipeline,
+    load_matcher,
+    read_terms,
+)
+from incremental import run_incremental
+from pipeline import PatternPipeline, create_pipeline
+from processor import format_pii_for_output
+
+
+def write(path, lines: list[str]) -> str:
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def test_read_terms(tmp_path, capsys):
+    path = write(
+        tmp_path / "terms.tsv", ["# employees", "Jane Doe\tPER", "", "Falcon\tPROJECT", "bad"]
+    )
+    assert read_terms(path) == {"Jane Doe": "PER", "Falcon": "PROJECT"}
+    assert "malformed" in capsys.readouterr().out
+    assert read_terms(str(tmp_path / "missing.tsv")) == {}
+
+
+def test_matcher_finds_whole_words_leftmost_longest():
+    matcher = DictionaryMatcher(
+        {"Jane": "PER", "Jane Doe": "PER", "Doe Corp": "ORG", "AC-1234": "ACCOUNT"}, set()
+    )
+    text = "Jane Doe Corp, Janet and account AC-1234 or AC-12345"
+    assert matcher.find(text) == [(0, "PER", "Jane Doe"), (33, "ACCOUNT", "AC-1234")]
+
+
+def test_matcher_skips_allowlisted_terms():
+    matcher = DictionaryMatcher({"Falcon": "PROJECT"}, {"Falcon"})
+    assert matcher.find("Falcon launch") == []
+    assert matcher.allowlist == {"Falcon"}
+
+
+def test_pipeline_merges_terms_in_text_order():
+    dictionary = DictionaryPipeline(PatternPipeline(), [], [])
+    dictionary.matcher = DictionaryMatcher(
+        {"Falcon": "PROJECT", "Jane Doe": "PER"}, {"Boston"}
+    )
+    text = "Jane Doe met Dr. John Smith about Falcon in Boston"
+    result = dictionary.run_text_pipeline_sync([text])[text]
+    assert result["PER"] == ["Jane Doe", "John Smith"]
+    assert result["PROJECT"] == ["Falcon"]
+    assert result["LOC"] == []
+    entities = format_pii_for_output({text: result})["entities"]
+    assert [(e["text"], e["start"]) for e in entities] == [
+        ("Jane Doe", 0),
+        ("John Smith", 17),
+        ("Falcon", 34),
+    ]
+
+
+def test_pipeline_prefers_longer_term_at_same_start():
+    dictionary = DictionaryPipeline(PatternPipeline(), [], [])
+    dictionary.matcher = DictionaryMatcher({"John Smith Jr": "PER"}, set())
+    text = "Dr. John Smith Jr was here"
+    assert dictionary.run_text_pipeline_sync([text])[text]["PER"] == ["John Smith Jr"]
+
+
+def test_reload_if_changed(tmp_path):
+    terms = write(tmp_path / "terms.tsv", ["Falcon\tPROJECT"])
+    allowlist = str(tmp_path / "allow.txt")
+    dictionary = DictionaryPipeline(PatternPipeline(), [terms], [allowlist])
+    assert dictionary.reload_if_changed() is False
+    write(tmp_path / "allow.txt", ["Falcon"])
+    assert dictionary.reload_if_changed() is True
+    assert dictionary.matcher.find("Falcon") == []
+    write(tmp_path / "terms.tsv", ["Falcon\tPROJECT", "Osprey\tPROJECT"])
+    os.utime(terms, ns=(0, 0))
+    assert dictionary.reload_if_changed() is True
+    assert dictionary.matcher.find("Osprey") == [(0, "PROJECT", "Osprey")]
+
+
+def test_load_matcher_later_files_override(tmp_path):
+    first = write(tmp_path / "a.tsv", ["Falcon\tPROJECT"])
+    second = write(tmp_path / "b.tsv", ["Falcon\tORG"])
+    assert load_matcher([first, second], []).find("Falcon") == [(0, "ORG", "Falcon")]
+
+
+def test_create_pipeline_with_dictionary():
+    with patch.dict("os.environ", {DICTIONARY_WATCH_INTERVAL_KEY: "0"}):
+        pipeline = create_pipeline(PipelineTypes.PATTERN, dictionary=True)
+    assert isinstance(pipeline, DictionaryPipeline)
+    assert isinstance(pipeline.pipeline, PatternPipeline)
+
+
+@patch("dictionary._WATCHER_STOPPED", None)
+@patch("dictionary._WATCHED", None)
+def test_only_the_current_dictionary_is_watched():
+    with patch.dict("os.environ", {DICTIONARY_WATCH_INTERVAL_KEY: "60"}), patch(
+        "os.register_at_fork"
+    ) as mock_register:
+        first = create_dictionary_pipeline(PatternPipeline())
+        first_stopped = dictionary_module._WATCHER_STOPPED
+        second = create_dictionary_pipeline(PatternPipeline())
+        assert first_stopped.is_set(), "the watcher of the replaced dictionary must stop"
+        assert dictionary_module._WATCHED is second and second is not first
+
+        # what the fork hook does in a child, which has no watcher thread yet
+        dictionary_module.start_watcher()
+    mock_register.assert_not_called()
+    assert dictionary_module._WATCHED is second
+    dictionary_module._WATCHER_STOPPED.set()
+
+
+def test_incremental_cache_follows_reloads(tmp_path):
+    terms = write(tmp_path / "terms.tsv", ["Falcon\tPROJECT"])
+    dictionary = DictionaryPipeline(PatternPipeline(), [terms], [])
+    cache = LRUCache(10)
+    text = "Falcon launch\n\nOsprey launch"
+    _, entities = run_incremental(dictionary, text, cache)
+    assert entities.texts == ["Falcon"]
+    write(tmp_path / "terms.tsv", ["Falcon\tPROJECT", "Osprey\tPROJECT"])
+    os.utime(terms, ns=(0, 0))
+    assert dictionary.reload_if_changed() is True
+    _, entities = run_incremental(dictionary, text, cache)
+    assert entities.texts == ["Falcon", "Osprey"], "cached paragraphs must see the new terms"
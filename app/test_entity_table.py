@@ -0,0 +1,93 @@
+"""Unit tests for entity_table.py"""
+
+# Local imports
+from constants import OverlapPolicies
+from entity_table import EntityTable
+from processor import (
+    add_byte_offsets,
+    anonymize_pii_for_output,
+    anonymize_pii_in_text,
+    encode_pii_for_output,
+    encode_pii_in_text,
+    format_pii_for_output,
+    get_entities_from_pii,
+)
+
+TEXT = "Zoë Ångström met Peter at Bank of New York Mellon Corp, Peter said 東京"
+PII = {
+    TEXT: {
+        "LOC": ["New York", "東京"],
+        "ORG": ["Bank of New York Mellon Corp"],
+        "PER": ["Zoë Ångström", "Peter", "Peter"],
+    }
+}
+
+
+def test_from_pii_matches_processor():
+    for policy in OverlapPolicies:
+        table = EntityTable.from_pii(PII, policy)
+        assert table.to_dicts() == get_entities_from_pii(PII, policy)
+    assert len(EntityTable.from_pii({"nothing here": {"PER": []}})) == 0
+
+
+def test_round_trip():
+    entities = get_entities_from_pii(PII)
+    table = EntityTable.from_entities(entities)
+    assert len(table) == len(entities)
+    assert table.types == ["PER", "ORG", "LOC"]
+    assert table.texts == ["Zoë Ångström", "Peter", "Bank of New York Mellon Corp", "東京"]
+    assert table.to_dicts() == entities
+
+
+def test_byte_offsets_match_processor():
+    entities = get_entities_from_pii(PII, OverlapPolicies.KEEP_NESTED)
+    table = EntityTable.from_entities(entities)
+    assert table.to_dicts(TEXT) == add_byte_offsets(entities, TEXT)
+
+
+def test_anonymize_and_encode_match_processor():
+    entities = get_entities_from_pii(PII, OverlapPolicies.KEEP_NESTED)
+    table = EntityTable.from_entities(entities)
+    assert list(table.outer_mask()) == [True, True, True, False, True, True]
+    assert table.anonymize(TEXT) == anonymize_pii_in_text(entities, TEXT)
+    assert table.encode(TEXT, "salt") == encode_pii_in_text(entities, TEXT, "salt")
+
+
+def test_take():
+    table = EntityTable(
+        [0, 5, 5], [3, 12, 9], [1, 0, 0], [1, 2, 0], ["A", "B"], ["x", "y", "z"]
+    )
+    taken = table.take(table.starts > 0)
+    assert taken.ends.tolist() == [12, 9]
+    assert [taken.texts[ref] for ref in taken.text_refs.tolist()] == ["z", "x"]
+    assert table.take([2, 0]).starts.tolist() == [5, 0]
+
+
+def test_concatenate_rebases_and_merges_lists():
+    first = EntityTable.from_entities(
+        get_entities_from_pii({"Mr. Joe Bloggs": {"PER": ["Joe"]}})
+    )
+    empty = EntityTable.from_entities([])
+    second = EntityTable.from_entities(
+        get_entities_from_pii({"in Paris, Joe": {"LOC": ["Paris"], "PER": ["Joe"]}})
+    )
+    table = EntityTable.concatenate([first, empty, second], [0, 20, 30])
+    assert table.types == ["PER", "LOC"]
+    assert table.texts == ["Joe", "Paris"]
+    assert [(e["text"], e["start"], e["type"]) for e in table.to_dicts()] == [
+        ("Joe", 4, "PER"),
+        ("Paris", 33, "LOC"),
+        ("Joe", 40, "PER"),
+    ]
+    assert len(EntityTable.concatenate([], [])) == 0
+
+
+def test_output_functions_accept_tables():
+    table = EntityTable.from_pii(PII)
+    assert format_pii_for_output(PII, table, byte_offsets=True) == format_pii_for_output(
+        PII, byte_offsets=True
+    )
+    assert anonymize_pii_for_output(PII, table, group=True) == anonymize_pii_for_output(
+        PII, group=True
+    )
+    assert encode_pii_for_output(PII, "salt", table) == encode_pii_for_output(PII, "salt")
@@ -8,12 +8,17 @@ from fastapi import status
 from fastapi.exceptions import RequestValidationError
 
 # Local imports
-from constants import ExceptionMessages
+from constants import (
+    VALID_INPUT_DESCRIPTION,
+    VALID_INPUT_PATTERN,
+    ExceptionMessages,
+    PresenceModes,
+)
 from custom_exceptions import LanguageValidationError
 from exception_handler import exception_processor
 
 REGEX_MSG = ExceptionMessages.INVALID_CHAR.value
-REGEX_PATTERN = "Extended ASCII"
+REGEX_PATTERN = VALID_INPUT_DESCRIPTION
 
 
 def test_exception_processor_status_code():
@@ -31,7 +36,7 @@ def test_exception_processor_regex_override():
                 "loc": ["body", "text"],
                 "type": "value_error.str.regex",
                 "msg": "test error",
-                "ctx": {"pattern": "^[\x00-\xFF]+$"},
+                "ctx": {"pattern": VALID_INPUT_PATTERN},
             }
         ]
     )
@@ -47,3 +52,18 @@ def test_exception_processor_non_regex_type_passthrough():
     result = exception_processor(None, exc)
     msg = json.loads(result.body)["detail"][0]["msg"]
     assert "test error message" == msg, "error message overriden incorrectly"
+
+
+def test_exception_processor_enum_context():
+    exc = RequestValidationError(
+        [
+            {
+                "loc": ("body", "mode"),
+                "type": "type_error.enum",
+                "msg": "value is not a valid enumeration member",
+                "ctx": {"enum_values": list(PresenceModes)},
+            }
+        ]
+    )
+    result = exception_processor(None, exc)
+    assert json.loads(result.body)["detail"][0]["ctx"]["enum_values"] == ["any", "count"]
@@ -0,0 +1,33 @@
+"""Unit tests for gunicorn.conf.py"""
+
+# Standard library imports
+import importlib.util
+import os
+from unittest.mock import MagicMock, patch
+
+CONF_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gunicorn.conf.py")
+
+
+def load_conf():
+    """Load the settings module, which is not importable by name"""
+    spec = importlib.util.spec_from_file_location("gunicorn_conf", CONF_PATH)
+    conf = importlib.util.module_from_spec(spec)
+    # the settings pin the thread pool sizes in the environment
+    with patch.dict("os.environ"):
+        spec.loader.exec_module(conf)
+    return conf
+
+
+@patch("gc.freeze")
+def test_pre_fork_creates_pipeline_in_master(mock_freeze):
+    conf = load_conf()
+    assert conf.preload_app is True
+    # the preloaded app, standing in for main which starts background work on import
+    app_module = MagicMock()
+    calls = []
+    app_module.get_pipeline.side_effect = lambda: calls.append("pipeline")
+    mock_freeze.side_effect = lambda: calls.append("freeze")
+
+    with patch.dict("sys.modules", {"main": app_module}):
+        conf.pre_fork(MagicMock(), MagicMock())
+    assert calls == ["pipeline", "freeze"], "the model must exist and be frozen before forking"
@@ -0,0 +1,108 @@
+"""Import time and heavy modules of the service modules, traced with python -X importtime
+
+How long imports take depends on the load of the machine, so the time budgets are generous and
+catch regressions like an eager model load. Which modules are imported does not, the module
+checks catch smaller regressions.
+"""
+
+# Standard library imports
+import os
+import subprocess
+import sys
+
+# Local imports
+from constants import (
+    CONFIG_WATCH_INTERVAL_KEY,
+    PIPELINE_KEY,
+    TELEMETRY_URL_KEY,
+    UUID_KEY,
+)
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# generous bounds in milliseconds, main and authorization are dominated by FastAPI
+IMPORT_BUDGETS_MS = {"processor": 150, "authorization": 1500, "main": 3000}
+HEAVY_MODULES = (
+    "fastapi",
+    "requests",
+    "yaml",
+    "dotenv",
+    "msgpack",
+    "numpy",
+    "spacy",
+    "datafog",
+)
+
+
+def run_python(*args: str, pipeline: str | None = "pattern") -> subprocess.CompletedProcess:
+    """Run a fresh interpreter in the app directory, by default with the pattern pipeline
+
+    With pipeline None the configured default pipeline, the datafog model, is used.
+    """
+    env = dict(os.environ)
+    env.pop(PIPELINE_KEY, None)
+    if pipeline is not None:
+        env[PIPELINE_KEY] = pipeline
+    env.update(
+        {
+            CONFIG_WATCH_INTERVAL_KEY: "0",
+            UUID_KEY: "00000000-0000-4000-8000-000000000000",
+            # the startup report fails fast instead of reaching the network
+            TELEMETRY_URL_KEY: "http://127.0.0.1:9/",
+        }
+    )
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=APP_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120,
+        check=True,
+    )
+
+
+def import_time_ms(module: str, pipeline: str | None = None) -> float:
+    """Cumulative import time of a module in a fresh interpreter, with the default pipeline"""
+    stderr = run_python("-X", "importtime", "-c", f"import {module}", pipeline=pipeline).stderr
+    for line in stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1000
+    raise AssertionError(f"no import time reported for {module}")
+
+
+def imported_modules(module: str, pipeline: str | None = "pattern") -> set[str]:
+    """Heavy modules loaded by importing a module in a fresh interpreter
+
+    Modules are taken from the import trace as well as from sys.modules after the import, so
+    modules imported and then removed from sys.modules are caught too.
+    """
+    code = f"import sys, {module}; print(' '.join(sorted(sys.modules)))"
+    process = run_python("-X", "importtime", "-c", code, pipeline=pipeline)
+    loaded = set(process.stdout.split())
+    for line in process.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3:
+            loaded.add(fields[2].strip())
+    return {name for name in HEAVY_MODULES if name in loaded}
+
+
+def test_import_time_budget():
+    for module, budget in IMPORT_BUDGETS_MS.items():
+        elapsed = import_time_ms(module)
+        assert elapsed < budget, f"importing {module} took {elapsed:.0f} ms"
+
+
+def test_processor_imports_no_heavy_modules():
+    assert imported_modules("processor") == set()
+
+
+def test_authorization_imports_no_heavy_modules_but_fastapi():
+    # the configuration files are parsed only when they exist
+    assert imported_modules("authorization") - {"yaml", "dotenv"} == {"fastapi"}
+
+
+def test_main_does_not_load_a_model():
+    # the default pipeline is the datafog model, created on first use and not on import
+    # requests is imported by the background startup report, which may run before exit
+    assert not imported_modules("main", pipeline=None) & {"numpy", "spacy", "datafog"}
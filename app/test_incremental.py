@@ -0,0 +1,60 @@
+"""Unit tests for incremental.py"""
+
+# Local imports
+from cache import LRUCache
+from incremental import run_incremental, split_paragraphs
+from pipeline import PatternPipeline
+from processor import anonymize_pii_for_output, get_entities_from_pii
+
+FIRST = "Mr. Peter Parker lives in Queens."
+SECOND = "He joined Daily Bugle Inc on January 5, 2024."
+DOCUMENT = f"{FIRST}\n\n{SECOND}"
+
+
+class CountingPipeline(PatternPipeline):
+    """Pattern pipeline recording the texts it was asked to annotate"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def run_text_pipeline_sync(self, str_list):
+        self.calls.append(list(str_list))
+        return super().run_text_pipeline_sync(str_list)
+
+
+def test_split_paragraphs_offsets():
+    text = "  first\n \n\nsecond\nline\n\n \n"
+    paragraphs = split_paragraphs(text)
+    assert [p for _, p in paragraphs] == ["  first", "second\nline"]
+    assert all(text[o : o + len(p)] == p for o, p in paragraphs), "offsets must match text"
+    assert split_paragraphs(" \n\n ") == []
+
+
+def test_run_incremental_matches_full_run():
+    pipeline = CountingPipeline()
+    result, entities = run_incremental(pipeline, DOCUMENT, LRUCache(10))
+    full = pipeline.run_text_pipeline_sync([DOCUMENT])
+    assert entities.to_dicts() == get_entities_from_pii(full), "rebased entities must match"
+    assert result == full
+
+
+def test_run_incremental_only_runs_changed_paragraphs():
+    pipeline = CountingPipeline()
+    cache = LRUCache(10)
+    run_incremental(pipeline, DOCUMENT, cache)
+    edited = f"{FIRST}\n\nMrs. Mary Jane from Brooklyn.\n\n{SECOND}"
+    _, entities = run_incremental(pipeline, edited, cache)
+    assert pipeline.calls == [[FIRST, SECOND], ["Mrs. Mary Jane from Brooklyn."]]
+    assert cache.hits == 2 and cache.misses == 3
+    moved = [e for e in entities.to_dicts() if e["text"] == "Daily Bugle Inc"][0]
+    assert edited[moved["start"] : moved["end"]] == "Daily Bugle Inc"
+
+
+def test_run_incremental_duplicate_paragraphs_run_once():
+    pipeline = CountingPipeline()
+    result, entities = run_incremental(pipeline, f"{FIRST}\n\n{FIRST}", LRUCache(10))
+    assert pipeline.calls == [[FIRST]]
+    assert [e["start"] for e in entities.to_dicts() if e["type"] == "PER"] == [4, 39]
+    output = anonymize_pii_for_output(result, entities)
+    assert output["text"] == "Mr. [PER] lives in [LOC].\n\nMr. [PER] lives in [LOC]."
@@ -3,9 +3,13 @@
 import pytest
 
 # Local imports
-from constants import SUPPORTED_LANGUAGES, ExceptionMessages
-from custom_exceptions import LanguageValidationError
-from input_validation import validate_language
+from constants import SUPPORTED_LANGUAGES, TEXT_MAX_LENGTH, ExceptionMessages
+from custom_exceptions import (
+    LanguageValidationError,
+    TextLengthValidationError,
+    TextPatternValidationError,
+)
+from input_validation import INCREMENTAL_MAX_LENGTH, validate_language, validate_text
 
 
 def test_validate_language_supported():
@@ -22,3 +26,23 @@ def test_validate_language_unsupported():
     with pytest.raises(LanguageValidationError) as excinfo:
         validate_language(lang)
     assert ExceptionMessages.UNSUPPORTED_LANG.value == str(excinfo.value)
+
+
+def test_validate_text_per_mode():
+    """test validate_text with the limits of normal and incremental requests"""
+    text = "x" * (TEXT_MAX_LENGTH + 1)
+    validate_text(text, True)
+    with pytest.raises(TextLengthValidationError) as excinfo:
+        validate_text(text, False)
+    assert excinfo.value.errors()[0]["ctx"] == {"limit_value": TEXT_MAX_LENGTH}
+    with pytest.raises(TextLengthValidationError):
+        validate_text("x" * (INCREMENTAL_MAX_LENGTH + 1), True)
+
+
+def test_validate_text_checks_length_before_pattern():
+    """test validate_text rejects oversized texts without scanning them"""
+    with pytest.raises(TextLengthValidationError):
+        validate_text("\ud800" * (TEXT_MAX_LENGTH + 1), False)
+    with pytest.raises(TextPatternValidationError) as excinfo:
+        validate_text("a\ud800b", False)
+    assert excinfo.value.errors()[0]["type"] == "value_error.str.regex"
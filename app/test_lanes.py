@@ -0,0 +1,180 @@
+"""Unit tests for lanes.py"""
+
+# Standard library imports
+import asyncio
+import base64
+import functools
+from unittest.mock import patch
+
+import pytest
+
+# Third party imports
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+
+# Local imports
+from constants import Lanes
+from lanes import Lane, LaneAdmission, LaneFullError, LaneMiddleware, LaneScheduler
+from streaming import serve_stream
+
+
+def create_scheduler(capacity: int = 1, bulk_concurrency: int = 1) -> LaneScheduler:
+    return LaneScheduler(
+        {
+            Lanes.INTERACTIVE: Lane(concurrency=capacity, queue_limit=10, weight=3),
+            Lanes.BULK: Lane(concurrency=bulk_concurrency, queue_limit=2, weight=1),
+        },
+        capacity,
+    )
+
+
+async def serve(scheduler: LaneScheduler, lane: Lanes, order: list):
+    await scheduler.acquire(lane)
+    order.append(lane.value[0])
+    await asyncio.sleep(0)
+    scheduler.release(lane)
+
+
+def test_weighted_fair_order():
+    async def scenario():
+        scheduler = create_scheduler()
+        order = []
+        await scheduler.acquire(Lanes.BULK)  # occupy the only slot so both lanes queue
+        tasks = [asyncio.create_task(serve(scheduler, Lanes.BULK, order)) for _ in range(2)]
+        tasks += [
+            asyncio.create_task(serve(scheduler, Lanes.INTERACTIVE, order)) for _ in range(6)
+        ]
+        await asyncio.sleep(0)
+        scheduler.release(Lanes.BULK)
+        await asyncio.gather(*tasks)
+        return order
+
+    order = asyncio.run(scenario())
+    # the slot held by bulk at the start was its share, ties go to interactive
+    assert order[:5] == list("iiiib"), "interactive should get three slots per bulk slot"
+    assert sorted(order) == ["b"] * 2 + ["i"] * 6
+
+
+def test_bulk_concurrency_leaves_room_for_interactive():
+    async def scenario():
+        scheduler = create_scheduler(capacity=2, bulk_concurrency=1)
+        await scheduler.acquire(Lanes.BULK)
+        queued = asyncio.create_task(scheduler.acquire(Lanes.BULK))
+        await asyncio.sleep(0)
+        # the second slot is not given to bulk, so interactive is admitted at once
+        await asyncio.wait_for(scheduler.acquire(Lanes.INTERACTIVE), 1)
+        assert not queued.done()
+        scheduler.release(Lanes.BULK)
+        await asyncio.wait_for(queued, 1)
+
+    asyncio.run(scenario())
+
+
+def test_queue_limit_and_cancellation():
+    async def scenario():
+        scheduler = create_scheduler()
+        await scheduler.acquire(Lanes.INTERACTIVE)
+        waiting = [asyncio.create_task(scheduler.acquire(Lanes.BULK)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(LaneFullError):
+            await scheduler.acquire(Lanes.BULK)
+        waiting[0].cancel()
+        await asyncio.gather(waiting[0], return_exceptions=True)
+        assert len(scheduler.lanes[Lanes.BULK].waiting) == 1
+        scheduler.release(Lanes.INTERACTIVE)
+        await asyncio.wait_for(waiting[1], 1)
+        assert scheduler.active == 1
+
+    asyncio.run(scenario())
+
+
+@patch.dict(
+    "os.environ",
+    {
+        "DATAFOG_LANES_ROUTES": '{"/api/bulk": "bulk"}',
+        "DATAFOG_LANES_CREDENTIALS": '{"backfill": "bulk", "oncall": "interactive"}',
+    },
+)
+def test_select_lane():
+    admission = LaneAdmission(create_scheduler())
+
+    def scope(path="/api/annotate", **headers):
+        raw = [
+            (name.replace("_", "-").encode(), value.encode())
+            for name, value in headers.items()
+        ]
+        return {"type": "http", "path": path, "headers": raw}
+
+    basic = "Basic " + base64.b64encode(b"backfill:secret").decode()
+    assert admission.select_lane(scope()) is Lanes.INTERACTIVE
+    assert admission.select_lane(scope("/api/bulk")) is Lanes.BULK
+    assert admission.select_lane(scope("/api/bulk", x_datafog_priority="interactive")) is (
+        Lanes.BULK
+    ), "the header must not raise the priority of a request"
+    assert admission.select_lane(scope(x_datafog_priority="Bulk")) is Lanes.BULK
+    assert (
+        admission.select_lane(scope(authorization=basic, x_datafog_priority="interactive"))
+        is Lanes.BULK
+    ), "credential assignment must not be overridden by the header"
+
+    oncall = "Basic " + base64.b64encode(b"oncall:guess").decode()
+    assert admission.select_lane(scope("/api/bulk", authorization=oncall)) is Lanes.BULK
+    with patch("lanes.AUTH_ENABLED", True), patch("lanes.is_valid_request", return_value=True):
+        assert admission.select_lane(scope("/api/bulk", authorization=oncall)) is (
+            Lanes.INTERACTIVE
+        ), "verified users keep their assigned lane"
+
+
+def test_middleware_rejects_when_full():
+    scheduler = LaneScheduler({lane: Lane(1, 0, 1) for lane in Lanes}, 1)
+    test_app = FastAPI()
+
+    @test_app.get("/api/busy")
+    async def busy():
+        return {"ok": True}
+
+    test_app.add_middleware(LaneMiddleware, admission=LaneAdmission(scheduler))
+    client = TestClient(test_app)
+    assert client.get("/api/busy").json() == {"ok": True}
+    assert scheduler.active == 0, "slot must be released"
+
+    scheduler.active = 1  # a request in progress, queues hold nothing
+    response = client.get("/api/busy")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+
+def test_stream_messages_take_lane_slots():
+    scheduler = LaneScheduler({lane: Lane(1, 0, 1) for lane in Lanes}, 1)
+    admission = LaneAdmission(scheduler)
+    test_app = FastAPI()
+    test_app.add_middleware(LaneMiddleware, admission=admission)
+    processed = []
+
+    def process(message: dict) -> dict:
+        processed.append(message["id"])
+        assert scheduler.lanes[Lanes.BULK].active == 1, "messages must hold a slot"
+        return {}
+
+    @test_app.websocket("/api/stream")
+    async def stream(websocket: WebSocket):
+        await websocket.accept()
+        admit = functools.partial(admission.slot, Lanes.BULK)
+        await serve_stream(websocket, process, admit=admit)
+
+    with TestClient(test_app).websocket_connect("/api/stream") as websocket:
+        websocket.send_json({"id": 1, "op": "annotate", "text": "hello"})
+        assert websocket.receive_json() == {"id": 1, "result": {}}
+        assert scheduler.active == 0, "slot must be released"
+
+        scheduler.active = 1  # a request in progress, queues hold nothing
+        websocket.send_json({"id": 2, "op": "annotate", "text": "hello"})
+        assert websocket.receive_json() == {
+            "id": 2,
+            "error": {
+                "status": 503,
+                "detail": "Too many queued requests, please retry later",
+                "retry_after": 1,
+            },
+        }
+    assert processed == [1], "a message to a full lane must not reach the pipeline"
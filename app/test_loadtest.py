@@ -0,0 +1,125 @@
+"""Unit tests for loadtest.py"""
+
+# Standard library imports
+import json
+import os
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Local imports
+from constants import TEXT_MAX_LENGTH
+from loadtest import (
+    LoadClient,
+    build_requests,
+    child_pids,
+    generate_text,
+    parse_mix,
+    percentile,
+    read_memory,
+    run_closed_loop,
+    run_fixed_rate,
+    summarize,
+)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Accept every POST with a fixed JSON body, rejecting texts containing 'fail'"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        status = 500 if b"fail" in body else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+@pytest.fixture(name="stub_server")
+def fixture_stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_generate_text_bounds_and_determinism():
+    first = [generate_text(random.Random(3), 50, 200, 10) for _ in range(5)]
+    second = [generate_text(random.Random(3), 50, 200, 10) for _ in range(5)]
+    assert first == second, "text generation must be reproducible from a seed"
+    long_text = generate_text(random.Random(1), 5000, 6000, 10)
+    assert len(long_text) <= TEXT_MAX_LENGTH, "texts must respect the API length limit"
+
+
+def test_parse_mix():
+    assert parse_mix("annotate=3,encode=1") == {"annotate": 0.75, "encode": 0.25}
+    with pytest.raises(ValueError):
+        parse_mix("unknown=1")
+    with pytest.raises(ValueError):
+        parse_mix("annotate=0")
+
+
+def test_build_requests():
+    requests = build_requests(50, {"encode": 1.0}, (10, 50), 20, seed=7)
+    assert requests == build_requests(50, {"encode": 1.0}, (10, 50), 20, seed=7)
+    name, path, body = requests[0]
+    assert name == "encode"
+    assert path == "/api/anonymize/reversible"
+    assert len(json.loads(body)["salt"]) >= 16, "salt must satisfy the API minimum length"
+
+
+def test_percentile():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile(values, 100) == 100.0
+    assert percentile([], 50) is None
+
+
+def test_summarize():
+    samples = [("annotate", 200, 0.010), ("annotate", 500, 0.020), ("encode", 200, 0.030)]
+    report = summarize(samples, 2.0)
+    assert report["requests"] == 3
+    assert report["throughput_rps"] == 1.0
+    assert report["error_rate"] == round(1 / 3, 4)
+    assert report["status_codes"] == {"200": 2, "500": 1}
+    assert report["latency_ms"]["max"] == 30.0
+    assert report["endpoints"]["annotate"]["errors"] == 1
+
+
+def test_run_closed_loop(stub_server):
+    client = LoadClient("127.0.0.1", stub_server.server_address[1])
+    requests = [("annotate", "/api/annotation/default", b'{"text": "ok"}')]
+    samples, elapsed = run_closed_loop(client, requests, concurrency=2, duration=0.2)
+    assert samples and elapsed >= 0.2
+    assert all(status == 200 for _, status, _ in samples)
+
+
+def test_run_fixed_rate(stub_server):
+    client = LoadClient("127.0.0.1", stub_server.server_address[1])
+    requests = [("annotate", "/", b'{"text": "ok"}'), ("annotate", "/", b'{"text": "fail"}')]
+    samples, _ = run_fixed_rate(client, requests, rps=50, duration=0.2, limit=4)
+    assert len(samples) == 10
+    assert sorted(status for _, status, _ in samples) == [200] * 5 + [500] * 5
+
+
+def test_load_client_connection_failure():
+    client = LoadClient("127.0.0.1", 1)
+    assert client.send("/", b"{}") == 0
+
+
+def test_read_memory_and_children():
+    memory = read_memory(os.getpid())
+    assert memory["rss_mb"] > 0
+    assert memory["peak_rss_mb"] >= memory["rss_mb"]
+    assert read_memory(-1) is None
+    assert os.getpid() in child_pids(os.getppid())
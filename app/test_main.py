@@ -0,0 +1,47 @@
+"""Unit tests for main.py"""
+
+# Standard library imports
+from unittest.mock import patch
+
+import pytest
+
+# Third party imports
+from fastapi.testclient import TestClient
+
+# Local imports
+from pipeline import PatternPipeline
+
+TEXT = "Ms Jane Doe moved to Paris on 2020-01-02 and Mr John Smith stayed"
+
+
+@pytest.fixture(name="app_module")
+def fixture_app_module():
+    # the startup report and the telemetry singleton are left to the telemetry tests
+    with patch("telemetry.get_telemetry_instance"):
+        import main  # pylint: disable=import-outside-toplevel
+
+    with patch("main.usage") as usage, patch("main._PIPELINE", PatternPipeline()):
+        yield main, usage
+
+
+def test_usage_recorded_per_route(app_module):
+    main, usage = app_module
+    client = TestClient(main.app)
+    client.post("/api/annotation/default", json={"text": TEXT})
+    client.post("/api/anonymize/reversible", json={"text": TEXT, "salt": "s" * 16})
+    response = client.post("/api/scan", json={"text": TEXT, "mode": "count"})
+    assert response.status_code == 200
+
+    routes = [call.args[0] for call in usage.record.call_args_list]
+    assert routes == ["/api/annotation/default", "/api/anonymize/reversible", "/api/scan"]
+    scan_entities = usage.record.call_args_list[-1].kwargs["entities"]
+    assert scan_entities == sum(response.json()["counts"].values()) > 0
+
+
+def test_stream_usage_recorded_under_stream_route(app_module):
+    main, usage = app_module
+    with TestClient(main.app).websocket_connect("/api/stream") as websocket:
+        websocket.send_json({"id": 1, "op": "anonymize", "text": TEXT})
+        assert "result" in websocket.receive_json()
+    usage.record.assert_called_once()
+    assert usage.record.call_args.args == ("/api/stream",)
@@ -0,0 +1,21 @@
+"""Unit tests for metrics.py"""
+
+# Local imports
+from metrics import Counter, register, render_metrics
+
+
+def test_render_gauge():
+    register("test_gauge", "A test gauge", lambda: 0.25)
+    output = render_metrics()
+    assert "# HELP datafog_test_gauge A test gauge\n" in output
+    assert "# TYPE datafog_test_gauge gauge\n" in output
+    assert "datafog_test_gauge 0.25\n" in output
+
+
+def test_counter():
+    counter = Counter("test_total", "A test counter")
+    counter.inc()
+    counter.inc(2)
+    output = render_metrics()
+    assert "# TYPE datafog_test_total counter\n" in output
+    assert "datafog_test_total 3\n" in output
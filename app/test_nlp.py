@@ -0,0 +1,75 @@
+"""Unit tests for nlp.py"""
+
+# Standard library imports
+from unittest.mock import patch
+
+# Third party imports
+import spacy
+
+# Local imports
+from constants import (
+    NLP_DEFAULT_EXCLUDE,
+    NLP_EXCLUDE_KEY,
+    NLP_LABELS_KEY,
+    NLP_MODEL_KEY,
+)
+from metrics import render_metrics
+from nlp import (
+    SpacyPipeline,
+    create_spacy_pipeline,
+    current_rss,
+    read_list,
+    report_pipeline,
+)
+
+
+def create_nlp():
+    """Blank English pipeline recognizing a few fixed entities"""
+    nlp = spacy.blank("en")
+    ruler = nlp.add_pipe("entity_ruler")
+    ruler.add_patterns(
+        [
+            {"label": "PER", "pattern": "Joe"},
+            {"label": "LOC", "pattern": "Boston"},
+            {"label": "GPE", "pattern": "Ohio"},
+        ]
+    )
+    return nlp
+
+
+def test_read_list():
+    with patch.dict("os.environ", {NLP_LABELS_KEY: " PER, LOC ,,"}):
+        assert read_list(NLP_LABELS_KEY, []) == ["PER", "LOC"]
+    with patch.dict("os.environ", {NLP_LABELS_KEY: ""}):
+        assert read_list(NLP_LABELS_KEY, ["PER"]) == []
+    assert read_list("DATAFOG_UNSET_TEST_KEY", ["PER"]) == ["PER"]
+
+
+def test_run_text_pipeline_sync():
+    pipeline = SpacyPipeline(create_nlp(), ["PER", "LOC"])
+    texts = ["Joe and Joe in Boston", "Ohio", "Joe and Joe in Boston"]
+    assert pipeline.run_text_pipeline_sync(texts) == {
+        "Joe and Joe in Boston": {"PER": ["Joe", "Joe"], "LOC": ["Boston"]},
+        "Ohio": {"PER": [], "LOC": []},
+    }, "unconfigured labels must be dropped"
+
+
+@patch("builtins.print")
+def test_report_pipeline(mock_print):
+    report = report_pipeline(create_nlp(), current_rss())
+    assert list(report["timings"]) == ["entity_ruler"]
+    assert mock_print.call_count == 2
+    assert "datafog_nlp_model_rss_bytes" in render_metrics()
+
+
+@patch("builtins.print")
+@patch("spacy.load")
+def test_create_spacy_pipeline(mock_load, _):
+    mock_load.return_value = create_nlp()
+    with patch.dict("os.environ", {NLP_MODEL_KEY: "custom_model", NLP_LABELS_KEY: "PER"}):
+        pipeline = create_spacy_pipeline()
+    mock_load.assert_called_once_with("custom_model", exclude=NLP_DEFAULT_EXCLUDE)
+    assert pipeline.labels == ["PER"]
+    with patch.dict("os.environ", {NLP_EXCLUDE_KEY: "parser"}):
+        create_spacy_pipeline()
+    assert mock_load.call_args.kwargs["exclude"] == ["parser"]
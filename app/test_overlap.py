@@ -0,0 +1,58 @@
+"""Unit tests for overlap.py"""
+
+# Standard library imports
+from unittest.mock import patch
+
+# Local imports
+from constants import OVERLAP_POLICY_KEY, TYPE_PRIORITY_KEY, OverlapPolicies
+from overlap import get_overlap_policy, get_type_priority, resolve_overlaps
+
+PRIORITY = {"PER": 0, "ORG": 1, "LOC": 2}
+
+
+def entity(start: int, end: int, pii_type: str) -> dict:
+    return {"text": "x" * (end - start), "start": start, "end": end, "type": pii_type}
+
+
+ORG = entity(10, 30, "ORG")
+LOC = entity(20, 26, "LOC")
+PER = entity(25, 40, "PER")
+DATE = entity(50, 55, "DATE_TIME")
+
+
+def test_resolve_overlaps_longest():
+    result = resolve_overlaps([DATE, LOC, PER, ORG], OverlapPolicies.LONGEST, PRIORITY)
+    assert result == [ORG, DATE], "the longest span must win and the output stay sorted"
+
+
+def test_resolve_overlaps_type_priority():
+    result = resolve_overlaps([DATE, LOC, PER, ORG], OverlapPolicies.TYPE_PRIORITY, PRIORITY)
+    assert result == [PER, DATE], "PER outranks ORG, unlisted types rank last but still fit"
+
+
+def test_resolve_overlaps_keep_nested():
+    result = resolve_overlaps([DATE, LOC, PER, ORG], OverlapPolicies.KEEP_NESTED, PRIORITY)
+    assert result == [ORG, LOC, DATE], "a span crossing the kept span must still be dropped"
+
+
+def test_resolve_overlaps_adjacent_spans_kept():
+    left, right = entity(0, 5, "PER"), entity(5, 9, "LOC")
+    assert resolve_overlaps([right, left], OverlapPolicies.LONGEST, PRIORITY) == [left, right]
+
+
+@patch.dict("os.environ", {OVERLAP_POLICY_KEY: "Keep_Nested", TYPE_PRIORITY_KEY: "LOC, PER"})
+def test_settings_from_env():
+    assert get_overlap_policy() == OverlapPolicies.KEEP_NESTED
+    assert get_type_priority() == {"LOC": 0, "PER": 1}
+
+
+@patch.dict("os.environ", {OVERLAP_POLICY_KEY: "unknown"})
+def test_overlap_policy_invalid():
+    assert get_overlap_policy() == OverlapPolicies.LONGEST
+
+
+def test_resolve_overlaps_many_spans():
+    # chains of spans each overlapping the next, one of every two is kept
+    entities = [entity(start, start + 2, "PER") for start in range(0, 2000)]
+    result = resolve_overlaps(entities, OverlapPolicies.LONGEST, PRIORITY)
+    assert [ent["start"] for ent in result] == list(range(0, 2000, 2))
@@ -0,0 +1,59 @@
+"""Unit tests for pipeline.py"""
+
+# Standard library imports
+from unittest.mock import patch
+
+# Local imports
+from constants import PII_ANNOTATION_LABELS, PIPELINE_KEY, PipelineTypes
+from pipeline import PatternPipeline, create_pipeline, get_pipeline_type
+from processor import anonymize_pii_for_output
+
+TEST_TEXT = "Mr. Peter Parker from Queens joined Daily Bugle Inc on January 5, 2024."
+
+
+def test_pattern_pipeline_result_structure():
+    result = PatternPipeline().run_text_pipeline_sync([TEST_TEXT, "nothing here"])
+    assert list(result) == [TEST_TEXT, "nothing here"]
+    assert list(result[TEST_TEXT]) == PII_ANNOTATION_LABELS, "labels must match DataFog"
+    assert all(not v for v in result["nothing here"].values())
+
+
+def test_pattern_pipeline_entities():
+    result = PatternPipeline().annotate(TEST_TEXT)
+    assert result["PER"] == ["Peter Parker"]
+    assert result["LOC"] == ["Queens"]
+    assert result["ORG"] == ["Daily Bugle Inc"]
+    assert result["DATE_TIME"] == ["January 5, 2024"]
+
+
+def test_pattern_pipeline_no_overlapping_types():
+    result = PatternPipeline().annotate("She met Dr. Stark Industries Corp staff")
+    assert result["PER"] == ["Stark Industries"]
+    assert result["ORG"] == [], "a span already claimed by a type must not be reused"
+
+
+def test_pattern_pipeline_works_with_processor():
+    result = PatternPipeline().run_text_pipeline_sync([TEST_TEXT])
+    output = anonymize_pii_for_output(result)
+    assert output["text"] == "Mr. [PER] from [LOC] joined [ORG] on [DATE_TIME]."
+
+
+@patch("time.sleep")
+def test_pattern_pipeline_delay(mock_sleep):
+    PatternPipeline(delay_ms=20).run_text_pipeline_sync(["a", "b"])
+    assert mock_sleep.call_count == 2
+    mock_sleep.assert_called_with(0.02)
+
+
+@patch.dict("os.environ", {PIPELINE_KEY: "Pattern"})
+def test_get_pipeline_type_from_env():
+    assert get_pipeline_type() == PipelineTypes.PATTERN
+
+
+@patch.dict("os.environ", {PIPELINE_KEY: "unknown"})
+def test_get_pipeline_type_invalid():
+    assert get_pipeline_type() == PipelineTypes.DATAFOG
+
+
+def test_create_pipeline_pattern():
+    assert isinstance(create_pipeline(PipelineTypes.PATTERN), PatternPipeline)
@@ -0,0 +1,67 @@
+"""Unit tests for presence.py"""
+
+# Standard library imports
+from unittest.mock import MagicMock
+
+# Local imports
+from constants import PresenceModes
+from pipeline import PatternPipeline
+from presence import sample_chunks, scan_text, split_chunks
+
+PII_SENTENCE = "Ms Jane Doe moved to Paris on 2020-01-02. "
+CLEAN_SENTENCE = "nothing to see in this sentence at all. "
+
+
+def counting_pipeline():
+    """Pattern pipeline recording the texts it is given"""
+    return MagicMock(wraps=PatternPipeline())
+
+
+def test_split_chunks_at_whitespace():
+    text = "alpha beta gamma delta"
+    chunks = split_chunks(text, 12)
+    assert chunks == ["alpha beta ", "gamma delta"]
+    assert "".join(split_chunks("x" * 25, 10)) == "x" * 25
+
+
+def test_sample_chunks_spread_evenly():
+    chunks = [str(i) for i in range(10)]
+    assert sample_chunks(chunks, 4) == ["0", "2", "5", "7"]
+    assert sample_chunks(chunks, 20) == chunks
+
+
+def test_scan_counts_per_type():
+    result = scan_text(PatternPipeline(), PII_SENTENCE * 3, PresenceModes.COUNT, 50)
+    assert result == {
+        "contains_pii": True,
+        "counts": {"DATE_TIME": 3, "PER": 3},
+        "coverage": 1.0,
+    }
+
+
+def test_scan_without_pii():
+    result = scan_text(PatternPipeline(), CLEAN_SENTENCE * 5, PresenceModes.ANY, 50)
+    assert result == {"contains_pii": False, "counts": {}, "coverage": 1.0}
+
+
+def test_scan_any_stops_at_first_detection():
+    pipeline = counting_pipeline()
+    text = CLEAN_SENTENCE * 2 + PII_SENTENCE + CLEAN_SENTENCE * 50
+    result = scan_text(pipeline, text, PresenceModes.ANY, 45)
+    assert result["contains_pii"] is True
+    assert result["coverage"] < 0.2
+    # batches of 1 and 2 chunks reach the third chunk
+    assert [len(call.args[0]) for call in pipeline.run_text_pipeline_sync.call_args_list] == [
+        1,
+        2,
+    ]
+
+
+def test_scan_samples_large_texts():
+    pipeline = counting_pipeline()
+    text = (PII_SENTENCE + CLEAN_SENTENCE) * 100
+    result = scan_text(pipeline, text, PresenceModes.COUNT, 90, 1000, 10)
+    (texts,), _ = pipeline.run_text_pipeline_sync.call_args
+    assert len(texts) == 10
+    assert result["coverage"] == 0.1
+    assert result["counts"] == {"DATE_TIME": 100, "PER": 100}
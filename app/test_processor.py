@@ -1,10 +1,13 @@
 """Unit tests for processor.py"""
 
+from constants import OverlapPolicies
 from processor import (
     anonymize_pii_for_output,
     encode_pii_for_output,
     find_pii_in_text,
     format_pii_for_output,
+    get_entities_from_pii,
+    group_entities,
 )
 
 
@@ -87,3 +90,86 @@ def test_encode_pii_for_output():
     assert (
         out["text"] == text
     ), "text anonymized incorrectly"
+
+
+def test_overlapping_entities_resolved():
+    text = "She works at Bank of New York Mellon Corp downtown"
+    data = {text: {"LOC": ["New York"], "ORG": ["Bank of New York Mellon Corp"]}}
+    out = anonymize_pii_for_output(data)
+    assert out["text"] == "She works at [ORG] downtown", "nested LOC must not break offsets"
+    assert [e["type"] for e in out["entities"]] == ["ORG"]
+
+
+def test_overlapping_entities_keep_nested():
+    text = "She works at Bank of New York Mellon Corp downtown"
+    data = {text: {"LOC": ["New York"], "ORG": ["Bank of New York Mellon Corp"]}}
+    entities = get_entities_from_pii(data, OverlapPolicies.KEEP_NESTED)
+    assert [e["type"] for e in entities] == ["ORG", "LOC"]
+    out = encode_pii_for_output(data, "salt", entities)
+    assert len(out["lookup_table"]) == 1, "only the outer entity is replaced"
+
+
+def test_entities_sharing_a_start():
+    data = {"New York Bank is big": {"LOC": ["New York"], "ORG": ["New York Bank"]}}
+    entities = get_entities_from_pii(data, OverlapPolicies.LONGEST)
+    assert [(e["type"], e["start"], e["end"]) for e in entities] == [("ORG", 0, 13)]
+    entities = get_entities_from_pii(data, OverlapPolicies.KEEP_NESTED)
+    assert [(e["type"], e["start"], e["end"]) for e in entities] == [
+        ("ORG", 0, 13),
+        ("LOC", 0, 8),
+    ]
+
+
+def test_entities_not_found_are_skipped():
+    data = {"Peter Parker lives in NYC": {"LOC": ["Gotham", "NYC"], "PER": ["Peter Parker"]}}
+    entities = get_entities_from_pii(data)
+    assert [e["text"] for e in entities] == ["Peter Parker", "NYC"]
+
+
+def test_byte_offsets():
+    text = "Zoë Ångström lives in 東京 with Peter"
+    data = {text: {"LOC": ["東京"], "PER": ["Zoë Ångström", "Peter"]}}
+    out = anonymize_pii_for_output(data, byte_offsets=True)
+    assert out["text"] == "[PER] lives in [LOC] with [PER]"
+    encoded = text.encode()
+    for ent in out["entities"]:
+        assert text[ent["start"] : ent["end"]] == ent["text"]
+        assert encoded[ent["start_byte"] : ent["end_byte"]].decode() == ent["text"]
+
+
+def test_byte_offsets_ascii():
+    data = {"Peter Parker lives in NYC": {"LOC": ["NYC"], "PER": ["Peter Parker"]}}
+    entities = format_pii_for_output(data, byte_offsets=True)["entities"]
+    assert [(e["start_byte"], e["end_byte"]) for e in entities] == [(0, 12), (22, 25)]
+    assert "start_byte" not in format_pii_for_output(data)["entities"][0]
+
+
+def test_grouped_output():
+    text = "Call Peter at home, Peter said Peter lives in NYC"
+    data = {text: {"LOC": ["NYC"], "PER": ["Peter", "Peter", "Peter"]}}
+    groups = format_pii_for_output(data, group=True)["entities"]
+    assert groups == [
+        {"text": "Peter", "type": "PER", "spans": [[5, 10], [20, 25], [31, 36]]},
+        {"text": "NYC", "type": "LOC", "spans": [[46, 49]]},
+    ]
+    out = anonymize_pii_for_output(data, byte_offsets=True, group=True)
+    assert out["text"] == "Call [PER] at home, [PER] said [PER] lives in [LOC]"
+    assert out["entities"][0]["byte_spans"] == out["entities"][0]["spans"]
+
+
+def test_group_entities_by_type_and_text():
+    text = "Apple bought Apple shares"
+    data = {text: {"ORG": ["Apple"], "PER": ["Apple"]}}
+    groups = group_entities(get_entities_from_pii(data))
+    assert [(key, len(occurrences)) for key, occurrences in groups.items()] == [
+        (("ORG", "Apple"), 1),
+        (("PER", "Apple"), 1),
+    ]
+
+
+def test_encode_hashes_repeated_values_alike():
+    data = {"Peter met Peter": {"PER": ["Peter", "Peter"]}}
+    out = encode_pii_for_output(data, "salt")
+    first, second = out["text"].split(" met ")
+    assert first == second
+    assert list(out["lookup_table"]) == [first[1:-1]]
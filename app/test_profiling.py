@@ -0,0 +1,110 @@
+"""Unit tests for profiling.py"""
+
+# Standard library imports
+import cProfile
+import os
+import pstats
+from unittest.mock import patch
+
+# Third party imports
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Local imports
+from constants import PROFILE_FILE_SUFFIX, PROFILE_HEADER
+from profiling import ProfilingMiddleware, profiled
+
+TEST_TOKEN = "debug-token"
+
+
+def slow_stage():
+    return sum(range(1000))
+
+
+def create_test_app(directory, **kwargs) -> TestClient:
+    """Build a small app using the middleware and a profiled sync endpoint"""
+    with patch("profiling.PROFILING_ENABLED", True):
+
+        @profiled
+        def endpoint():
+            return {"value": slow_stage()}
+
+    test_app = FastAPI()
+    test_app.add_middleware(ProfilingMiddleware, directory=str(directory), **kwargs)
+    test_app.get("/api/test")(endpoint)
+    return TestClient(test_app)
+
+
+def list_profiles(directory) -> list:
+    return sorted(p for p in os.listdir(directory) if p.endswith(PROFILE_FILE_SUFFIX))
+
+
+def test_profiled_disabled_returns_function():
+    def func():
+        return 1
+
+    with patch("profiling.PROFILING_ENABLED", False):
+        assert profiled(func) is func, "disabled profiling must not wrap the function"
+
+
+def test_profiled_without_active_request():
+    with patch("profiling.PROFILING_ENABLED", True):
+        wrapped = profiled(slow_stage)
+    assert wrapped() == slow_stage()
+
+
+def test_middleware_sampled_request_includes_threadpool(tmp_path):
+    client = create_test_app(tmp_path, sample_rate=1.0, max_files=5, token="")
+    response = client.get("/api/test")
+
+    assert response.status_code == 200
+    profiles = list_profiles(tmp_path)
+    assert len(profiles) == 1
+    assert "GET-api_test" in profiles[0]
+    stats = pstats.Stats(os.path.join(tmp_path, profiles[0]))
+    functions = {func[2] for func in stats.stats}
+    assert "slow_stage" in functions, "threadpool work missing from the profile"
+
+
+def test_middleware_not_sampled(tmp_path):
+    client = create_test_app(tmp_path, sample_rate=0.0, max_files=5, token="")
+    client.get("/api/test")
+    assert list_profiles(tmp_path) == [], "unsampled requests must not be profiled"
+
+
+def test_middleware_debug_header(tmp_path):
+    client = create_test_app(tmp_path, sample_rate=0.0, max_files=5, token=TEST_TOKEN)
+    client.get("/api/test", headers={PROFILE_HEADER: "wrong"})
+    assert list_profiles(tmp_path) == [], "an invalid token must not trigger profiling"
+
+    client.get("/api/test", headers={PROFILE_HEADER: TEST_TOKEN})
+    assert len(list_profiles(tmp_path)) == 1
+
+
+def test_middleware_one_request_at_a_time(tmp_path):
+    client = create_test_app(tmp_path, sample_rate=1.0, max_files=5, token="")
+    client.get("/api/test")
+    # the middleware stack is built by the first request
+    middleware = client.app.middleware_stack.app
+    assert middleware.busy is False
+    middleware.busy = True
+    assert client.get("/api/test").status_code == 200
+    assert len(list_profiles(tmp_path)) == 1, "a request must not be profiled while another is"
+
+
+def test_middleware_rotation(tmp_path):
+    client = create_test_app(tmp_path, sample_rate=1.0, max_files=2, token="")
+    for _ in range(4):
+        client.get("/api/test")
+    assert len(list_profiles(tmp_path)) == 2, "old profiles were not rotated out"
+
+
+@patch("builtins.print")
+def test_write_profile_os_error(mock_print, tmp_path):
+    middleware = ProfilingMiddleware(None, 1.0, str(tmp_path), 5, "")
+    profiler = cProfile.Profile()
+    profiler.runcall(slow_stage)
+    with patch("os.makedirs", side_effect=OSError("denied")):
+        result = middleware.write_profile({"path": "/", "method": "GET"}, [profiler])
+    assert result is None
+    mock_print.assert_called_once()
@@ -0,0 +1,108 @@
+"""Unit tests for ratelimit.py"""
+
+# Standard library imports
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+# Third party imports
+from fastapi import HTTPException, status
+from fastapi.security import HTTPBasicCredentials
+
+# Local imports
+from authorization import authorize_websocket, get_authorization
+from constants import AuthTypes, ExceptionMessages
+from ratelimit import RateLimiter, check_rate_limit, request_cost
+
+
+def make_request(body: bytes = b"", host: str = "10.0.0.1", headers: dict | None = None):
+    request = MagicMock()
+    request.body = AsyncMock(return_value=body)
+    request.headers = headers or {}
+    request.client.host = host
+    return request
+
+
+def test_rate_limiter_burst_and_refill():
+    limiter = RateLimiter(rate=2.0, burst=3.0, max_keys=10)
+    assert [limiter.acquire("a", 1, now=0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire("a", 1, now=0.0) == 0.5, "an empty bucket must report the wait"
+    assert limiter.acquire("a", 1, now=0.5) == 0.0, "tokens must refill at the rate"
+    assert limiter.acquire("b", 1, now=0.5) == 0.0, "keys must have independent buckets"
+
+
+def test_rate_limiter_cost_capped_at_burst():
+    limiter = RateLimiter(rate=1.0, burst=2.0, max_keys=10)
+    assert limiter.acquire("a", 50, now=0.0) == 0.0
+    assert limiter.acquire("a", 50, now=1.0) == 1.0
+
+
+def test_rate_limiter_evicts_least_recently_used():
+    limiter = RateLimiter(rate=1.0, burst=1.0, max_keys=2)
+    for key in ("a", "b", "c"):
+        limiter.acquire(key, 1, now=0.0)
+    assert list(limiter.buckets) == ["b", "c"]
+
+
+@patch("ratelimit.COST_BYTES", 1000)
+def test_request_cost():
+    assert asyncio.run(request_cost(make_request())) == 1.0
+    assert asyncio.run(request_cost(make_request(b"x" * 2500))) == 3.0
+    request = make_request(b"x" * 2500, headers={"content-length": "1"})
+    assert asyncio.run(request_cost(request)) == 3.0, "the cost must not trust Content-Length"
+
+
+def test_check_rate_limit_raises_429():
+    limiter = RateLimiter(rate=0.5, burst=1.0, max_keys=10)
+    check_rate_limit(limiter, "a", 1)
+    with pytest.raises(HTTPException) as exc_info:
+        check_rate_limit(limiter, "a", 1)
+    assert exc_info.value.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert exc_info.value.detail == ExceptionMessages.RATE_LIMITED.value
+    assert exc_info.value.headers["Retry-After"] == "2"
+    check_rate_limit(None, "a", 1)
+
+
+@patch("authorization.is_valid_request", return_value=True)
+@patch("authorization.AUTH_ENABLED", True)
+@patch("authorization.ACTIVE_AUTH_TYPE", AuthTypes.HTTP_BASIC)
+@patch("authorization.RATE_LIMIT_ENABLED", True)
+@patch("authorization.IP_LIMITER", RateLimiter(rate=1.0, burst=100.0, max_keys=10))
+@patch("authorization.CREDENTIAL_LIMITER", RateLimiter(rate=1.0, burst=2.0, max_keys=10))
+def test_get_authorization_limits_per_credential(_):
+    credentials = HTTPBasicCredentials(username="jsmith", password="1234")
+    other = HTTPBasicCredentials(username="other", password="1234")
+    request = make_request(b"x" * 10)
+    assert get_authorization(request, credentials, 1.0) == AuthTypes.HTTP_BASIC
+    assert get_authorization(request, credentials, 1.0) == AuthTypes.HTTP_BASIC
+    with pytest.raises(HTTPException) as exc_info:
+        get_authorization(request, credentials, 1.0)
+    assert exc_info.value.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert get_authorization(request, other, 1.0) == AuthTypes.HTTP_BASIC
+
+
+@patch("authorization.is_valid_request", return_value=False)
+@patch("authorization.AUTH_ENABLED", True)
+@patch("authorization.ACTIVE_AUTH_TYPE", AuthTypes.HTTP_BASIC)
+@patch("authorization.RATE_LIMIT_ENABLED", True)
+@patch("authorization.IP_LIMITER", RateLimiter(rate=1.0, burst=1.0, max_keys=10))
+def test_get_authorization_limits_per_address_before_auth(mock_is_valid_request):
+    with pytest.raises(HTTPException) as exc_info:
+        get_authorization(make_request(), None, 1.0)
+    assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
+    with pytest.raises(HTTPException) as exc_info:
+        get_authorization(make_request(), None, 1.0)
+    assert exc_info.value.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    mock_is_valid_request.assert_called_once()
+
+
+@patch("authorization.AUTH_ENABLED", False)
+@patch("authorization.RATE_LIMIT_ENABLED", True)
+@patch("authorization.IP_LIMITER", RateLimiter(rate=1.0, burst=1.0, max_keys=10))
+def test_authorize_websocket_limits_handshakes_per_address():
+    websocket = make_request()
+    assert authorize_websocket(websocket) is None
+    with pytest.raises(HTTPException) as exc_info:
+        authorize_websocket(websocket)
+    assert exc_info.value.status_code == status.HTTP_429_TOO_MANY_REQUESTS
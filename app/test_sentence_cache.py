@@ -0,0 +1,65 @@
+"""Unit tests for sentence_cache.py"""
+
+# Local imports
+from cache import LRUCache
+from constants import PipelineTypes
+from metrics import render_metrics
+from pipeline import PatternPipeline, create_pipeline
+from sentence_cache import SentenceCachePipeline, split_sentences
+
+FOOTER = "Sent by Mr. John Smith from Boston.\nDaily Bugle Inc, all rights reserved."
+
+
+class CountingPipeline(PatternPipeline):
+    """Pattern pipeline recording the texts it was asked to annotate"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def run_text_pipeline_sync(self, str_list):
+        self.calls.append(list(str_list))
+        return super().run_text_pipeline_sync(str_list)
+
+
+def test_split_sentences():
+    text = 'Hi Dr. Strange!  See you at 10:30 on Jan. 5, e.g. at home.\n\nJ. Doe ("CEO.") Bye'
+    assert split_sentences(text) == [
+        "Hi Dr. Strange!",
+        "See you at 10:30 on Jan. 5, e.g. at home.",
+        'J. Doe ("CEO.")',
+        "Bye",
+    ]
+    assert split_sentences("  \n ") == []
+
+
+def test_sentence_cache_reuses_boilerplate():
+    inner = CountingPipeline()
+    pipeline = SentenceCachePipeline(inner, LRUCache(100))
+    first = f"Ask Ms. Mary Jane about it.\n{FOOTER}"
+    second = f"Ping me on March 3.\n{FOOTER}"
+    pipeline.run_text_pipeline_sync([first])
+    result = pipeline.run_text_pipeline_sync([second])
+    assert inner.calls[1] == ["Ping me on March 3."], "only the new sentence must be inferred"
+    assert result[second] == {
+        "DATE_TIME": ["March 3"],
+        "LOC": ["Boston"],
+        "NRP": [],
+        "ORG": ["Daily Bugle Inc"],
+        "PER": ["John Smith"],
+    }
+    assert (pipeline.cache.hits, pipeline.cache.misses) == (2, 4)
+    assert "datafog_sentence_cache_hit_rate 0.333333\n" in render_metrics()
+
+
+def test_sentence_cache_matches_wrapped_pipeline():
+    inner = PatternPipeline()
+    texts = [FOOTER, "no sentence boundary here", " "]
+    cached = SentenceCachePipeline(inner, LRUCache(100)).run_text_pipeline_sync(texts)
+    assert cached == inner.run_text_pipeline_sync(texts)
+
+
+def test_create_pipeline_with_sentence_cache():
+    pipeline = create_pipeline(PipelineTypes.PATTERN, sentence_cache=True)
+    assert isinstance(pipeline, SentenceCachePipeline)
+    assert isinstance(pipeline.pipeline, PatternPipeline)
@@ -0,0 +1,104 @@
+"""Unit tests for serialization.py"""
+
+# Third party imports
+import msgpack
+import pytest
+from fastapi import Body, FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.testclient import TestClient
+
+# Local imports
+from exception_handler import exception_processor, http_exception_processor
+from serialization import MsgpackRoute, NegotiatedResponse, accepts_msgpack, unpackb
+
+MSGPACK_HEADERS = {"content-type": "application/msgpack", "accept": "application/msgpack"}
+
+
+def create_app() -> FastAPI:
+    test_app = FastAPI(default_response_class=NegotiatedResponse)
+    test_app.router.route_class = MsgpackRoute
+
+    @test_app.post("/entities")
+    def entities(text: str = Body(embed=True, min_length=1), denied: bool = Body(False)):
+        if denied:
+            raise HTTPException(status_code=401, detail="denied", headers={"X-Test": "1"})
+        return {"text": text, "entities": [{"start": 0, "end": len(text), "type": "PER"}]}
+
+    test_app.add_exception_handler(RequestValidationError, exception_processor)
+    test_app.add_exception_handler(HTTPException, http_exception_processor)
+    return test_app
+
+
+client = TestClient(create_app())
+
+
+@pytest.mark.parametrize(
+    "accept, expected",
+    [
+        (None, False),
+        ("application/json", False),
+        ("*/*", False),
+        ("application/msgpack", True),
+        ("application/x-msgpack, */*;q=0.1", True),
+        ("application/json, application/msgpack", False),
+        ("application/json;q=0.5, application/msgpack", True),
+        ("application/msgpack;q=0", False),
+    ],
+)
+def test_accepts_msgpack(accept, expected):
+    assert accepts_msgpack(accept) is expected
+
+
+def test_unpackb_invalid():
+    with pytest.raises(RequestValidationError) as exc_info:
+        unpackb(b"\xc1")
+    assert exc_info.value.errors()[0]["loc"] == ["body"]
+
+
+def test_msgpack_round_trip():
+    response = client.post(
+        "/entities", content=msgpack.packb({"text": "Joe"}), headers=MSGPACK_HEADERS
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(response.content) == {
+        "text": "Joe",
+        "entities": [{"start": 0, "end": 3, "type": "PER"}],
+    }, "offsets must be packed as integers"
+
+
+def test_mixed_encodings():
+    response = client.post(
+        "/entities", json={"text": "Joe"}, headers={"accept": "application/msgpack"}
+    )
+    assert msgpack.unpackb(response.content)["text"] == "Joe"
+    response = client.post(
+        "/entities",
+        content=msgpack.packb({"text": "Joe"}),
+        headers={"content-type": "application/msgpack"},
+    )
+    assert response.json()["text"] == "Joe", "JSON stays the default response"
+
+
+def test_msgpack_errors():
+    response = client.post(
+        "/entities", content=msgpack.packb({"text": ""}), headers=MSGPACK_HEADERS
+    )
+    assert response.status_code == 422
+    assert msgpack.unpackb(response.content)["detail"][0]["loc"] == ["body", "text"]
+    response = client.post("/entities", content=b"\xc1", headers=MSGPACK_HEADERS)
+    assert response.status_code == 422
+    response = client.post(
+        "/entities",
+        content=msgpack.packb({"text": "Joe", "denied": True}),
+        headers=MSGPACK_HEADERS,
+    )
+    assert response.status_code == 401
+    assert response.headers["x-test"] == "1"
+    assert msgpack.unpackb(response.content) == {"detail": "denied"}
+
+
+def test_exception_processor_without_accept():
+    request = Request({"type": "http", "headers": []})
+    response = exception_processor(request, RequestValidationError([]))
+    assert response.media_type == "application/json"
@@ -0,0 +1,69 @@
+"""Unit tests for server.py"""
+
+# Standard library imports
+import os
+from unittest.mock import patch
+
+# Local imports
+from constants import (
+    NATIVE_THREAD_ENV_VARS,
+    SERVER_THREADS_PER_WORKER_KEY,
+    SERVER_WORKERS_KEY,
+)
+from server import (
+    available_cpus,
+    get_worker_count,
+    pin_thread_pools,
+    read_cgroup_cpu_limit,
+)
+
+
+def write(path, content: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content, encoding="utf-8")
+
+
+def test_read_cgroup_v2_limit(tmp_path):
+    write(tmp_path / "cpu.max", "250000 100000\n")
+    assert read_cgroup_cpu_limit(str(tmp_path)) == 2.5
+    write(tmp_path / "cpu.max", "max 100000\n")
+    assert read_cgroup_cpu_limit(str(tmp_path)) is None
+
+
+def test_read_cgroup_v1_limit(tmp_path):
+    write(tmp_path / "cpu" / "cpu.cfs_quota_us", "150000")
+    write(tmp_path / "cpu" / "cpu.cfs_period_us", "100000")
+    assert read_cgroup_cpu_limit(str(tmp_path)) == 1.5
+    write(tmp_path / "cpu" / "cpu.cfs_quota_us", "-1")
+    assert read_cgroup_cpu_limit(str(tmp_path)) is None
+
+
+def test_read_cgroup_limit_missing(tmp_path):
+    assert read_cgroup_cpu_limit(str(tmp_path)) is None
+
+
+@patch("os.sched_getaffinity", return_value=set(range(8)))
+def test_available_cpus_honours_quota(mock_affinity, tmp_path):
+    assert available_cpus(str(tmp_path)) == 8
+    write(tmp_path / "cpu.max", "250000 100000")
+    assert available_cpus(str(tmp_path)) == 3, "a fractional quota rounds up"
+    mock_affinity.assert_called_with(0)
+
+
+@patch("os.sched_getaffinity", return_value=set(range(8)))
+def test_get_worker_count(_, tmp_path):
+    with patch.dict("os.environ", {SERVER_THREADS_PER_WORKER_KEY: "2"}):
+        assert get_worker_count(str(tmp_path)) == 4
+    with patch.dict("os.environ", {SERVER_WORKERS_KEY: "3"}):
+        assert get_worker_count(str(tmp_path)) == 3
+    with patch.dict("os.environ", {SERVER_THREADS_PER_WORKER_KEY: "16"}):
+        assert get_worker_count(str(tmp_path)) == 1
+
+
+def test_pin_thread_pools_keeps_explicit_settings():
+    first, second = NATIVE_THREAD_ENV_VARS[:2]
+    with patch.dict("os.environ", {first: "4"}):
+        os.environ.pop(second, None)
+        pin_thread_pools(1)
+        assert os.environ[first] == "4"
+        assert os.environ[second] == "1"
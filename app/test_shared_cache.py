@@ -0,0 +1,143 @@
+"""Unit tests for shared_cache.py"""
+
+# Standard library imports
+import logging
+import multiprocessing
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+# Local imports
+from cache import content_key
+from constants import PipelineTypes
+from pipeline import PatternPipeline, create_pipeline, pipeline_fingerprint
+from shared_cache import SharedCache, SharedCachePipeline, decode_result, encode_result
+
+RESULT = {"DATE_TIME": ["May 5"], "LOC": [], "PER": ["Joe", "Joe"]}
+
+
+class CountingPipeline:
+    """Pipeline recording the texts it was asked to annotate"""
+
+    def __init__(self):
+        self.calls = []
+
+    def run_text_pipeline_sync(self, str_list):
+        self.calls.append(list(str_list))
+        return {text: {"PER": [text.split()[0]]} for text in str_list}
+
+
+def store_in_child(path: str):
+    SharedCache(path, 1 << 20).put(b"from-child", RESULT)
+
+
+def test_encoding_round_trip():
+    data = encode_result(RESULT)
+    assert decode_result(data) == RESULT
+    assert len(data) < len(str(RESULT)), "encoding should be compact"
+
+
+def test_get_put(tmp_path):
+    cache = SharedCache(str(tmp_path / "cache.sqlite3"), 1 << 20)
+    assert cache.get(b"key") is None
+    cache.put(b"key", RESULT)
+    assert cache.get(b"key") == RESULT
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.hit_rate() == 0.5
+
+
+@patch("shared_cache.SHARED_CACHE_CHECK_INTERVAL", 10)
+def test_counters_exact_across_threads(tmp_path):
+    cache = SharedCache(str(tmp_path / "cache.sqlite3"), 1 << 30)
+    cache.put(b"key", RESULT)
+
+    def work(i: int):
+        cache.get(b"key" if i % 2 else b"missing")
+        cache.put(i.to_bytes(4, "big"), RESULT)
+
+    with patch.object(cache, "evict") as mock_evict:
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(work, range(399)))
+    assert (cache.hits, cache.misses) == (199, 200)
+    assert mock_evict.call_count == 40, "every tenth write must check the size"
+
+
+def test_errors_logged_as_misses(tmp_path, caplog):
+    cache = SharedCache(str(tmp_path / "cache.sqlite3"), 1 << 20)
+    with patch.object(cache, "connection", side_effect=sqlite3.OperationalError("locked")):
+        with caplog.at_level(logging.WARNING, logger="shared_cache"):
+            assert cache.get(b"key") is None
+            cache.put(b"key", RESULT)
+    assert [record.getMessage() for record in caplog.records] == [
+        "Shared cache lookup failed: locked",
+        "Shared cache store failed: locked",
+    ]
+    assert cache.misses == 1
+
+
+def test_shared_between_processes_and_restarts(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    SharedCache(path, 1 << 20)
+    process = multiprocessing.get_context("fork").Process(target=store_in_child, args=(path,))
+    process.start()
+    process.join(10)
+    assert SharedCache(path, 1 << 20).get(b"from-child") == RESULT
+
+
+@patch("shared_cache.SHARED_CACHE_CHECK_INTERVAL", 1)
+def test_eviction_bounds_size(tmp_path):
+    cache = SharedCache(str(tmp_path / "cache.sqlite3"), 64 * 1024)
+    value = {"PER": ["x" * 500]}
+    for i in range(1000):
+        cache.put(i.to_bytes(4, "big"), value)
+    assert cache.size() <= 64 * 1024 + 8 * 1024, "size bound exceeded"
+    assert cache.get((999).to_bytes(4, "big")) == value, "recent entries must be kept"
+    assert cache.get((0).to_bytes(4, "big")) is None, "oldest entries must be evicted"
+
+
+def test_size_includes_write_ahead_log(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    cache = SharedCache(str(path), 1 << 20)
+    for i in range(100):
+        cache.put(i.to_bytes(4, "big"), {"PER": ["x" * 500]})
+    wal_size = (tmp_path / "cache.sqlite3-wal").stat().st_size
+    assert wal_size > 0
+    assert cache.size() >= wal_size
+    cache.max_bytes = 1024
+    cache.evict()
+    assert (tmp_path / "cache.sqlite3-wal").stat().st_size == 0, "the log must be truncated"
+
+
+def test_pipeline_runs_misses_once(tmp_path):
+    cache = SharedCache(str(tmp_path / "cache.sqlite3"), 1 << 20)
+    inner = CountingPipeline()
+    pipeline = SharedCachePipeline(inner, cache, "a:")
+    first = pipeline.run_text_pipeline_sync(["Joe here", "Ann there"])
+    second = pipeline.run_text_pipeline_sync(["Ann there", "Bob too", "Bob too"])
+    assert inner.calls == [["Joe here", "Ann there"], ["Bob too"]]
+    assert first["Joe here"] == {"PER": ["Joe"]}
+    assert list(second) == ["Ann there", "Bob too"]
+
+    SharedCachePipeline(inner, cache, "b:").run_text_pipeline_sync(["Joe here"])
+    assert inner.calls[-1] == ["Joe here"], "namespaces must not share entries"
+    assert cache.get(content_key("a:Joe here")) == {"PER": ["Joe"]}
+
+
+def test_create_pipeline_shared_cache(tmp_path):
+    with patch.dict("os.environ", {"DATAFOG_SHARED_CACHE_PATH": str(tmp_path / "c.sqlite3")}):
+        pipeline = create_pipeline(PipelineTypes.PATTERN, shared_cache=True)
+    assert isinstance(pipeline, SharedCachePipeline)
+    assert isinstance(pipeline.pipeline, PatternPipeline)
+    fingerprint = pipeline_fingerprint(PipelineTypes.PATTERN, pipeline.pipeline)
+    assert pipeline.namespace == f"pattern:{fingerprint}:"
+    text = "Dr. Joe Smith met us on May 5"
+    assert pipeline.run_text_pipeline_sync([text]) == PatternPipeline().run_text_pipeline_sync(
+        [text]
+    )
+
+
+def test_fingerprint_follows_versions():
+    with patch("pipeline.package_version", return_value="1.0"):
+        first = pipeline_fingerprint(PipelineTypes.DATAFOG, None)
+    with patch("pipeline.package_version", return_value="1.1"):
+        assert pipeline_fingerprint(PipelineTypes.DATAFOG, None) != first
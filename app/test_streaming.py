@@ -0,0 +1,109 @@
+"""Unit tests for streaming.py"""
+
+# Standard library imports
+import json
+import threading
+from unittest.mock import patch
+
+import pytest
+
+# Third party imports
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+
+# Local imports
+from constants import StreamOperations
+from custom_exceptions import StreamMessageError
+from ratelimit import RateLimiter
+from streaming import handle_message, parse_message, serve_stream
+
+
+def echo(message: dict) -> dict:
+    return {"text": message["text"].upper()}
+
+
+def test_parse_message_defaults():
+    message = parse_message(json.dumps({"id": 7, "op": "annotate", "text": "hello"}))
+    assert message == {
+        "id": 7,
+        "op": StreamOperations.ANNOTATE,
+        "text": "hello",
+        "lang": "EN",
+        "byte_offsets": False,
+        "group": False,
+    }
+
+
+def test_parse_message_errors():
+    with pytest.raises(StreamMessageError) as exc_info:
+        parse_message(json.dumps({"op": "encode", "text": "", "salt": "short"}))
+    assert [e["loc"] for e in exc_info.value.errors()] == [
+        ["message", "text"],
+        ["message", "salt"],
+    ]
+    with pytest.raises(StreamMessageError) as exc_info:
+        parse_message(json.dumps({"op": "delete", "text": "bad \ud800"}))
+    assert [e["type"] for e in exc_info.value.errors()] == [
+        "value_error.operation",
+        "value_error.str.regex",
+    ]
+    with pytest.raises(StreamMessageError) as exc_info:
+        parse_message(json.dumps({"op": "annotate", "text": "hello", "group": "yes"}))
+    assert exc_info.value.errors()[0]["loc"] == ["message", "group"]
+    with pytest.raises(StreamMessageError):
+        parse_message("[1, 2]")
+
+
+def test_handle_message_errors_keep_id():
+    response = handle_message('{"id": "a", "op": "annotate"}', echo, None, None)
+    assert response["id"] == "a"
+    assert response["error"]["status"] == 422
+    response = handle_message("not json", echo, None, None)
+    assert response == {"id": None, "error": response["error"]}
+
+
+@patch("builtins.print")
+def test_handle_message_unexpected_error(_):
+    def broken(message):
+        raise KeyError("boom")
+
+    response = handle_message('{"id": 1, "op": "annotate", "text": "x"}', broken, None, None)
+    assert response["error"]["status"] == 500
+
+
+@patch("streaming.RATE_LIMIT_ENABLED", True)
+@patch("streaming.IP_LIMITER", None)
+@patch("streaming.CREDENTIAL_LIMITER", RateLimiter(rate=0.5, burst=1.0, max_keys=10))
+def test_handle_message_rate_limited():
+    raw = '{"id": 1, "op": "annotate", "text": "x"}'
+    assert "result" in handle_message(raw, echo, "10.0.0.1", "jsmith")
+    response = handle_message(raw, echo, "10.0.0.1", "jsmith")
+    assert response["error"] == {
+        "status": 429,
+        "detail": response["error"]["detail"],
+        "retry_after": 2,
+    }
+
+
+def test_serve_stream_pipelines_messages():
+    release = threading.Event()
+    test_app = FastAPI()
+
+    def process(message: dict) -> dict:
+        if message["text"] == "slow":
+            release.wait(5)
+        return echo(message)
+
+    @test_app.websocket("/stream")
+    async def stream(websocket: WebSocket):
+        await websocket.accept()
+        await serve_stream(websocket, process, max_in_flight=2)
+
+    with TestClient(test_app).websocket_connect("/stream") as websocket:
+        websocket.send_json({"id": 1, "op": "annotate", "text": "slow"})
+        websocket.send_json({"id": 2, "op": "anonymize", "text": "fast"})
+        first = websocket.receive_json()
+        release.set()
+        second = websocket.receive_json()
+    assert first == {"id": 2, "result": {"text": "FAST"}}, "responses must not wait in line"
+    assert second == {"id": 1, "result": {"text": "SLOW"}}
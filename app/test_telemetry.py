@@ -1,15 +1,20 @@
 """Unit Tests for the Telemetry Module"""
 
 # Standard library imports
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import ANY, mock_open, patch
 from uuid import UUID
 
 # Third party imports
 from requests import Response
+from requests.exceptions import ConnectionError as RequestsConnectionError
 from requests.exceptions import Timeout
 from yaml import YAMLError
 
 # Local imports
+from config import ConfigSnapshot
 from constants import (
     API_VERSION_KEY,
     APP_NAME,
@@ -20,8 +25,10 @@ from constants import (
     SYSTEM_FILE_NAME,
     TELEMETRY_APP_KEY,
     UUID_KEY,
+    UsageKeys,
 )
 from telemetry import (
+    UsageReporter,
     _Telemetry,
     config_generator,
     create_telemetry_url,
@@ -222,6 +229,25 @@ def test_report_basic_telemetry_t_o(mock_get, mock_url, mock_collect, mock_uuid,
     mock_print.assert_called_once_with("Telemetry request timed out")
 
 
+@patch("builtins.print")
+@patch("telemetry.load_uuid")
+@patch("telemetry._Telemetry.collect_telemetry")
+@patch("telemetry.create_telemetry_url")
+@patch("requests.get")
+def test_report_basic_telemetry_error(mock_get, mock_url, mock_collect, mock_uuid, mock_print):
+    """Test Telemetry::report_basic_telemetry connection failure"""
+    mock_uuid.return_value = TEST_UUID
+    mock_collect.return_value = {}
+    mock_url.return_value = TEST_URL
+    mock_get.side_effect = RequestsConnectionError("Name or service not known")
+
+    instance = _Telemetry()
+    instance.report_basic_telemetry()
+
+    mock_get.assert_called_once()
+    mock_print.assert_called_once_with("Telemetry request failed: Name or service not known")
+
+
 @patch("telemetry.load_uuid")
 def test_get_instance(mock_load_uuid):
     """Test get_telemetry_instance"""
@@ -235,10 +261,10 @@ def test_get_instance(mock_load_uuid):
     assert instance1 is instance2
 
 
-@patch("telemetry.load_system_yaml")
-def test_load_uuid_success(mock_yaml):
+@patch("telemetry.get_config")
+def test_load_uuid_success(mock_config):
     """Test load_uuid with defined uuid"""
-    mock_yaml.return_value = {UUID_KEY : TEST_UUID}
+    mock_config.return_value = ConfigSnapshot({UUID_KEY: TEST_UUID}, {})
 
     result = load_uuid()
 
@@ -246,33 +272,34 @@ def test_load_uuid_success(mock_yaml):
     assert TEST_UUID == str(result)
 
 
-@patch("telemetry.load_system_yaml")
-def test_load_uuid_malformed(mock_yaml):
+@patch("telemetry.get_config")
+def test_load_uuid_malformed(mock_config):
     """Test load_uuid handling malformed uuid in the config"""
-    mock_yaml.return_value = {UUID_KEY : "abcd-1234"}
+    mock_config.return_value = ConfigSnapshot({UUID_KEY: "abcd-1234"}, {})
 
     result = load_uuid()
 
     assert result is None
-    assert mock_yaml.call_count == 4
+    mock_config.assert_called_once()
 
 
-@patch("telemetry.load_system_yaml")
-def test_load_uuid_not_available(mock_yaml):
+@patch("telemetry.get_config")
+def test_load_uuid_not_available(mock_config):
     """Test load_uuid handling no uuid available in the config"""
-    mock_yaml.return_value = {DEPLOY_TYPE_KEY : "docker"}
+    mock_config.return_value = ConfigSnapshot({DEPLOY_TYPE_KEY: "docker"}, {})
 
     result = load_uuid()
 
     assert result is None
-    assert mock_yaml.call_count == 4
+    mock_config.assert_called_once()
 
 
+@patch("telemetry.reload_config")
 @patch("builtins.open", new_callable=mock_open, read_data=f"{DEPLOY_TYPE_KEY}: docker")
 @patch("yaml.safe_dump")
 @patch("os.path.expanduser")
 @patch("telemetry.load_system_yaml")
-def test_persist_uuid_success(mock_load, mock_expand, mock_dump, mock_open_func):
+def test_persist_uuid_success(mock_load, mock_expand, mock_dump, mock_open_func, mock_reload):
     """Test persist_uuid success"""
     mock_load.return_value = {}
     mock_expand.side_effect = lambda x: x
@@ -281,6 +308,7 @@ def test_persist_uuid_success(mock_load, mock_expand, mock_dump, mock_open_func)
     mock_load.assert_called_once()
     mock_dump.assert_called_once_with({UUID_KEY : TEST_UUID}, ANY, default_flow_style=False)
     mock_open_func.assert_called_once_with(target_path, "w", encoding=CONFIG_ENCODING)
+    mock_reload.assert_called_once()
 
 
 @patch("builtins.open", new_callable=mock_open)
@@ -470,3 +498,77 @@ def test_config_generator_isolation_parallel(mock_load, mock_expand):
             assert res[1] == f"{FILE_PATH_LIST[j]}{SYSTEM_FILE_NAME}"
 
     assert mock_load.call_count == 20
+
+
+class StubTelemetryHandler(BaseHTTPRequestHandler):
+    """Local stand-in for the telemetry service, recording the reports it receives"""
+
+    reports = []
+    connections = set()
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        length = int(self.headers["Content-Length"])
+        self.reports.append(json.loads(self.rfile.read(length)))
+        self.connections.add(self.client_address)
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+StubTelemetryHandler.protocol_version = "HTTP/1.1"
+
+
+def start_stub_server() -> ThreadingHTTPServer:
+    StubTelemetryHandler.reports = []
+    StubTelemetryHandler.connections = set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubTelemetryHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_usage_reporter_aggregates_and_reuses_connection():
+    """Test counts are sent as one report per flush over a single connection"""
+    server = start_stub_server()
+    url = f"http://127.0.0.1:{server.server_address[1]}/usage"
+    reporter = UsageReporter({TELEMETRY_APP_KEY: APP_NAME}, url, 3600, 100)
+    try:
+        reporter.record("annotate", entities=2)
+        reporter.record("annotate", entities=3)
+        reporter.record("encode", texts=2)
+        assert reporter.flush(), "report not delivered"
+        reporter.record("annotate")
+        assert reporter.flush()
+        assert not reporter.flush(), "nothing to send without new counts"
+    finally:
+        reporter.stopped.set()
+        server.shutdown()
+
+    reports = StubTelemetryHandler.reports
+    assert len(reports) == 2
+    assert reports[0][TELEMETRY_APP_KEY] == APP_NAME
+    assert reports[0][UsageKeys.ROUTES.value] == {
+        "annotate": {"requests": 2, "texts": 2, "entities": 5},
+        "encode": {"requests": 1, "texts": 2, "entities": 0},
+    }
+    assert reports[1][UsageKeys.ROUTES.value]["annotate"]["requests"] == 1
+    assert len(StubTelemetryHandler.connections) == 1, "connection was not reused"
+
+
+@patch("builtins.print")
+def test_usage_reporter_bounded_and_drops_failures(mock_print):
+    """Test pending counts are bounded and undeliverable reports are dropped"""
+    server = start_stub_server()
+    url = f"http://127.0.0.1:{server.server_address[1]}/usage"
+    server.shutdown()
+    server.server_close()
+    reporter = UsageReporter({}, url, 3600, 3)
+    for _ in range(10):
+        reporter.record("annotate")
+    reporter.stopped.set()
+    assert len(reporter.pending) == 3
+    assert not reporter.flush()
+    mock_print.assert_called_once()
+    assert len(reporter.pending) == 0, "failed report must not be kept for retry"
@@ -0,0 +1,174 @@
+"""Unit tests for tracing.py"""
+
+# Standard library imports
+import json
+from unittest.mock import MagicMock, patch
+
+# Third party imports
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+# Local imports
+from constants import SERVER_TIMING_HEADER, TRACE_ROOT_SPAN, TRACEPARENT_HEADER
+from tracing import (
+    BackgroundExporter,
+    ConsoleExporter,
+    FileExporter,
+    RequestTrace,
+    TracingMiddleware,
+    create_exporter,
+    span,
+    traced,
+)
+
+TEST_TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+TEST_PARENT_ID = "00f067aa0ba902b7"
+TEST_TRACEPARENT = f"00-{TEST_TRACE_ID}-{TEST_PARENT_ID}-01"
+
+
+class RecordingExporter:
+    """Exporter keeping finished traces in memory"""
+
+    def __init__(self):
+        self.traces = []
+
+    def export(self, trace, attributes):
+        self.traces.append((trace, attributes))
+
+
+def create_test_client(exporter) -> TestClient:
+    """Build a small app with a traced dependency and traced stages"""
+
+    @traced("auth")
+    def dependency():
+        return True
+
+    def endpoint(allowed: bool = Depends(dependency)):
+        with span("pipeline"):
+            with span("entities"):
+                pass
+        return {"allowed": allowed}
+
+    test_app = FastAPI()
+    test_app.add_middleware(TracingMiddleware, exporter=exporter)
+    test_app.get("/api/test")(endpoint)
+    return TestClient(test_app)
+
+
+def test_span_without_trace_is_noop():
+    with span("pipeline"):
+        value = 1
+    assert value == 1
+
+
+def test_request_trace_parses_traceparent():
+    trace = RequestTrace(TEST_TRACEPARENT)
+    assert trace.trace_id == TEST_TRACE_ID
+    assert trace.parent_id == TEST_PARENT_ID
+
+
+def test_request_trace_invalid_traceparent():
+    trace = RequestTrace(f"00-{'0' * 32}-{TEST_PARENT_ID}-01")
+    assert trace.trace_id != "0" * 32, "an all zero trace id is invalid"
+    assert trace.parent_id is None
+    assert len(RequestTrace("garbage").trace_id) == 32
+
+
+def test_request_trace_server_timing_sums_repeated_stages():
+    trace = RequestTrace()
+    trace.add_span("entities", trace.start, trace.start + 1_000_000)
+    trace.add_span("entities", trace.start, trace.start + 2_000_000)
+    assert trace.server_timing() == "entities;dur=3.000"
+
+
+def test_middleware_server_timing_header():
+    exporter = RecordingExporter()
+    client = create_test_client(exporter)
+    response = client.get("/api/test")
+
+    timing = response.headers[SERVER_TIMING_HEADER]
+    names = [entry.split(";")[0] for entry in timing.split(", ")]
+    assert names == ["auth", "entities", "pipeline", TRACE_ROOT_SPAN]
+    assert len(exporter.traces) == 1
+
+
+def test_middleware_propagates_traceparent():
+    exporter = RecordingExporter()
+    client = create_test_client(exporter)
+    client.get("/api/test", headers={TRACEPARENT_HEADER: TEST_TRACEPARENT})
+
+    trace, attributes = exporter.traces[0]
+    records = trace.to_records(attributes)
+    assert records[0]["trace_id"] == TEST_TRACE_ID
+    assert records[0]["parent_id"] == TEST_PARENT_ID
+    assert records[0]["attributes"]["http.target"] == "/api/test"
+    assert all(r["parent_id"] == trace.span_id for r in records[1:]), "stages must be children"
+
+
+def test_file_exporter(tmp_path):
+    path = tmp_path / "traces" / "out.jsonl"
+    trace = RequestTrace(TEST_TRACEPARENT)
+    trace.add_span("pipeline", trace.start, trace.start + 5)
+    trace.finish()
+    FileExporter(str(path)).export(trace, {})
+
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [r["name"] for r in records] == [TRACE_ROOT_SPAN, "pipeline"]
+    assert all(r["trace_id"] == TEST_TRACE_ID for r in records)
+
+
+@patch("builtins.print")
+def test_console_exporter(mock_print):
+    trace = RequestTrace()
+    trace.finish()
+    ConsoleExporter().export(trace, {})
+    mock_print.assert_called_once()
+
+
+def test_background_exporter():
+    recording = RecordingExporter()
+    exporter = BackgroundExporter(recording, 1)
+    client = create_test_client(exporter)
+    client.get("/api/test")
+    exporter.queue.join()
+    assert len(recording.traces) == 1
+    assert exporter.thread.name == "trace-exporter"
+
+
+@patch("tracing.traces_dropped")
+def test_background_exporter_drops_when_full(mock_dropped):
+    exporter = BackgroundExporter(RecordingExporter(), 1)
+    exporter.thread = MagicMock()  # a stalled export thread
+    exporter.export(RequestTrace(), {})
+    exporter.export(RequestTrace(), {})
+    assert exporter.queue.qsize() == 1
+    mock_dropped.inc.assert_called_once()
+
+
+@patch("builtins.print")
+def test_background_exporter_survives_failures(mock_print):
+    failing = MagicMock()
+    failing.export.side_effect = [OSError("disk full"), None]
+    exporter = BackgroundExporter(failing)
+    exporter.export(RequestTrace(), {})
+    exporter.export(RequestTrace(), {})
+    exporter.queue.join()
+    assert failing.export.call_count == 2
+    mock_print.assert_called_once()
+
+
+@patch("builtins.print")
+def test_create_exporter(mock_print):
+    assert create_exporter("none") is None
+    assert isinstance(create_exporter("console"), ConsoleExporter)
+    assert isinstance(create_exporter("FILE"), FileExporter)
+    assert create_exporter("unknown") is None
+    mock_print.assert_called_once()
+
+
+@patch("builtins.print")
+@patch("tracing.OTelExporter", side_effect=ImportError)
+def test_create_exporter_otel_missing(mock_otel, mock_print):
+    assert create_exporter("otel") is None
+    mock_otel.assert_called_once()
+    mock_print.assert_called_once()
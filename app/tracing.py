@@ -0,0 +1,303 @@
+"""Lightweight per stage request tracing"""
+
+# Standard library imports
+import functools
+import json
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Local imports
+from constants import (
+    SERVER_TIMING_HEADER,
+    TRACE_DEFAULT_FILE,
+    TRACE_DEFAULT_QUEUE_SIZE,
+    TRACE_EXPORTER_KEY,
+    TRACE_FILE_KEY,
+    TRACE_QUEUE_SIZE_KEY,
+    TRACE_ROOT_SPAN,
+    TRACEPARENT_HEADER,
+    TRACING_ENABLED_KEY,
+    TraceExporters,
+)
+from metrics import Counter
+
+TRACING_ENABLED = os.getenv(TRACING_ENABLED_KEY, "false").lower() == "true"
+
+# W3C trace context: version-trace_id-parent_id-flags
+TRACEPARENT_PATTERN = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_CURRENT_TRACE: ContextVar["RequestTrace | None"] = ContextVar("current_trace", default=None)
+
+traces_dropped = Counter(
+    "traces_dropped_total", "Finished traces dropped by a full export queue"
+)
+
+
+class RequestTrace:
+    """Timings of the stages of a single request"""
+
+    def __init__(self, traceparent: str | None = None):
+        self.trace_id = None
+        self.parent_id = None
+        self.flags = "01"
+        match = TRACEPARENT_PATTERN.match(traceparent or "")
+        if match and match.group(1) != "0" * 32 and match.group(2) != "0" * 16:
+            self.trace_id, self.parent_id, self.flags = match.groups()
+        if self.trace_id is None:
+            self.trace_id = secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.start_ns = time.time_ns()
+        self.start = time.perf_counter_ns()
+        self.duration_ns = None
+        self.spans = []  # (name, offset_ns, duration_ns) appended as stages finish
+
+    def add_span(self, name: str, start: int, end: int):
+        """Record a finished stage using perf_counter_ns timestamps"""
+        self.spans.append((name, start - self.start, end - start))
+
+    def finish(self):
+        """Mark the end of the request"""
+        self.duration_ns = time.perf_counter_ns() - self.start
+
+    def server_timing(self) -> str:
+        """Format the recorded stages as a Server-Timing header value"""
+        totals = {}
+        for name, _, duration in self.spans:
+            # a stage can run more than once per request, report the sum
+            totals[name] = totals.get(name, 0) + duration
+        if self.duration_ns is not None:
+            totals[TRACE_ROOT_SPAN] = self.duration_ns
+        return ", ".join(
+            f"{name};dur={duration / 1e6:.3f}" for name, duration in totals.items()
+        )
+
+    def to_records(self, attributes: dict | None = None) -> list[dict]:
+        """Produce one exportable record per span, the first being the request itself"""
+        records = [
+            {
+                "trace_id": self.trace_id,
+                "span_id": self.span_id,
+                "parent_id": self.parent_id,
+                "name": TRACE_ROOT_SPAN,
+                "start_ns": self.start_ns,
+                "duration_ms": (self.duration_ns or 0) / 1e6,
+                "attributes": attributes or {},
+            }
+        ]
+        for name, offset, duration in self.spans:
+            records.append(
+                {
+                    "trace_id": self.trace_id,
+                    "span_id": secrets.token_hex(8),
+                    "parent_id": self.span_id,
+                    "name": name,
+                    "start_ns": self.start_ns + offset,
+                    "duration_ms": duration / 1e6,
+                }
+            )
+        return records
+
+
+@contextmanager
+def span(name: str):
+    """Time the enclosed block as a stage of the current request, a no-op outside of one"""
+    trace = _CURRENT_TRACE.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        trace.add_span(name, start, time.perf_counter_ns())
+
+
+def traced(name: str):
+    """Decorator form of span, keeps the signature so it can wrap FastAPI dependencies"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class ConsoleExporter:
+    """Print finished traces to stdout as JSON lines"""
+
+    def export(self, trace: RequestTrace, attributes: dict):
+        """Export a finished trace"""
+        for record in trace.to_records(attributes):
+            print(json.dumps(record))
+
+
+class FileExporter:
+    """Append finished traces to a local JSON lines file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def export(self, trace: RequestTrace, attributes: dict):
+        """Export a finished trace"""
+        lines = "".join(json.dumps(record) + "\n" for record in trace.to_records(attributes))
+        try:
+            with self.lock:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as file:
+                    file.write(lines)
+        except OSError as e:
+            print(f"Failed to write trace to '{self.path}': {e}")
+
+
+class OTelExporter:
+    """Replay finished traces as spans of the globally configured OpenTelemetry tracer"""
+
+    def __init__(self):
+        # pylint: disable=import-outside-toplevel
+        from opentelemetry import trace as otel_trace
+        from opentelemetry.trace.propagation.tracecontext import (
+            TraceContextTextMapPropagator,
+        )
+
+        self.tracer = otel_trace.get_tracer(__name__)
+        self.set_span_in_context = otel_trace.set_span_in_context
+        self.propagator = TraceContextTextMapPropagator()
+
+    def export(self, trace: RequestTrace, attributes: dict):
+        """Export a finished trace"""
+        context = None
+        if trace.parent_id is not None:
+            carrier = {
+                TRACEPARENT_HEADER: f"00-{trace.trace_id}-{trace.parent_id}-{trace.flags}"
+            }
+            context = self.propagator.extract(carrier)
+        root = self.tracer.start_span(
+            TRACE_ROOT_SPAN, context=context, start_time=trace.start_ns, attributes=attributes
+        )
+        root_context = self.set_span_in_context(root)
+        for name, offset, duration in trace.spans:
+            start_time = trace.start_ns + offset
+            stage = self.tracer.start_span(name, context=root_context, start_time=start_time)
+            stage.end(end_time=start_time + duration)
+        root.end(end_time=trace.start_ns + (trace.duration_ns or 0))
+
+
+class BackgroundExporter:
+    """Hand finished traces to another exporter from a daemon thread
+
+    Exporters write files, print or call the OpenTelemetry SDK, which must not hold up the
+    event loop. Traces arriving while the queue is full are dropped and counted.
+    """
+
+    def __init__(self, exporter, max_size: int = TRACE_DEFAULT_QUEUE_SIZE):
+        self.exporter = exporter
+        self.queue = queue.Queue(max_size)
+        self.thread = None
+
+    def export(self, trace: RequestTrace, attributes: dict):
+        """Queue a finished trace for export"""
+        if self.thread is None or not self.thread.is_alive():
+            # started on first use, which also restarts it in forked workers
+            self.thread = threading.Thread(target=self.run, name="trace-exporter", daemon=True)
+            self.thread.start()
+        try:
+            self.queue.put_nowait((trace, attributes))
+        except queue.Full:
+            traces_dropped.inc()
+
+    def run(self):
+        """Export queued traces until the process exits"""
+        while True:
+            trace, attributes = self.queue.get()
+            try:
+                self.exporter.export(trace, attributes)
+            except Exception as e:  # pylint: disable=broad-except
+                # a failing exporter must not stop the export of later traces
+                print(f"Failed to export trace: {e}")
+            finally:
+                self.queue.task_done()
+
+
+def create_exporter(name: str | None = None):
+    """Build the exporter selected by name or the environment, None if exporting is disabled"""
+    name = name or os.getenv(TRACE_EXPORTER_KEY, TraceExporters.NONE.value)
+    try:
+        exporter_type = TraceExporters(name.lower())
+    except ValueError:
+        print(f"Unknown trace exporter '{name}', traces will not be exported")
+        return None
+
+    match exporter_type:
+        case TraceExporters.CONSOLE:
+            return ConsoleExporter()
+        case TraceExporters.FILE:
+            return FileExporter(os.getenv(TRACE_FILE_KEY, TRACE_DEFAULT_FILE))
+        case TraceExporters.OTEL:
+            try:
+                return OTelExporter()
+            except ImportError:
+                print("opentelemetry is not installed, traces will not be exported")
+    return None
+
+
+class TracingMiddleware:
+    """ASGI middleware creating a trace per request and reporting it via Server-Timing
+
+    The exporter configured in the environment runs in the background, exporters passed in
+    are called as each request completes.
+    """
+
+    def __init__(self, app, exporter=None):
+        self.app = app
+        if exporter is None:
+            exporter = create_exporter()
+            if exporter is not None:
+                max_size = int(os.getenv(TRACE_QUEUE_SIZE_KEY, str(TRACE_DEFAULT_QUEUE_SIZE)))
+                exporter = BackgroundExporter(exporter, max_size)
+        self.exporter = exporter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope.get("headers", []):
+            if name == TRACEPARENT_HEADER.encode("latin-1"):
+                traceparent = value.decode("latin-1").strip().lower()
+        trace = RequestTrace(traceparent)
+        reset_token = _CURRENT_TRACE.set(trace)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                # all stages have completed by the time the response starts
+                trace.finish()
+                headers = list(message.get("headers", []))
+                headers.append(
+                    (SERVER_TIMING_HEADER.encode("latin-1"), trace.server_timing().encode())
+                )
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _CURRENT_TRACE.reset(reset_token)
+            if trace.duration_ns is None:
+                trace.finish()
+            if self.exporter is not None:
+                attributes = {"http.method": scope.get("method"), "http.target": scope["path"]}
+                self.exporter.export(trace, attributes)